@@ -0,0 +1,111 @@
+"""Compare the old regex rewrite of datori.html with DatoriTemplate.
+
+Usage: python benchmarks/datori_render.py [--sizes 1000 10000 50000]
+
+The page is synthetic: a selector between a few hundred KB of markup, as a
+real page with inline styles and scripts would have. "template" includes
+parsing the page; "cached" reuses the parsed template, as consecutive syncs
+in one worker process do. Titles contain no characters that need escaping,
+so both implementations must produce the same document.
+"""
+
+import argparse
+import re
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from music.datori import DatoriTemplate  # noqa: E402
+
+
+def make_page(filler_kb=200):
+    filler = "<p>" + "Putekļi un dziesmas. " * 40 + "</p>\n"
+    block = filler * (filler_kb * 1024 // len(filler) // 2)
+    return (
+        "<html><head><title>Datori</title></head><body>\n"
+        + block
+        + '  <select id="songSelector" class="song-select">\n'
+        + '    <option value="">-- Izvēlies dziesmu --</option>\n'
+        + "  </select>\n"
+        + block
+        + "</body></html>\n"
+    )
+
+
+def make_data(count):
+    return [
+        {"title": f"Dziesma {idx}", "audio": f"music/dziesma_{idx}.mp3"}
+        for idx in range(count)
+    ]
+
+
+def legacy_render(content, data):
+    """The previous implementation: search, then sub, over the whole page."""
+    default_option = '<option value="">-- Izvēlies dziesmu --</option>'
+    lines = []
+    for item in data:
+        audio = item.get("audio") or ""
+        title = item.get("title") or ""
+        if not audio or not title:
+            continue
+        lines.append(f'<option value="{audio}">{title}</option>')
+    options = "\n    ".join([default_option] + lines)
+    pattern = r'(<select[^>]*id="songSelector"[^>]*>)(.*?)(</select>)'
+    match = re.search(pattern, content, flags=re.DOTALL)
+    if not match:
+        return None
+    return re.sub(
+        pattern,
+        r"\1\n    " + options + r"\n  \3",
+        content,
+        flags=re.DOTALL,
+    )
+
+
+def template_render(content, data):
+    return DatoriTemplate.parse(content).render(data)
+
+
+def timed(func, *args, repeat=5):
+    best = None
+    result = None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = func(*args)
+        elapsed = time.perf_counter() - started
+        best = elapsed if best is None else min(best, elapsed)
+    return best, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", nargs="+", type=int, default=[1000, 10000, 50000])
+    parser.add_argument("--page-kb", type=int, default=200)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    page = make_page(args.page_kb)
+    print(f"page: {len(page.encode('utf-8')) // 1024} KB")
+    print(
+        f"{'songs':>8} {'regex ms':>9} {'template ms':>12} {'cached ms':>10} "
+        f"{'speedup':>8} identical"
+    )
+    for size in args.sizes:
+        data = make_data(size)
+        # The regex output feeds the next run, so its cost grows with the list.
+        current = legacy_render(page, data)
+        old_time, old_html = timed(legacy_render, current, data, repeat=args.repeat)
+        new_time, new_html = timed(template_render, current, data, repeat=args.repeat)
+        template = DatoriTemplate.parse(current)
+        cached_time, _ = timed(template.render, data, repeat=args.repeat)
+        print(
+            f"{size:>8} {old_time * 1000:>9.1f} {new_time * 1000:>12.1f} "
+            f"{cached_time * 1000:>10.1f} {old_time / cached_time:>7.1f}x "
+            f"{old_html == new_html}"
+        )
+
+
+if __name__ == "__main__":
+    main()
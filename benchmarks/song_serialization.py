@@ -0,0 +1,93 @@
+"""Compare SongSerializer + JSONRenderer with the SongRowSerializer fast path.
+
+Usage: python benchmarks/song_serialization.py [--sizes 1000 10000 100000]
+
+Rows are generated in memory, so no database is needed. The baseline path
+also pays for building model instances, as the ORM would.
+"""
+
+import argparse
+import os
+import sys
+import time
+from datetime import date, datetime, timedelta, timezone
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "config.settings")
+os.environ.setdefault("DB_ENGINE", "django.db.backends.sqlite3")
+
+import django  # noqa: E402
+
+django.setup()
+
+from django.test import RequestFactory  # noqa: E402
+from rest_framework.renderers import JSONRenderer  # noqa: E402
+from rest_framework.request import Request  # noqa: E402
+
+from music.models import Song  # noqa: E402
+from music.renderers import FastJSONRenderer, orjson  # noqa: E402
+from music.serializers import SongRowSerializer, SongSerializer  # noqa: E402
+
+
+def make_rows(count):
+    base = datetime(2024, 1, 1, tzinfo=timezone.utc)
+    return [
+        {
+            "id": idx,
+            "title": f"Dziesma {idx}",
+            "audio_file": f"music/dziesma_{idx}.mp3",
+            "lyrics_file": f"lyrics/dziesma_{idx}.txt" if idx % 3 else "",
+            "cover_image": f"cover/dziesma_{idx}.jpg",
+            "style": "indie, dream pop, lo-fi; " * 4,
+            "status": Song.STATUS_PUBLISHED,
+            "published_at": date(2024, 1, 1) + timedelta(days=idx % 365),
+            "created_at": base + timedelta(minutes=idx),
+            "updated_at": base + timedelta(minutes=idx, seconds=30),
+        }
+        for idx in range(count)
+    ]
+
+
+def baseline(rows, request):
+    songs = [Song(**row) for row in rows]
+    data = SongSerializer(songs, many=True, context={"request": request}).data
+    return JSONRenderer().render(data)
+
+
+def fast(rows, request):
+    return FastJSONRenderer().render(SongRowSerializer(request).many(rows))
+
+
+def timed(func, *args, repeat=3):
+    best = None
+    result = None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = func(*args)
+        elapsed = time.perf_counter() - started
+        best = elapsed if best is None else min(best, elapsed)
+    return best, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", nargs="+", type=int, default=[1000, 10000, 100000])
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    request = Request(RequestFactory().get("/api/songs/", HTTP_HOST="localhost"))
+    print(f"orjson: {'yes' if orjson else 'no'}")
+    print(f"{'songs':>8} {'baseline s':>11} {'fast s':>8} {'speedup':>8} identical")
+    for size in args.sizes:
+        rows = make_rows(size)
+        slow_time, slow_bytes = timed(baseline, rows, request, repeat=args.repeat)
+        fast_time, fast_bytes = timed(fast, rows, request, repeat=args.repeat)
+        print(
+            f"{size:>8} {slow_time:>11.3f} {fast_time:>8.3f} "
+            f"{slow_time / fast_time:>7.1f}x {slow_bytes == fast_bytes}"
+        )
+
+
+if __name__ == "__main__":
+    main()
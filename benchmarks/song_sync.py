@@ -0,0 +1,154 @@
+"""Compare the old list-scan songs.json merge with the keyed SongCatalogue.
+
+Usage: python benchmarks/song_sync.py [--sizes 1000 10000 50000]
+
+Songs are unsaved model instances and media copying is skipped, so this
+measures the merge itself plus writing songs.json, songs_data.js and
+datori.html to a temporary web root. The scenario is "sync selected" over a
+catalogue already on disk: every song is present, 10% changed their style and
+2% were unpublished. The quadratic baseline is skipped above --baseline-limit.
+"""
+
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "config.settings")
+os.environ.setdefault("DB_ENGINE", "django.db.backends.sqlite3")
+
+import django  # noqa: E402
+
+django.setup()
+
+from django.test import override_settings  # noqa: E402
+
+from music.models import Song  # noqa: E402
+from music.sync import (  # noqa: E402
+    SongCatalogue,
+    SyncResult,
+    merge_song,
+    song_entry,
+    song_key,
+    sync_songs,
+)
+
+
+def make_songs(count):
+    songs = []
+    for idx in range(count):
+        status = Song.STATUS_DRAFT if idx % 50 == 7 else Song.STATUS_PUBLISHED
+        songs.append(
+            Song(
+                title=f"Dziesma {idx}",
+                audio_file=f"music/dziesma_{idx}.mp3",
+                lyrics_file=f"lyrics/dziesma_{idx}.txt",
+                cover_image=f"cover/dziesma_{idx}.jpg",
+                style="indie" if idx % 10 else "dream pop",
+                status=status,
+            )
+        )
+    return songs
+
+
+def existing_catalogue(songs):
+    data = []
+    for song in songs:
+        entry = song_entry(song)
+        entry["style"] = "indie"
+        data.append(entry)
+    return data
+
+
+def legacy_merge(data, songs):
+    """The pre-index algorithm: a list scan per song, a rebuild per removal."""
+    added = updated = removed = 0
+    for song in songs:
+        title, audio = song_key(song)
+        if song.status != Song.STATUS_PUBLISHED:
+            if audio:
+                kept = [
+                    item
+                    for item in data
+                    if not (item.get("title") == title and item.get("audio") == audio)
+                ]
+                removed += len(data) - len(kept)
+                data = kept
+            continue
+        entry = song_entry(song)
+        for idx, item in enumerate(data):
+            if item.get("title") == title and item.get("audio") == audio:
+                if item != entry:
+                    data[idx] = entry
+                    updated += 1
+                break
+        else:
+            data.append(entry)
+            added += 1
+    return data, (added, updated, removed)
+
+
+def keyed_merge(data, songs):
+    catalogue = SongCatalogue(data)
+    result = SyncResult()
+    for song in songs:
+        merge_song(catalogue, song, result)
+    return catalogue.entries(), (result.added, result.updated, result.removed)
+
+
+def timed(func, *args):
+    started = time.perf_counter()
+    result = func(*args)
+    return time.perf_counter() - started, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", nargs="+", type=int, default=[1000, 10000, 50000])
+    parser.add_argument("--baseline-limit", type=int, default=10000)
+    args = parser.parse_args()
+
+    print(
+        f"{'songs':>8} {'list scan s':>12} {'keyed s':>8} {'speedup':>8} "
+        f"{'full sync s':>12} identical"
+    )
+    for size in args.sizes:
+        songs = make_songs(size)
+        existing = existing_catalogue(songs)
+
+        new_time, (new_data, new_counts) = timed(
+            keyed_merge, json.loads(json.dumps(existing)), songs
+        )
+        if size <= args.baseline_limit:
+            old_time, (old_data, old_counts) = timed(
+                legacy_merge, json.loads(json.dumps(existing)), songs
+            )
+            old_column = f"{old_time:>12.3f}"
+            speedup = f"{old_time / new_time:>7.0f}x"
+            identical = old_data == new_data and old_counts == new_counts
+        else:
+            old_column, speedup, identical = f"{'-':>12}", f"{'-':>8}", "-"
+
+        with tempfile.TemporaryDirectory() as web_root:
+            (Path(web_root) / "songs.json").write_text(
+                json.dumps(existing), encoding="utf-8"
+            )
+            with override_settings(
+                PUTEKLIS_WEB_PATH=web_root,
+                PUTEKLIS_PUBLISH_PREVIOUS_DIR=Path(web_root) / "previous",
+            ):
+                sync_time, _ = timed(
+                    lambda: sync_songs(songs, copy_files=False)  # noqa: B023
+                )
+        print(
+            f"{size:>8} {old_column} {new_time:>8.3f} {speedup} "
+            f"{sync_time:>12.3f} {identical}"
+        )
+
+
+if __name__ == "__main__":
+    main()
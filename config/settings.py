@@ -54,6 +54,10 @@ INSTALLED_APPS = [
 
 REST_FRAMEWORK = {
     "DEFAULT_SCHEMA_CLASS": "drf_spectacular.openapi.AutoSchema",
+    "DEFAULT_RENDERER_CLASSES": [
+        "music.renderers.FastJSONRenderer",
+        "rest_framework.renderers.BrowsableAPIRenderer",
+    ],
 }
 
 SPECTACULAR_SETTINGS = {
@@ -63,6 +67,7 @@ SPECTACULAR_SETTINGS = {
 }
 
 MIDDLEWARE = [
+    "music.middleware.MetricsMiddleware",
     "django.middleware.security.SecurityMiddleware",
     "whitenoise.middleware.WhiteNoiseMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
@@ -166,6 +171,123 @@ MEDIA_URL = "media/"
 MEDIA_ROOT = BASE_DIR / "media"
 
 PUTEKLIS_WEB_PATH = BASE_DIR.parent / "puteklis_weblapa"
+# Cached SHA-256 digests of synced media, so unchanged files are not re-copied.
+PUTEKLIS_SYNC_MANIFEST = BASE_DIR / "sync_manifest.json"
+# The generated site files replaced by the last sync, for `manage.py rollback_site`.
+PUTEKLIS_PUBLISH_PREVIOUS_DIR = BASE_DIR / "site_previous"
+# Parallel file copies for sync and import_songs (1 copies sequentially).
+PUTEKLIS_TRANSFER_WORKERS = int(os.getenv("PUTEKLIS_TRANSFER_WORKERS", "4"))
+# Full syncs from the admin are queued as SyncJob rows and run by
+# `manage.py run_sync_worker`. A running job that has not reported progress
+# for PUTEKLIS_SYNC_JOB_STALE_AFTER seconds is considered dead. Set
+# PUTEKLIS_SYNC_WORKER=1 where that worker is deployed (the Docker image runs
+# one); without it syncs and new audio are processed in the request instead.
+PUTEKLIS_SYNC_WORKER = os.getenv("PUTEKLIS_SYNC_WORKER", "0") == "1"
+PUTEKLIS_SYNC_WORKER_INTERVAL = float(os.getenv("PUTEKLIS_SYNC_WORKER_INTERVAL", "2"))
+PUTEKLIS_SYNC_JOB_STALE_AFTER = int(os.getenv("PUTEKLIS_SYNC_JOB_STALE_AFTER", "600"))
+PUTEKLIS_SYNC_POLL_INTERVAL = 1000
+# Sync events as JSON lines, rotated at PUTEKLIS_SYNC_LOG_MAX_BYTES into
+# sync.jsonl.1 … sync.jsonl.N (N = PUTEKLIS_SYNC_LOG_BACKUPS).
+PUTEKLIS_SYNC_LOG = BASE_DIR / "sync.jsonl"
+PUTEKLIS_SYNC_LOG_MAX_BYTES = int(os.getenv("PUTEKLIS_SYNC_LOG_MAX_BYTES", "1048576"))
+PUTEKLIS_SYNC_LOG_BACKUPS = int(os.getenv("PUTEKLIS_SYNC_LOG_BACKUPS", "5"))
+PUTEKLIS_SYNC_LOG_TAIL = 100
+# Song changes (admin, REST API, scripts) queue an incremental sync that runs
+# once no change has arrived for PUTEKLIS_AUTOSYNC_DEBOUNCE seconds, and at
+# most PUTEKLIS_AUTOSYNC_MAX_DELAY seconds after the first one. With autosync
+# off, or no worker, the admin syncs each save synchronously, as before.
+PUTEKLIS_AUTOSYNC = os.getenv("PUTEKLIS_AUTOSYNC", "1") == "1"
+PUTEKLIS_AUTOSYNC_DEBOUNCE = int(os.getenv("PUTEKLIS_AUTOSYNC_DEBOUNCE", "5"))
+PUTEKLIS_AUTOSYNC_MAX_DELAY = int(os.getenv("PUTEKLIS_AUTOSYNC_MAX_DELAY", "60"))
+# updated_at is stamped before the transaction commits, so a slow write can
+# become visible after a newer watermark was handed out. The change feed
+# re-reads this many seconds before `updated_since`, and an incremental sync
+# before the start of the last one; keep it above the longest write
+# transaction. Clients upsert by id, so the repeats are harmless.
+PUTEKLIS_CHANGES_OVERLAP = int(os.getenv("PUTEKLIS_CHANGES_OVERLAP", "300"))
+
+# Response cache for /api/songs/. Local memory by default; set
+# DJANGO_CACHE_URL=redis://host:6379/0 to share it between workers.
+cache_url = os.getenv("DJANGO_CACHE_URL", "")
+if cache_url.startswith(("redis://", "rediss://")):
+    CACHES = {
+        "default": {
+            "BACKEND": "django.core.cache.backends.redis.RedisCache",
+            "LOCATION": cache_url,
+        }
+    }
+else:
+    CACHES = {
+        "default": {
+            "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+            "LOCATION": "puteklis",
+        }
+    }
+
+PUTEKLIS_SONGS_CACHE = "default"
+PUTEKLIS_SONGS_CACHE_TIMEOUT = int(os.getenv("PUTEKLIS_SONGS_CACHE_TIMEOUT", "3600"))
+PUTEKLIS_SONGS_CACHE_VERSION_TTL = int(
+    os.getenv("PUTEKLIS_SONGS_CACHE_VERSION_TTL", "5")
+)
+
+# /api/metrics/: song counts are cached for a few seconds. Request metrics
+# from all gunicorn workers are merged through PUTEKLIS_METRICS_DIR (clear it
+# on container start). Set PUTEKLIS_METRICS_TOKEN to require a bearer token.
+PUTEKLIS_METRICS_CACHE_TTL = int(os.getenv("PUTEKLIS_METRICS_CACHE_TTL", "15"))
+PUTEKLIS_METRICS_DIR = os.getenv("PUTEKLIS_METRICS_DIR", "")
+PUTEKLIS_METRICS_FLUSH_INTERVAL = float(
+    os.getenv("PUTEKLIS_METRICS_FLUSH_INTERVAL", "1.0")
+)
+PUTEKLIS_METRICS_TOKEN = os.getenv("PUTEKLIS_METRICS_TOKEN", "")
+
+# /api/songs/<id>/audio/: streamed in chunks by default. Set
+# PUTEKLIS_AUDIO_SENDFILE to "x-accel-redirect" (nginx, internal location at
+# PUTEKLIS_AUDIO_ACCEL_PREFIX aliased to MEDIA_ROOT) or "x-sendfile" to let the
+# proxy push the bytes.
+PUTEKLIS_AUDIO_SENDFILE = os.getenv("PUTEKLIS_AUDIO_SENDFILE", "")
+PUTEKLIS_AUDIO_ACCEL_PREFIX = os.getenv(
+    "PUTEKLIS_AUDIO_ACCEL_PREFIX", "/protected-media/"
+)
+PUTEKLIS_AUDIO_CHUNK_SIZE = 64 * 1024
+
+# Cover renditions (square, label -> pixels), written as JPEG and WebP under
+# MEDIA_ROOT/renditions/ on save and by `manage.py generate_renditions`.
+PUTEKLIS_COVER_RENDITIONS = {"thumb": 160, "medium": 480}
+PUTEKLIS_COVER_RENDITIONS_ON_SAVE = True
+
+# Audio duration, bitrate, size and SHA-256. A new audio file is queued on save
+# and read by `manage.py run_sync_worker`; `manage.py extract_audio_metadata`
+# backfills the rest.
+PUTEKLIS_AUDIO_METADATA_ON_SAVE = True
+
+# Waveform peaks for the player: PUTEKLIS_WAVEFORM_PEAKS (min, max) pairs of
+# PUTEKLIS_WAVEFORM_BITS (8 or 16) bits, under MEDIA_ROOT/waveforms/. A new
+# audio file is queued on save and drawn by `manage.py run_sync_worker`;
+# `manage.py generate_waveforms` backfills the rest. WAV is read directly;
+# other formats need ffmpeg (PUTEKLIS_FFMPEG, a name on PATH or a full path),
+# which is stopped after PUTEKLIS_FFMPEG_TIMEOUT seconds.
+PUTEKLIS_WAVEFORM_PEAKS = 1000
+PUTEKLIS_WAVEFORM_BITS = 8
+PUTEKLIS_WAVEFORM_ON_SAVE = True
+PUTEKLIS_WAVEFORM_MAX_AGE = 3600
+PUTEKLIS_FFMPEG = os.getenv("PUTEKLIS_FFMPEG", "ffmpeg")
+PUTEKLIS_FFMPEG_TIMEOUT = 300
+
+# Uploaded media is stored once per distinct content under
+# MEDIA_ROOT/<PUTEKLIS_MEDIA_BLOB_DIR>/ab/cd/<sha256>; file names are hard links.
+PUTEKLIS_MEDIA_BLOB_DIR = "blobs"
+
+# Chunked audio uploads (/api/uploads/, staff only). Parts are kept under
+# MEDIA_ROOT/<PUTEKLIS_UPLOAD_DIR>/ and dropped after PUTEKLIS_UPLOAD_TTL
+# seconds without activity.
+PUTEKLIS_UPLOAD_DIR = "uploads"
+PUTEKLIS_UPLOAD_CHUNK_SIZE = 8 * 1024 * 1024
+PUTEKLIS_UPLOAD_MAX_SIZE = int(os.getenv("PUTEKLIS_UPLOAD_MAX_SIZE", str(2 * 1024**3)))
+PUTEKLIS_UPLOAD_TTL = 24 * 3600
+
+# Opt-in cursor pagination for /api/songs/ (?page_size= or ?cursor=).
+PUTEKLIS_SONGS_PAGE_SIZE = int(os.getenv("PUTEKLIS_SONGS_PAGE_SIZE", "50"))
+PUTEKLIS_SONGS_MAX_PAGE_SIZE = int(os.getenv("PUTEKLIS_SONGS_MAX_PAGE_SIZE", "500"))
 
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.2/ref/settings/#default-auto-field
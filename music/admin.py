@@ -1,194 +1,25 @@
-import json
-import re
-import shutil
+import time
 from datetime import datetime
 from pathlib import Path
 
 from django.conf import settings
 from django.contrib import admin, messages
+from django.http import HttpResponseRedirect, JsonResponse
+from django.shortcuts import get_object_or_404
 from django.template.response import TemplateResponse
-from django.urls import path
+from django.urls import path, reverse
 from django.utils import timezone
 
-from .models import Song
-
-
-def _copy_to_web_root(source_path, destination, missing):
-    destination.parent.mkdir(parents=True, exist_ok=True)
-    if source_path.exists():
-        shutil.copy2(source_path, destination)
-    else:
-        missing.append(str(destination))
-
-
-def _load_songs_json(songs_path):
-    if not songs_path.exists():
-        return []
-    raw = songs_path.read_text(encoding="utf-8", errors="replace")
-    return json.loads(raw)
-
-
-def _write_songs_json(songs_path, data):
-    songs_path.write_text(
-        json.dumps(data, ensure_ascii=False, indent=2),
-        encoding="utf-8",
-    )
-
-
-def _write_songs_data_js(js_path, data):
-    payload = json.dumps(data, ensure_ascii=False, indent=2)
-    js_path.write_text(f"const songs = {payload};\n", encoding="utf-8")
-
-
-def _write_datori_html(html_path, data):
-    if not html_path.exists():
-        return False
-    default_option = '<option value="">-- Izvēlies dziesmu --</option>'
-    lines = []
-    for item in data:
-        audio = item.get("audio") or ""
-        title = item.get("title") or ""
-        if not audio or not title:
-            continue
-        lines.append(f'<option value="{audio}">{title}</option>')
-    options = "\n    ".join([default_option] + lines)
-    content = html_path.read_text(encoding="utf-8", errors="replace")
-    pattern = r'(<select[^>]*id="songSelector"[^>]*>)(.*?)(</select>)'
-    match = re.search(pattern, content, flags=re.DOTALL)
-    if not match:
-        return False
-    updated = re.sub(
-        pattern,
-        r"\1\n    " + options + r"\n  \3",
-        content,
-        flags=re.DOTALL,
-    )
-    html_path.write_text(updated, encoding="utf-8")
-    return True
-
-
-def _sync_song_to_json(song, data=None):
-    web_root = getattr(settings, "PUTEKLIS_WEB_PATH", None)
-    if not web_root:
-        return None, 0, 0, []
-
-    songs_path = Path(web_root) / "songs.json"
-    missing = []
-    own_write = data is None
-    if data is None:
-        data = _load_songs_json(songs_path)
-
-    audio_name = Path(song.audio_file.name).name
-    lyrics_name = Path(song.lyrics_file.name).name if song.lyrics_file else ""
-    image_name = Path(song.cover_image.name).name if song.cover_image else ""
-
-    if song.status != Song.STATUS_PUBLISHED:
-        audio_rel = f"music/{audio_name}" if audio_name else ""
-        if audio_rel:
-            data = [
-                item
-                for item in data
-                if not (
-                    item.get("title") == song.title and item.get("audio") == audio_rel
-                )
-            ]
-        if own_write:
-            _write_songs_json(songs_path, data)
-            _write_songs_data_js(Path(web_root) / "songs_data.js", data)
-            if not _write_datori_html(Path(web_root) / "datori.html", data):
-                missing.append(str(Path(web_root) / "datori.html"))
-        return data, 0, 0, missing
-
-    entry = {
-        "title": song.title,
-        "audio": f"music/{audio_name}" if audio_name else "",
-        "lyrics": f"lyrics/{lyrics_name}" if lyrics_name else "",
-        "image": f"cover/{image_name}" if image_name else "",
-        "style": song.style or "",
-    }
-
-    added = 0
-    updated = 0
-    matched = False
-    for idx, item in enumerate(data):
-        if item.get("title") == entry["title"] and item.get("audio") == entry["audio"]:
-            matched = True
-            if item != entry:
-                data[idx] = entry
-                updated = 1
-            break
-
-    if not matched:
-        data.append(entry)
-        added = 1
-
-    if own_write:
-        _write_songs_json(songs_path, data)
-        _write_songs_data_js(Path(web_root) / "songs_data.js", data)
-        if not _write_datori_html(Path(web_root) / "datori.html", data):
-            missing.append(str(Path(web_root) / "datori.html"))
-
-    if song.audio_file:
-        _copy_to_web_root(
-            Path(song.audio_file.path),
-            Path(web_root) / "music" / audio_name,
-            missing,
-        )
-    if song.lyrics_file:
-        _copy_to_web_root(
-            Path(song.lyrics_file.path),
-            Path(web_root) / "lyrics" / lyrics_name,
-            missing,
-        )
-    if song.cover_image:
-        _copy_to_web_root(
-            Path(song.cover_image.path),
-            Path(web_root) / "cover" / image_name,
-            missing,
-        )
-
-    return data, added, updated, missing
-
-
-def _remove_song_from_json(song):
-    web_root = getattr(settings, "PUTEKLIS_WEB_PATH", None)
-    if not web_root:
-        return False
-
-    songs_path = Path(web_root) / "songs.json"
-    if not songs_path.exists():
-        return False
-
-    data = _load_songs_json(songs_path)
-    audio_name = Path(song.audio_file.name).name
-    audio_rel = f"music/{audio_name}" if audio_name else ""
-
-    filtered = [
-        item
-        for item in data
-        if not (item.get("title") == song.title and item.get("audio") == audio_rel)
-    ]
-
-    if filtered == data:
-        return False
-
-    _write_songs_json(songs_path, filtered)
-    _write_songs_data_js(Path(web_root) / "songs_data.js", filtered)
-    _write_datori_html(Path(web_root) / "datori.html", filtered)
-    return True
-
-
-def _log_sync(action, message, missing):
-    log_path = Path(settings.BASE_DIR) / "sync.log"
-    timestamp = timezone.localtime(timezone.now()).strftime("%Y-%m-%d %H:%M:%S")
-    lines = [f"[{timestamp}] {action}: {message}"]
-    if missing:
-        lines.append("Missing files:")
-        lines.extend([f"- {path}" for path in missing])
-    existing = ""
-    if log_path.exists():
-        existing = log_path.read_text(encoding="utf-8", errors="replace")
-    log_path.write_text(existing + "\n".join(lines) + "\n", encoding="utf-8")
+from .jobs import autosync_enabled, run_pending, sync_worker_enabled
+from .models import Song, SyncJob
+from .sync import (
+    SyncResult,
+    remove_song,
+    sync_songs,
+    sync_summary,
+    transfer_summary,
+)
+from .synclog import get_sync_log, log_sync
 
 
 def _get_audio_mtime(song, web_root):
@@ -219,6 +50,21 @@ class SongAdmin(admin.ModelAdmin):
                 self.admin_site.admin_view(self.sync_now),
                 name="music_song_sync",
             ),
+            path(
+                "sync/log/",
+                self.admin_site.admin_view(self.sync_log),
+                name="music_song_sync_log",
+            ),
+            path(
+                "sync/<int:job_id>/",
+                self.admin_site.admin_view(self.sync_job),
+                name="music_song_sync_job",
+            ),
+            path(
+                "sync/<int:job_id>/status/",
+                self.admin_site.admin_view(self.sync_status),
+                name="music_song_sync_status",
+            ),
         ]
         return custom_urls + urls
 
@@ -227,6 +73,9 @@ class SongAdmin(admin.ModelAdmin):
             context = {
                 **self.admin_site.each_context(request),
                 "title": "Sinhronizēt visas dziesmas",
+                "active_job": SyncJob.objects.exclude(
+                    status__in=[SyncJob.STATUS_DONE, SyncJob.STATUS_FAILED]
+                ).first(),
             }
             return TemplateResponse(
                 request,
@@ -234,64 +83,79 @@ class SongAdmin(admin.ModelAdmin):
                 context,
             )
 
-        data = []
-        added_total = 0
-        updated_total = 0
-        missing_total = []
-
-        for song in Song.objects.all():
-            data, added, updated, missing = _sync_song_to_json(song, data=data)
-            added_total += added
-            updated_total += updated
-            missing_total.extend(missing)
-
-        if data is not None:
-            web_root = getattr(settings, "PUTEKLIS_WEB_PATH", None)
-            if web_root:
-                _write_songs_json(Path(web_root) / "songs.json", data)
-                _write_songs_data_js(Path(web_root) / "songs_data.js", data)
-                if not _write_datori_html(Path(web_root) / "datori.html", data):
-                    missing_total.append(str(Path(web_root) / "datori.html"))
-
-        message = (
-            f"Sinhronizācija pabeigta. "
-            f"Pievienoti: {added_total}, atjaunināti: {updated_total}."
+        job = SyncJob.enqueue(user=request.user)
+        if not sync_worker_enabled():
+            # Nothing else would pick the job up: run it in this request.
+            run_pending()
+        return HttpResponseRedirect(reverse("admin:music_song_sync_job", args=[job.pk]))
+
+    def sync_job(self, request, job_id):
+        job = get_object_or_404(SyncJob, pk=job_id)
+        context = {
+            **self.admin_site.each_context(request),
+            "title": f"Sinhronizācija #{job.pk}",
+            "job": job,
+            "state": self._job_state(job),
+            "status_url": reverse("admin:music_song_sync_status", args=[job.pk]),
+            "poll_interval": getattr(settings, "PUTEKLIS_SYNC_POLL_INTERVAL", 1000),
+        }
+        return TemplateResponse(
+            request,
+            "admin/music/song/sync_progress.html",
+            context,
         )
-        _log_sync("sync_now", message, missing_total)
-        self.message_user(request, message, level=messages.SUCCESS)
-        return self._redirect_to_changelist()
 
-    def _redirect_to_changelist(self):
-        from django.http import HttpResponseRedirect
-        from django.urls import reverse
+    def sync_status(self, request, job_id):
+        job = get_object_or_404(SyncJob, pk=job_id)
+        return JsonResponse(self._job_state(job))
+
+    def sync_log(self, request):
+        count = getattr(settings, "PUTEKLIS_SYNC_LOG_TAIL", 100)
+        context = {
+            **self.admin_site.each_context(request),
+            "title": "Sinhronizācijas žurnāls",
+            "entries": get_sync_log().tail(count),
+            "count": count,
+        }
+        return TemplateResponse(
+            request,
+            "admin/music/song/sync_log.html",
+            context,
+        )
 
-        return HttpResponseRedirect(reverse("admin:music_song_changelist"))
+    @staticmethod
+    def _job_state(job):
+        if job.status == SyncJob.STATUS_DONE and not job.error:
+            message = f"Sinhronizācija pabeigta. {sync_summary(job)}"
+        elif job.is_finished:
+            message = f"Sinhronizācija neizdevās: {job.error}"
+        elif job.status == SyncJob.STATUS_RUNNING:
+            message = "Notiek sinhronizācija…"
+        else:
+            message = "Gaida sinhronizācijas procesu (run_sync_worker)…"
+        return {
+            "id": job.pk,
+            "status": job.status,
+            "finished": job.is_finished,
+            "requests": job.requests,
+            "done": job.progress_done,
+            "total": job.progress_total,
+            "missing": job.missing,
+            "message": message,
+        }
 
     def sync_selected(self, request, queryset):
-        data = None
-        added_total = 0
-        updated_total = 0
-        missing_total = []
-
-        for song in queryset:
-            data, added, updated, missing = _sync_song_to_json(song, data=data)
-            added_total += added
-            updated_total += updated
-            missing_total.extend(missing)
-
-        if data is not None:
-            web_root = getattr(settings, "PUTEKLIS_WEB_PATH", None)
-            if web_root:
-                _write_songs_json(Path(web_root) / "songs.json", data)
-                _write_songs_data_js(Path(web_root) / "songs_data.js", data)
-                if not _write_datori_html(Path(web_root) / "datori.html", data):
-                    missing_total.append(str(Path(web_root) / "datori.html"))
-
-        message = (
-            f"Sinhronizētas izvēlētās dziesmas. "
-            f"Pievienoti: {added_total}, atjaunināti: {updated_total}."
+        started = time.monotonic()
+        result = sync_songs(queryset) or SyncResult()
+
+        message = f"Sinhronizētas izvēlētās dziesmas. {sync_summary(result)}"
+        log_sync(
+            "sync_selected",
+            message,
+            result.missing,
+            result=result,
+            duration=time.monotonic() - started,
         )
-        _log_sync("sync_selected", message, missing_total)
         self.message_user(request, message, level=messages.SUCCESS)
 
     sync_selected.short_description = "Sinhronizēt izvēlētās dziesmas"
@@ -303,17 +167,52 @@ class SongAdmin(admin.ModelAdmin):
             if created_at:
                 obj.created_at = created_at
         super().save_model(request, obj, form, change)
-        _, added, updated, missing = _sync_song_to_json(obj)
+        if autosync_enabled():
+            # songs.json is regenerated by the debounced autosync job.
+            return
+        started = time.monotonic()
+        result = sync_songs([obj]) or SyncResult()
         message = (
-            f"Saglabāts ieraksts. " f"Pievienots: {added}, atjaunināts: {updated}."
+            f"Saglabāts ieraksts. "
+            f"Pievienots: {result.added}, atjaunināts: {result.updated}. "
+            f"{transfer_summary(result)}"
+        )
+        log_sync(
+            "save",
+            message,
+            result.missing,
+            result=result,
+            duration=time.monotonic() - started,
         )
-        _log_sync("save", message, missing)
 
     def delete_model(self, request, obj):
-        removed = _remove_song_from_json(obj)
-        if removed:
-            message = "Dzēsts ieraksts no songs.json."
-        else:
-            message = "Ieraksts nav atrasts songs.json."
-        _log_sync("delete", message, [])
+        if not autosync_enabled():
+            removed = remove_song(obj)
+            if removed:
+                message = "Dzēsts ieraksts no songs.json."
+            else:
+                message = "Ieraksts nav atrasts songs.json."
+            log_sync("delete", message)
         super().delete_model(request, obj)
+
+
+@admin.register(SyncJob)
+class SyncJobAdmin(admin.ModelAdmin):
+    list_display = (
+        "id",
+        "status",
+        "requested_by",
+        "requests",
+        "created_at",
+        "finished_at",
+        "added",
+        "updated",
+        "removed",
+    )
+    list_filter = ("status",)
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
@@ -0,0 +1,76 @@
+import gzip
+import hashlib
+import json
+import re
+from pathlib import Path
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+MANIFEST_NAME = "catalogue-manifest.json"
+HASHED_RE = re.compile(
+    r"^(?P<name>(?:songs|songs_data)\.[0-9a-f]{12}\.(?:json|js))(?:\.gz|\.br)?$"
+)
+
+
+def compressed(name, content):
+    """``.gz`` (and ``.br`` with brotli installed) siblings of one file.
+
+    Output is deterministic (no gzip timestamp), so an unchanged file gives
+    unchanged bytes and the publisher can skip it.
+    """
+    files = {f"{name}.gz": gzip.compress(content, compresslevel=9, mtime=0)}
+    if brotli is not None:
+        files[f"{name}.br"] = brotli.compress(content, quality=11)
+    return files
+
+
+def hashed_name(name, content):
+    stem, dot, extension = name.rpartition(".")
+    digest = hashlib.sha256(content).hexdigest()[:12]
+    return f"{stem}.{digest}.{extension}"
+
+
+def catalogue_artifacts(data):
+    """Minified, content-hashed and precompressed copies of the catalogue.
+
+    Returns ``{filename: bytes}`` including ``catalogue-manifest.json``, which
+    maps the logical names (``songs.json``, ``songs_data.js``) to the hashed
+    ones. Hashed files never change, so they can be served with far-future
+    cache headers; only the manifest has to be revalidated.
+    """
+    payload = json.dumps(data, ensure_ascii=False, separators=(",", ":"))
+    minified = {
+        "songs.json": payload.encode("utf-8"),
+        "songs_data.js": f"const songs = {payload};\n".encode("utf-8"),
+    }
+    files = {}
+    manifest = {}
+    for name, content in minified.items():
+        hashed = hashed_name(name, content)
+        manifest[name] = hashed
+        files[hashed] = content
+        files.update(compressed(hashed, content))
+    files[MANIFEST_NAME] = json.dumps(manifest, sort_keys=True).encode("utf-8")
+    return files
+
+
+def read_manifest(web_root):
+    try:
+        raw = (Path(web_root) / MANIFEST_NAME).read_text(encoding="utf-8")
+        return json.loads(raw)
+    except (OSError, ValueError):
+        return {}
+
+
+def prune_hashed(web_root, keep):
+    """Delete hashed artifacts (and siblings) whose names are not in ``keep``."""
+    removed = []
+    for path in Path(web_root).iterdir():
+        match = HASHED_RE.match(path.name)
+        if match and match.group("name") not in keep and path.is_file():
+            path.unlink(missing_ok=True)
+            removed.append(path.name)
+    return removed
@@ -0,0 +1,252 @@
+"""Audio metadata stored on Song: duration, bitrate, size and SHA-256.
+
+Duration and bitrate come from headers only: the first frame (plus a
+Xing/Info or VBRI header) of an MP3, the chunk list of a WAV, and the first
+and last pages of an Ogg Vorbis/Opus stream. Unknown or damaged files give
+``None`` rather than an error. Only the content hash reads the whole file.
+"""
+
+import os
+import struct
+
+from django.conf import settings
+
+from .transfer import file_sha256
+
+SCAN_SIZE = 64 * 1024
+
+MP3_BITRATES = {
+    (1, 1): (0, 32, 64, 96, 128, 160, 192, 224, 256, 288, 320, 352, 384, 416, 448),
+    (1, 2): (0, 32, 48, 56, 64, 80, 96, 112, 128, 160, 192, 224, 256, 320, 384),
+    (1, 3): (0, 32, 40, 48, 56, 64, 80, 96, 112, 128, 160, 192, 224, 256, 320),
+    (2, 1): (0, 32, 48, 56, 64, 80, 96, 112, 128, 144, 160, 176, 192, 224, 256),
+    (2, 2): (0, 8, 16, 24, 32, 40, 48, 56, 64, 80, 96, 112, 128, 144, 160),
+    (2, 3): (0, 8, 16, 24, 32, 40, 48, 56, 64, 80, 96, 112, 128, 144, 160),
+}
+MP3_SAMPLE_RATES = {
+    1: (44100, 48000, 32000),
+    2: (22050, 24000, 16000),
+    25: (11025, 12000, 8000),
+}
+MP3_VERSIONS = {3: 1, 2: 2, 0: 25}
+MP3_LAYERS = {3: 1, 2: 2, 1: 3}
+
+# Song field -> key in ``read_audio_metadata``'s result.
+METADATA_FIELDS = {
+    "audio_duration": "duration",
+    "audio_bitrate": "bitrate",
+    "audio_size": "size",
+    "audio_hash": "sha256",
+}
+
+
+def metadata_on_save():
+    return getattr(settings, "PUTEKLIS_AUDIO_METADATA_ON_SAVE", True)
+
+
+def audio_job(song):
+    """Path to pass to ``read_audio_metadata`` for ``song``, or ``None``."""
+    if not song.audio_file:
+        return None
+    return song.audio_file.storage.path(song.audio_file.name)
+
+
+def needs_metadata(song, stat):
+    """Whether the stored metadata may be out of date with the file."""
+    return not song.audio_hash or song.audio_size != stat.st_size
+
+
+def apply_metadata(song, metadata):
+    """Set the metadata fields on ``song``; return whether any changed."""
+    changed = False
+    for field, key in METADATA_FIELDS.items():
+        value = metadata.get(key) if metadata else None
+        if field == "audio_hash":
+            value = value or ""
+        if getattr(song, field) != value:
+            setattr(song, field, value)
+            changed = True
+    return changed
+
+
+def read_audio_metadata(path):
+    """``{"duration", "bitrate", "size", "sha256"}`` for the file at ``path``.
+
+    ``duration`` is in seconds and ``bitrate`` in kbit/s; either is ``None``
+    when the format is not recognised.
+    """
+    size = os.path.getsize(path)
+    with open(path, "rb") as handle:
+        duration, bitrate = probe(handle, size)
+    return {
+        "duration": round(duration, 3) if duration else None,
+        "bitrate": round(bitrate) if bitrate else None,
+        "size": size,
+        "sha256": file_sha256(path),
+    }
+
+
+def probe(handle, size):
+    """``(duration, bitrate)`` of the open binary file ``handle``."""
+    head = handle.read(12)
+    try:
+        if head[:4] == b"RIFF" and head[8:12] == b"WAVE":
+            return _probe_wav(handle, size)
+        if head[:4] == b"OggS":
+            return _probe_ogg(handle, size)
+        return _probe_mp3(handle, size)
+    except (struct.error, IndexError, KeyError, ValueError, ZeroDivisionError):
+        return None, None
+
+
+def _probe_wav(handle, size):
+    handle.seek(12)
+    byte_rate = None
+    while True:
+        header = handle.read(8)
+        if len(header) < 8:
+            return None, None
+        chunk_id, chunk_size = struct.unpack("<4sI", header)
+        if chunk_id == b"fmt ":
+            fmt = handle.read(16)
+            byte_rate = struct.unpack("<HHIIHH", fmt)[3]
+            chunk_size -= 16
+        elif chunk_id == b"data":
+            if not byte_rate:
+                return None, None
+            # Streamed WAVs may leave the size at 0 or 0xFFFFFFFF.
+            data_size = min(chunk_size, size - handle.tell()) or (size - handle.tell())
+            return data_size / byte_rate, byte_rate * 8 / 1000
+        handle.seek(chunk_size + (chunk_size & 1), os.SEEK_CUR)
+
+
+def _ogg_page(data, offset):
+    """``(granule, serial, payload offset)`` of the page at ``offset``."""
+    if offset + 27 > len(data):
+        raise ValueError("Truncated Ogg page header")
+    granule, serial = struct.unpack_from("<qI", data, offset + 6)
+    payload = offset + 27 + data[offset + 26]
+    if payload > len(data):
+        raise ValueError("Truncated Ogg segment table")
+    return granule, serial, payload
+
+
+def _probe_ogg(handle, size):
+    handle.seek(0)
+    data = handle.read(SCAN_SIZE)
+    _, serial, payload = _ogg_page(data, 0)
+    packet = data[payload:]
+    if packet.startswith(b"\x01vorbis"):
+        rate = struct.unpack_from("<I", packet, 12)[0]
+        pre_skip = 0
+    elif packet.startswith(b"OpusHead"):
+        pre_skip = struct.unpack_from("<H", packet, 10)[0]
+        rate = 48000
+    else:
+        return None, None
+
+    handle.seek(max(size - SCAN_SIZE, 0))
+    tail = handle.read(SCAN_SIZE)
+    position = len(tail)
+    while True:
+        position = tail.rfind(b"OggS", 0, position)
+        if position < 0 or position + 27 > len(tail):
+            return None, None
+        granule, page_serial, _ = _ogg_page(tail, position)
+        if page_serial == serial and granule >= 0:
+            break
+    duration = (granule - pre_skip) / rate
+    if duration <= 0:
+        return None, None
+    return duration, size * 8 / duration / 1000
+
+
+def _id3v2_size(handle):
+    handle.seek(0)
+    header = handle.read(10)
+    if header[:3] != b"ID3":
+        return 0
+    length = 0
+    for byte in header[6:10]:
+        length = (length << 7) | (byte & 0x7F)
+    footer = 10 if header[5] & 0x10 else 0
+    return 10 + length + footer
+
+
+def _mp3_header(data, offset):
+    """Parsed frame header at ``offset``, or ``None`` if it is not one."""
+    if data[offset] != 0xFF or data[offset + 1] & 0xE0 != 0xE0:
+        return None
+    b1, b2, b3 = data[offset + 1], data[offset + 2], data[offset + 3]
+    version = MP3_VERSIONS.get((b1 >> 3) & 3)
+    layer = MP3_LAYERS.get((b1 >> 1) & 3)
+    bitrate_index = b2 >> 4
+    rate_index = (b2 >> 2) & 3
+    if not version or not layer or bitrate_index in (0, 15) or rate_index == 3:
+        return None
+    bitrate = MP3_BITRATES[(min(version, 2), layer)][bitrate_index] * 1000
+    sample_rate = MP3_SAMPLE_RATES[version][rate_index]
+    padding = (b2 >> 1) & 1
+    if layer == 1:
+        samples = 384
+        length = (12 * bitrate // sample_rate + padding) * 4
+    else:
+        samples = 1152 if layer == 2 or version == 1 else 576
+        length = samples // 8 * bitrate // sample_rate + padding
+    return {
+        "version": version,
+        "mono": (b3 >> 6) == 3,
+        "bitrate": bitrate,
+        "sample_rate": sample_rate,
+        "samples": samples,
+        "length": length,
+    }
+
+
+def _find_frame(data):
+    """Offset and header of the first frame confirmed by the one after it."""
+    for offset in range(len(data) - 4):
+        header = _mp3_header(data, offset)
+        if header is None:
+            continue
+        following = offset + header["length"]
+        if following + 4 > len(data) or _mp3_header(data, following):
+            return offset, header
+    return None, None
+
+
+def _vbr_frames(frame, header):
+    """Frame count from a Xing/Info or VBRI header in the first frame."""
+    if header["version"] == 1:
+        side_info = 17 if header["mono"] else 32
+    else:
+        side_info = 9 if header["mono"] else 17
+    xing = 4 + side_info
+    if frame[xing : xing + 4] in (b"Xing", b"Info"):
+        flags = struct.unpack_from(">I", frame, xing + 4)[0]
+        if flags & 1:
+            return struct.unpack_from(">I", frame, xing + 8)[0]
+    if frame[36:40] == b"VBRI":
+        return struct.unpack_from(">I", frame, 36 + 14)[0]
+    return None
+
+
+def _probe_mp3(handle, size):
+    start = _id3v2_size(handle)
+    handle.seek(start)
+    data = handle.read(SCAN_SIZE)
+    offset, header = _find_frame(data)
+    if header is None:
+        return None, None
+    audio_start = start + offset
+    audio_end = size
+    handle.seek(max(size - 128, 0))
+    if handle.read(3) == b"TAG":
+        audio_end -= 128
+    audio_bytes = audio_end - audio_start
+
+    frames = _vbr_frames(data[offset : offset + header["length"]], header)
+    if frames:
+        duration = frames * header["samples"] / header["sample_rate"]
+        return duration, audio_bytes * 8 / duration / 1000
+    return audio_bytes * 8 / header["bitrate"], header["bitrate"] / 1000
@@ -0,0 +1,103 @@
+import hashlib
+import threading
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+from django.http import HttpResponse
+
+from .models import CatalogueVersion
+
+VERSION_KEY = "songs:catalogue-version"
+
+_state = threading.local()
+
+
+def get_cache():
+    return caches[getattr(settings, "PUTEKLIS_SONGS_CACHE", "default")]
+
+
+def get_catalogue_version():
+    """Return ``(version, changed_at)``, served from the cache when possible.
+
+    The cached copy expires after ``PUTEKLIS_SONGS_CACHE_VERSION_TTL`` seconds,
+    which bounds staleness for per-process backends such as local memory.
+    A shared backend (Redis) sees the invalidation immediately.
+    """
+    cache = get_cache()
+    state = cache.get(VERSION_KEY)
+    if state is None:
+        state = CatalogueVersion.current()
+        cache.set(
+            VERSION_KEY,
+            state,
+            timeout=getattr(settings, "PUTEKLIS_SONGS_CACHE_VERSION_TTL", 5),
+        )
+    return state
+
+
+def invalidate_catalogue():
+    """Bump the catalogue version and drop the cached copy after commit."""
+    if getattr(_state, "depth", 0):
+        _state.dirty = True
+        return
+    CatalogueVersion.bump()
+    # Drop it now for this process and again once the new rows are visible,
+    # in case a concurrent request re-cached the old version meanwhile.
+    get_cache().delete(VERSION_KEY)
+    transaction.on_commit(lambda: get_cache().delete(VERSION_KEY))
+
+
+@contextmanager
+def deferred_invalidation():
+    """Coalesce invalidations from a bulk operation into a single bump."""
+    _state.depth = getattr(_state, "depth", 0) + 1
+    try:
+        yield
+    finally:
+        _state.depth -= 1
+        if not _state.depth and getattr(_state, "dirty", False):
+            _state.dirty = False
+            invalidate_catalogue()
+
+
+def response_cache_key(request, version, scope):
+    # Absolute URL covers the host used for file links and every query param.
+    raw = "|".join(
+        [
+            request.build_absolute_uri(),
+            request.accepted_renderer.media_type,
+        ]
+    )
+    digest = hashlib.sha256(raw.encode("utf-8")).hexdigest()[:32]
+    return f"songs:response:v{version}:{scope}:{digest}"
+
+
+def get_cached_response(key):
+    return get_cache().get(key)
+
+
+def build_response(entry):
+    return HttpResponse(entry["content"], content_type=entry["content_type"])
+
+
+def cache_response(response, key, etag, last_modified):
+    """Store ``response`` under ``key`` once DRF has rendered it."""
+
+    def store(rendered):
+        if rendered.status_code == 200:
+            get_cache().set(
+                key,
+                {
+                    "content": rendered.content,
+                    "content_type": rendered["Content-Type"],
+                    "etag": etag,
+                    "last_modified": last_modified,
+                },
+                timeout=getattr(settings, "PUTEKLIS_SONGS_CACHE_TIMEOUT", 3600),
+            )
+        return rendered
+
+    response.add_post_render_callback(store)
+    return response
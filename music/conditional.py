@@ -0,0 +1,39 @@
+import hashlib
+
+from django.core.exceptions import ValidationError
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date, quote_etag
+
+
+def song_version(queryset, pk):
+    """Return ``updated_at`` of one song, or ``None`` if it is not visible."""
+    try:
+        return (
+            queryset.order_by()
+            .filter(pk=pk)
+            .values_list("updated_at", flat=True)
+            .first()
+        )
+    except (TypeError, ValueError, ValidationError):
+        return None
+
+
+def make_etag(*parts):
+    digest = hashlib.sha256("|".join(str(part) for part in parts).encode("utf-8"))
+    return quote_etag(digest.hexdigest()[:32])
+
+
+def conditional_response(request, etag, last_modified):
+    """Return a 304/412 response if the client's copy is current, else ``None``."""
+    timestamp = int(last_modified.timestamp()) if last_modified else None
+    response = get_conditional_response(request, etag=etag, last_modified=timestamp)
+    if response is not None:
+        set_validators(response, etag, last_modified)
+    return response
+
+
+def set_validators(response, etag, last_modified):
+    response["ETag"] = etag
+    if last_modified:
+        response["Last-Modified"] = http_date(last_modified.timestamp())
+    return response
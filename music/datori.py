@@ -0,0 +1,83 @@
+import re
+import threading
+from html import escape
+from pathlib import Path
+
+SELECT_OPEN_RE = re.compile(r'<select\b[^>]*\bid="songSelector"[^>]*>')
+SELECT_CLOSE = "</select>"
+DEFAULT_OPTION = '<option value="">-- Izvēlies dziesmu --</option>'
+OPTION_SEPARATOR = "\n    "
+
+_cache = {}
+_lock = threading.Lock()
+
+
+class DatoriTemplate:
+    """datori.html split around the ``songSelector`` options.
+
+    The page is scanned once when parsed; rendering only joins the cached
+    head and tail around freshly escaped ``<option>`` elements.
+    """
+
+    def __init__(self, head, tail):
+        self.head = head
+        self.tail = tail
+
+    @classmethod
+    def parse(cls, content):
+        """Return the template, or ``None`` if the page has no selector."""
+        match = SELECT_OPEN_RE.search(content)
+        if not match:
+            return None
+        close = content.find(SELECT_CLOSE, match.end())
+        if close == -1:
+            return None
+        return cls(content[: match.end()], content[close:])
+
+    @classmethod
+    def load(cls, path):
+        """Parse ``path``, reusing the cached template while the file is unchanged."""
+        path = Path(path)
+        try:
+            stat = path.stat()
+        except FileNotFoundError:
+            return None
+        stamp = (stat.st_mtime_ns, stat.st_size)
+        with _lock:
+            cached = _cache.get(path)
+        if cached and cached[0] == stamp:
+            return cached[1]
+        template = cls.parse(path.read_text(encoding="utf-8", errors="replace"))
+        if template is not None:
+            cls.remember(path, template)
+        return template
+
+    @staticmethod
+    def remember(path, template):
+        """Cache ``template`` for the current state of ``path``.
+
+        Called after publishing the rendered page, whose head and tail are by
+        construction the template's, so the next sync skips the re-parse.
+        """
+        path = Path(path)
+        stat = path.stat()
+        with _lock:
+            _cache[path] = ((stat.st_mtime_ns, stat.st_size), template)
+
+    def render(self, data):
+        parts = [self.head, OPTION_SEPARATOR, DEFAULT_OPTION]
+        for item in data:
+            audio = item.get("audio") or ""
+            title = item.get("title") or ""
+            if not audio or not title:
+                continue
+            parts += (
+                OPTION_SEPARATOR,
+                '<option value="',
+                escape(audio),
+                '">',
+                escape(title, quote=False),
+                "</option>",
+            )
+        parts += ("\n  ", self.tail)
+        return "".join(parts)
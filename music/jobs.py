@@ -0,0 +1,262 @@
+import logging
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from .audiometa import (
+    METADATA_FIELDS,
+    apply_metadata,
+    audio_job,
+    metadata_on_save,
+    read_audio_metadata,
+)
+from .cache import invalidate_catalogue
+from .models import Song, SongTombstone, SyncJob
+from .sync import SongCatalogue, get_web_root, sync_songs, sync_summary
+from .synclog import log_sync
+from .waveform import render_waveform, waveform_job, waveform_on_save
+
+logger = logging.getLogger(__name__)
+
+RESULT_FIELDS = (
+    "added",
+    "updated",
+    "removed",
+    "bytes_copied",
+    "bytes_skipped",
+    "missing",
+)
+
+
+def stale_after():
+    return timedelta(seconds=getattr(settings, "PUTEKLIS_SYNC_JOB_STALE_AFTER", 600))
+
+
+class JobProgress:
+    """``TransferStage`` progress callback that writes to the job row.
+
+    Writes are throttled to one per ``interval`` seconds (plus the last one),
+    and double as the worker's heartbeat.
+    """
+
+    def __init__(self, job, interval=0.5):
+        self.job = job
+        self.interval = interval
+        self._last = 0.0
+
+    def __call__(self, done, total):
+        now = time.monotonic()
+        if done < total and now - self._last < self.interval:
+            return
+        self._last = now
+        SyncJob.objects.filter(pk=self.job.pk).update(
+            progress_done=done,
+            progress_total=total,
+            heartbeat_at=timezone.now(),
+        )
+
+
+def sync_worker_enabled():
+    """Whether a ``run_sync_worker`` process is deployed to run queued work."""
+    return getattr(settings, "PUTEKLIS_SYNC_WORKER", False)
+
+
+def autosync_enabled():
+    return (
+        getattr(settings, "PUTEKLIS_AUTOSYNC", True)
+        and sync_worker_enabled()
+        and get_web_root() is not None
+    )
+
+
+def request_autosync():
+    """Schedule a debounced incremental sync after a song change."""
+    return SyncJob.enqueue(
+        kind=SyncJob.KIND_INCREMENTAL,
+        delay=timedelta(seconds=getattr(settings, "PUTEKLIS_AUTOSYNC_DEBOUNCE", 5)),
+        max_delay=timedelta(
+            seconds=getattr(settings, "PUTEKLIS_AUTOSYNC_MAX_DELAY", 60)
+        ),
+    )
+
+
+def queue_audio(songs):
+    """Leave the new audio of ``songs`` to ``process_pending_audio``.
+
+    Called when a save or bulk write changes the audio file. What was derived
+    from the previous file is cleared right away; reading the new one (a full
+    SHA-256 pass, maybe an ffmpeg decode) happens in run_sync_worker, not in
+    the request. Without a worker it happens after the commit instead.
+    """
+    metadata, waveform = metadata_on_save(), waveform_on_save()
+    songs = list(songs)
+    if not songs or not (metadata or waveform):
+        return
+    for song in songs:
+        if metadata:
+            apply_metadata(song, None)
+        if waveform:
+            song.waveform = ""
+        song.audio_pending = True
+    cleared = {"audio_pending": True}
+    if metadata:
+        cleared.update({field: getattr(songs[0], field) for field in METADATA_FIELDS})
+    if waveform:
+        cleared["waveform"] = ""
+    for start in range(0, len(songs), 1000):
+        ids = [song.pk for song in songs[start : start + 1000]]
+        Song.objects.filter(pk__in=ids).update(**cleared)
+    if not sync_worker_enabled():
+        transaction.on_commit(drain_pending_audio)
+
+
+def _process_audio(song):
+    """Fields to store for ``song``'s audio: metadata and waveform peaks."""
+    changes = {}
+    digest = None
+    path = audio_job(song)
+    if metadata_on_save():
+        try:
+            metadata = read_audio_metadata(path) if path else None
+        except OSError as exc:
+            # Left empty; extract_audio_metadata can retry it later.
+            logger.warning("Cannot read audio of %s: %s", song.title, exc)
+            metadata = None
+        apply_metadata(song, metadata)
+        changes.update({field: getattr(song, field) for field in METADATA_FIELDS})
+        digest = song.audio_hash or None
+    if waveform_on_save():
+        job = waveform_job(song)
+        try:
+            # The hash just read names the peaks file; no second pass.
+            name = render_waveform(*job, digest=digest) if job else ""
+        except OSError as exc:
+            logger.warning("Cannot draw waveform of %s: %s", song.title, exc)
+            name = ""
+        changes["waveform"] = name
+    return changes
+
+
+def drain_pending_audio():
+    """Process queued audio until none is left; used when no worker runs."""
+    while process_pending_audio():
+        pass
+
+
+def process_pending_audio(limit=25):
+    """Process up to ``limit`` songs queued by ``queue_audio``; return how many."""
+    songs = list(
+        Song.objects.filter(audio_pending=True)
+        .only("id", "title", "audio_file", "waveform", *METADATA_FIELDS)
+        .order_by("id")[:limit]
+    )
+    updated = 0
+    for song in songs:
+        try:
+            changes = _process_audio(song)
+        except Exception:
+            # One bad file must not stop the queue: leave it unprocessed.
+            logger.exception("Cannot process audio of %s", song.title)
+            changes = {}
+        # Matching the name skips songs whose audio changed again meanwhile:
+        # they stay queued for the next round.
+        updated += Song.objects.filter(
+            pk=song.pk, audio_file=song.audio_file.name
+        ).update(audio_pending=False, updated_at=timezone.now(), **changes)
+    if updated:
+        # update() sends no signals: do what song_changed and autosync would.
+        invalidate_catalogue()
+        if autosync_enabled():
+            request_autosync()
+    return len(songs)
+
+
+def _sync(job):
+    progress = JobProgress(job)
+    if job.kind == SyncJob.KIND_FULL:
+        return sync_songs(
+            Song.objects.iterator(chunk_size=2000),
+            catalogue=SongCatalogue(),
+            progress=progress,
+        )
+    since = SyncJob.last_synced_at()
+    songs = Song.objects.all()
+    removals = SongTombstone.objects.none()
+    if since is not None:
+        # Writes stamped before the last job started may have committed after
+        # it read them; re-syncing a song is harmless, missing one is not.
+        since -= timedelta(seconds=getattr(settings, "PUTEKLIS_CHANGES_OVERLAP", 300))
+        songs = songs.filter(updated_at__gte=since)
+        removals = SongTombstone.objects.filter(removed_at__gte=since)
+    return sync_songs(
+        songs.iterator(chunk_size=2000),
+        progress=progress,
+        removals=removals.values_list("title", "audio").iterator(),
+    )
+
+
+def run_job(job):
+    """Run a claimed sync and record its outcome on ``job``.
+
+    A full job rebuilds songs.json from the database. An incremental job
+    merges only the songs and tombstones changed since the last successful
+    job started (everything, on top of the current file, if there is none).
+    """
+    try:
+        result = _sync(job)
+    except Exception as exc:
+        logger.exception("Sync job %s failed", job.pk)
+        job.status = SyncJob.STATUS_FAILED
+        job.error = str(exc) or exc.__class__.__name__
+        job.finished_at = timezone.now()
+        job.save(update_fields=["status", "error", "finished_at"])
+        log_sync(
+            "sync_job",
+            f"Uzdevums #{job.pk} neizdevās: {job.error}",
+            duration=_duration(job),
+            job=job.pk,
+        )
+        return job
+
+    job.status = SyncJob.STATUS_DONE
+    job.finished_at = timezone.now()
+    fields = ["status", "finished_at"]
+    if result is None:
+        job.error = "PUTEKLIS_WEB_PATH nav iestatīts."
+        fields.append("error")
+    else:
+        for name in RESULT_FIELDS:
+            setattr(job, name, getattr(result, name))
+        fields += RESULT_FIELDS
+    job.save(update_fields=fields)
+    message = f"Sinhronizācija pabeigta (uzdevums #{job.pk}). {sync_summary(job)}"
+    action = "sync_now" if job.kind == SyncJob.KIND_FULL else "autosync"
+    log_sync(
+        action,
+        message,
+        job.missing,
+        result=job,
+        duration=_duration(job),
+        job=job.pk,
+        requests=job.requests,
+    )
+    return job
+
+
+def _duration(job):
+    return (job.finished_at - job.started_at).total_seconds()
+
+
+def run_pending():
+    """Run queued jobs until none is left; return how many ran."""
+    SyncJob.fail_stale(timezone.now() - stale_after())
+    count = 0
+    while True:
+        job = SyncJob.claim_next()
+        if job is None:
+            return count
+        run_job(job)
+        count += 1
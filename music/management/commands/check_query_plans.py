@@ -0,0 +1,149 @@
+import json
+from datetime import timedelta
+from types import SimpleNamespace
+
+from django.contrib.auth.models import AnonymousUser
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.utils import timezone
+
+from music.models import SongTombstone
+from music.pagination import keyset_after, keyset_ordering
+from music.views import SongViewSet
+
+POSTGRES_BAD_NODES = {"Seq Scan", "Sort", "Incremental Sort"}
+SQLITE_BAD_DETAILS = ("USE TEMP B-TREE",)
+
+
+class Command(BaseCommand):
+    help = "EXPLAIN the API querysets and fail on sequential scans or sorts"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--no-analyze",
+            action="store_true",
+            help="Plan only, without executing the queries (PostgreSQL)",
+        )
+        parser.add_argument(
+            "--show-plans",
+            action="store_true",
+            help="Print every plan, not just the failing ones",
+        )
+
+    def handle(self, *args, **options):
+        vendor = connection.vendor
+        if vendor not in ("postgresql", "sqlite"):
+            raise CommandError(f"Unsupported database backend: {vendor}")
+
+        failures = []
+        for label, queryset, seek in self._querysets():
+            if vendor == "postgresql":
+                plan, problems = self._explain_postgresql(
+                    queryset, analyze=not options["no_analyze"], seek=seek
+                )
+            else:
+                plan, problems = self._explain_sqlite(queryset, seek=seek)
+            if problems:
+                failures.append(label)
+                self.stdout.write(
+                    self.style.ERROR(f"FAIL {label}: {', '.join(problems)}")
+                )
+            else:
+                self.stdout.write(self.style.SUCCESS(f"ok   {label}"))
+            if problems or options["show_plans"]:
+                self.stdout.write(plan)
+
+        if failures:
+            raise CommandError(f"Unindexed query plans: {', '.join(failures)}")
+
+    def _querysets(self):
+        anonymous = self._viewset_queryset(AnonymousUser())
+        staff = self._viewset_queryset(SimpleNamespace(is_staff=True))
+        since = timezone.now() - timedelta(days=1)
+        # A cursor in the middle of the list: the page query has to start the
+        # index scan there, not filter its way to it from the first row.
+        position = [since.date(), since, 1]
+        return [
+            ("public list", anonymous, False),
+            ("public page", anonymous.order_by(*keyset_ordering())[:51], False),
+            (
+                "public page after cursor",
+                anonymous.order_by(*keyset_ordering()).filter(keyset_after(position))[
+                    :51
+                ],
+                True,
+            ),
+            ("staff list", staff, False),
+            (
+                "staff page after cursor",
+                staff.order_by(*keyset_ordering()).filter(keyset_after(position))[:51],
+                True,
+            ),
+            ("retrieve", anonymous.filter(pk=1), False),
+            (
+                "changes since",
+                anonymous.filter(updated_at__gt=since).order_by("updated_at"),
+                False,
+            ),
+            (
+                "tombstones since",
+                SongTombstone.objects.filter(removed_at__gt=since),
+                False,
+            ),
+        ]
+
+    @staticmethod
+    def _viewset_queryset(user):
+        view = SongViewSet()
+        view.request = SimpleNamespace(user=user)
+        view.action = "list"
+        view.format_kwarg = None
+        return view.get_queryset()
+
+    @staticmethod
+    def _explain_postgresql(queryset, analyze, seek=False):
+        sql, params = queryset.query.sql_with_params()
+        options = "ANALYZE, FORMAT JSON" if analyze else "FORMAT JSON"
+        # With sequential scans and sorts priced out, the planner only picks
+        # them when no index can serve the query, whatever the table size.
+        with transaction.atomic(), connection.cursor() as cursor:
+            cursor.execute("SET LOCAL enable_seqscan = off")
+            cursor.execute("SET LOCAL enable_sort = off")
+            cursor.execute(f"EXPLAIN ({options}) {sql}", params)
+            raw = cursor.fetchone()[0]
+        document = json.loads(raw) if isinstance(raw, str) else raw
+        root = document[0]["Plan"]
+
+        problems = []
+        seeks = False
+        stack = [root]
+        while stack:
+            node = stack.pop()
+            if node["Node Type"] in POSTGRES_BAD_NODES:
+                relation = node.get("Relation Name")
+                detail = f" on {relation}" if relation else ""
+                problems.append(f"{node['Node Type']}{detail}")
+            seeks = seeks or "<" in node.get("Index Cond", "")
+            stack.extend(node.get("Plans", []))
+        if seek and not seeks:
+            problems.append("keyset condition is not an Index Cond")
+        return json.dumps(document, indent=2), problems
+
+    @staticmethod
+    def _explain_sqlite(queryset, seek=False):
+        sql, params = queryset.query.sql_with_params()
+        with connection.cursor() as cursor:
+            cursor.execute(f"EXPLAIN QUERY PLAN {sql}", params)
+            rows = cursor.fetchall()
+
+        problems = []
+        for row in rows:
+            detail = row[-1]
+            if detail.startswith("SCAN ") and " USING " not in detail:
+                problems.append(detail)
+            elif detail.startswith(SQLITE_BAD_DETAILS):
+                problems.append(detail)
+        # e.g. "SEARCH music_song USING INDEX ... (status=? AND (a,b)<(?,?))"
+        if seek and not any("<" in row[-1] for row in rows):
+            problems.append("keyset condition is not an index range")
+        return "\n".join(row[-1] for row in rows), problems
@@ -0,0 +1,53 @@
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.management.base import BaseCommand
+
+from music.models import Song
+from music.transfer import transfer_workers
+
+FIELDS = ("audio_file", "lyrics_file", "cover_image")
+
+
+class Command(BaseCommand):
+    help = "Move existing media into the content-addressed blob store"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--workers",
+            type=int,
+            default=transfer_workers(),
+            help="Files hashed in parallel (1 hashes sequentially)",
+        )
+        parser.add_argument(
+            "--dry-run",
+            action="store_true",
+            help="Only count unused blobs; do not link or delete anything",
+        )
+
+    def handle(self, *args, **options):
+        storage = Song._meta.get_field("audio_file").storage
+        names = set()
+        for row in Song.objects.values_list(*FIELDS):
+            names.update(name for name in row if name and storage.exists(name))
+
+        linked = 0
+        if not options["dry_run"]:
+            with ThreadPoolExecutor(max_workers=max(options["workers"], 1)) as pool:
+                linked = sum(pool.map(self._adopt, [storage] * len(names), names))
+
+        unused = storage.prune_blobs(dry_run=options["dry_run"])
+
+        verb = "Would remove" if options["dry_run"] else "Removed"
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Linked {linked} of {len(names)} files. "
+                f"{verb} {unused} unused blobs."
+            )
+        )
+
+    def _adopt(self, storage, name):
+        try:
+            return storage.adopt(name)
+        except OSError as exc:
+            self.stderr.write(f"{name}: {exc}")
+            return False
@@ -0,0 +1,84 @@
+import os
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.utils import timezone
+
+from music.audiometa import (
+    METADATA_FIELDS,
+    apply_metadata,
+    audio_job,
+    needs_metadata,
+    read_audio_metadata,
+)
+from music.cache import deferred_invalidation
+from music.models import Song
+from music.pool import run_jobs
+from music.signals import bulk_saved
+
+
+class Command(BaseCommand):
+    help = "Read duration, bitrate, size and hash of every song's audio file"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--workers",
+            type=int,
+            default=os.cpu_count() or 1,
+            help="Worker processes for reading files (1 reads inline)",
+        )
+        parser.add_argument(
+            "--force",
+            action="store_true",
+            help="Re-read every file, not only new or resized ones",
+        )
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=500,
+            help="Songs per UPDATE statement",
+        )
+
+    @deferred_invalidation()
+    def handle(self, *args, **options):
+        songs = Song.objects.only("id", "title", "audio_file", *METADATA_FIELDS)
+        jobs = {}
+        changed = []
+        for song in songs.iterator():
+            path = audio_job(song)
+            try:
+                stat = os.stat(path) if path else None
+            except OSError:
+                stat = None
+            if stat is None:
+                if apply_metadata(song, None):
+                    changed.append(song)
+                continue
+            if options["force"] or needs_metadata(song, stat):
+                jobs[song.pk] = (song, (path,))
+
+        failed = 0
+        results = run_jobs(
+            read_audio_metadata, jobs.values(), options["workers"], errors=(Exception,)
+        )
+        for song, result, error in results:
+            if error is not None:
+                failed += 1
+                self.stderr.write(f"{song.title}: {error}")
+            elif apply_metadata(song, result):
+                changed.append(song)
+
+        now = timezone.now()
+        for song in changed:
+            song.updated_at = now
+        fields = [*METADATA_FIELDS, "updated_at"]
+        with transaction.atomic():
+            Song.objects.bulk_update(
+                changed, fields, batch_size=max(options["batch_size"], 1)
+            )
+            bulk_saved(changed, update_fields=fields)
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Read {len(jobs)}, updated {len(changed)}, failed {failed}."
+            )
+        )
@@ -4,8 +4,20 @@ from pathlib import Path
 
 from django.conf import settings
 from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.utils import timezone
 
+from music.cache import deferred_invalidation
 from music.models import Song
+from music.signals import bulk_saved
+from music.transfer import TransferStage, stat_files, transfer_workers
+
+# Model field -> (songs.json key, media subfolder).
+FIELDS = {
+    "audio_file": ("audio", "music"),
+    "lyrics_file": ("lyrics", "lyrics"),
+    "cover_image": ("image", "cover"),
+}
 
 
 class Command(BaseCommand):
@@ -28,7 +40,20 @@ class Command(BaseCommand):
             action="store_true",
             help="Report changes without modifying files or DB",
         )
+        parser.add_argument(
+            "--workers",
+            type=int,
+            default=transfer_workers(),
+            help="Parallel file checks and copies (1 runs sequentially)",
+        )
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=500,
+            help="Songs per UPDATE statement",
+        )
 
+    @deferred_invalidation()
     def handle(self, *args, **options):
         json_path = Path(options["json_path"]).expanduser()
         source_root = Path(options["source_root"]).expanduser()
@@ -41,29 +66,55 @@ class Command(BaseCommand):
         mapping = self._load_mapping(json_path)
         media_root = Path(settings.MEDIA_ROOT)
 
-        updated = 0
-        skipped = 0
-        copied = 0
-
-        for song in Song.objects.all():
-            target = mapping.get(song.title)
-            if not target:
-                skipped += 1
-                continue
+        songs = list(Song.objects.only("id", "title", *FIELDS))
+        skipped = sum(1 for song in songs if song.title not in mapping)
+        renames = [
+            rename
+            for song in songs
+            if song.title in mapping
+            for rename in self._renames(song, mapping[song.title])
+        ]
+        stats = stat_files(
+            (
+                path
+                for song, field_name, target_rel in renames
+                for path in self._candidates(
+                    media_root, source_root, target_rel, getattr(song, field_name)
+                )
+            ),
+            workers=options["workers"],
+        )
+        copies = self._plan_copies(renames, media_root, source_root, stats)
 
-            changed, copied_files = self._apply_targets(
-                song=song,
-                media_root=media_root,
-                source_root=source_root,
-                targets=target,
-                dry_run=dry_run,
+        for song, field_name, target_rel in renames:
+            self.stdout.write(
+                f"{song.title}: {field_name} "
+                f"{getattr(song, field_name).name or '-'} -> {target_rel}"
             )
-            if changed:
-                updated += 1
-            copied += copied_files
+        if dry_run:
+            planned = {song.pk for song, _, _ in renames}
+            self.stdout.write(
+                f"Dry run. Would update: {len(planned)}, "
+                f"Copy: {len(copies)}, Skipped: {skipped}"
+            )
+            return
 
+        stage = TransferStage(workers=options["workers"])
+        for target, (source, storage, name) in copies.items():
+            stage.add(target, self._copy, source, storage, name)
+        errors = stage.run()
+        for target, exc in errors.items():
+            self.stderr.write(f"Copy failed: {target} ({exc.strerror or exc})")
+
+        changed = {}
+        for song, field_name, target_rel in renames:
+            if media_root / target_rel not in errors:
+                getattr(song, field_name).name = target_rel
+                changed[song.pk] = song
+        updated = self._apply(list(changed.values()), options["batch_size"])
         self.stdout.write(
-            f"Done. Updated: {updated}, Copied: {copied}, Skipped: {skipped}"
+            f"Done. Updated: {updated}, Copied: {len(copies) - len(errors)}, "
+            f"Skipped: {skipped}"
         )
 
     @staticmethod
@@ -82,40 +133,60 @@ class Command(BaseCommand):
             }
         return mapping
 
-    def _apply_targets(self, song, media_root, source_root, targets, dry_run):
-        changed = False
-        copied = 0
-
-        for field_name, subdir in (
-            ("audio_file", "music"),
-            ("lyrics_file", "lyrics"),
-            ("cover_image", "cover"),
-        ):
-            rel = targets.get(subdir) or ""
+    @staticmethod
+    def _renames(song, targets):
+        """``(song, field name, new name)`` for fields not matching ``targets``."""
+        for field_name, (key, subdir) in FIELDS.items():
+            rel = targets.get(key) or ""
             if not rel:
                 continue
             target_name = Path(rel).name
-            target_rel = f"{subdir}/{target_name}"
-            target_media = media_root / target_rel
-
             field = getattr(song, field_name)
             if field and field.name.endswith(target_name):
                 continue
+            yield song, field_name, f"{subdir}/{target_name}"
+
+    @staticmethod
+    def _candidates(media_root, source_root, target_rel, field):
+        """Paths to stat for one rename: the target, then copy sources."""
+        paths = [media_root / target_rel, source_root / target_rel]
+        if field:
+            paths.append(Path(field.path))
+        return paths
+
+    def _plan_copies(self, renames, media_root, source_root, stats):
+        """``{target: (source, storage, name)}`` for renamed files not yet in
+        ``media_root``."""
+        copies = {}
+        for song, field_name, target_rel in renames:
+            target, *sources = self._candidates(
+                media_root, source_root, target_rel, getattr(song, field_name)
+            )
+            if stats[target] is not None or target in copies:
+                continue
+            source = next((path for path in sources if stats[path]), None)
+            if source is not None:
+                storage = Song._meta.get_field(field_name).storage
+                copies[target] = (source, storage, target_rel)
+        return copies
 
-            if not target_media.exists():
-                source_path = source_root / target_rel
-                if not source_path.exists() and field:
-                    source_path = Path(field.path)
-                if source_path.exists():
-                    if not dry_run:
-                        target_media.parent.mkdir(parents=True, exist_ok=True)
-                        shutil.copy2(source_path, target_media)
-                    copied += 1
-
-            if not dry_run:
-                field.name = target_rel
-            changed = True
-
-        if changed and not dry_run:
-            song.save(update_fields=["audio_file", "lyrics_file", "cover_image"])
-        return changed, copied
+    @staticmethod
+    def _copy(source, storage, name):
+        target = Path(storage.path(name))
+        target.parent.mkdir(parents=True, exist_ok=True)
+        shutil.copy2(source, target)
+        # Into the blob store, as if saved through the storage: shares the
+        # blob with any file of the same content.
+        storage.adopt(name)
+
+    @staticmethod
+    def _apply(songs, batch_size):
+        """Write the new names with chunked ``bulk_update`` in one transaction."""
+        now = timezone.now()
+        for song in songs:
+            song.updated_at = now
+        fields = [*FIELDS, "updated_at"]
+        with transaction.atomic():
+            Song.objects.bulk_update(songs, fields, batch_size=max(batch_size, 1))
+            bulk_saved(songs, update_fields=fields)
+        return len(songs)
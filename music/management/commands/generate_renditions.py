@@ -0,0 +1,73 @@
+import os
+
+from django.core.management.base import BaseCommand
+from PIL import Image
+
+from music.cache import deferred_invalidation
+from music.models import Song
+from music.pool import run_jobs
+from music.renditions import (
+    cover_job,
+    needs_renditions,
+    render_cover,
+    store_renditions,
+)
+
+
+class Command(BaseCommand):
+    help = "Generate cover thumbnails (JPEG and WebP) for songs missing them"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--workers",
+            type=int,
+            default=os.cpu_count() or 1,
+            help="Worker processes for resizing (1 renders inline)",
+        )
+        parser.add_argument(
+            "--force",
+            action="store_true",
+            help="Check every song, not only those with missing renditions",
+        )
+
+    @deferred_invalidation()
+    def handle(self, *args, **options):
+        songs = Song.objects.only(
+            "id", "title", "cover_image", "cover_hash", "cover_renditions"
+        )
+        jobs = {}
+        cleared = 0
+        for song in songs.iterator():
+            if not options["force"] and not needs_renditions(song):
+                continue
+            job = cover_job(song)
+            if job is None:
+                if song.cover_renditions:
+                    store_renditions(song.pk, "", {})
+                    cleared += 1
+                continue
+            jobs[song.pk] = (song, job)
+
+        generated = 0
+        failed = 0
+        results = run_jobs(
+            render_cover,
+            jobs.values(),
+            options["workers"],
+            errors=(OSError, Image.DecompressionBombError),
+        )
+        for song, result, error in results:
+            if error is not None:
+                failed += 1
+                self.stderr.write(f"{song.title}: {error}")
+                continue
+            source_hash, renditions = result
+            if source_hash != song.cover_hash or renditions != song.cover_renditions:
+                store_renditions(song.pk, source_hash, renditions)
+                generated += 1
+
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Generated {generated}, cleared {cleared}, failed {failed}."
+            )
+        )
@@ -0,0 +1,76 @@
+import os
+
+from django.core.management.base import BaseCommand
+
+from music.models import Song
+from music.pool import run_jobs
+from music.waveform import (
+    ffmpeg_path,
+    needs_waveform,
+    render_waveform,
+    waveform_job,
+)
+
+
+def store_waveform(song_id, name):
+    # Peaks are served by their own endpoint and not part of the catalogue,
+    # so the catalogue version and updated_at are left alone.
+    Song.objects.filter(pk=song_id).update(waveform=name)
+
+
+class Command(BaseCommand):
+    help = "Generate waveform peaks for songs missing them"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--workers",
+            type=int,
+            default=os.cpu_count() or 1,
+            help="Worker processes for decoding (1 decodes inline)",
+        )
+        parser.add_argument(
+            "--force",
+            action="store_true",
+            help="Check every song, not only those with missing peaks",
+        )
+
+    def handle(self, *args, **options):
+        if not ffmpeg_path():
+            self.stderr.write("ffmpeg not found: only WAV files get peaks.")
+        songs = Song.objects.only("id", "title", "audio_file", "waveform")
+        jobs = {}
+        cleared = 0
+        for song in songs.iterator():
+            if not options["force"] and not needs_waveform(song):
+                continue
+            job = waveform_job(song)
+            if job is None:
+                if song.waveform:
+                    store_waveform(song.pk, "")
+                    cleared += 1
+                continue
+            jobs[song.pk] = (song, job)
+
+        generated = 0
+        unsupported = 0
+        failed = 0
+        results = run_jobs(
+            render_waveform, jobs.values(), options["workers"], errors=(Exception,)
+        )
+        for song, name, error in results:
+            if error is not None:
+                failed += 1
+                self.stderr.write(f"{song.title}: {error}")
+                continue
+            if not name:
+                unsupported += 1
+            if name != song.waveform:
+                store_waveform(song.pk, name)
+                generated += bool(name)
+
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Generated {generated}, cleared {cleared}, "
+                f"unsupported {unsupported}, failed {failed}."
+            )
+        )
@@ -1,13 +1,19 @@
 import json
+import os
 from datetime import datetime
+from functools import partial
 from pathlib import Path
 
 from django.conf import settings
 from django.core.files import File
-from django.core.management.base import BaseCommand
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
 from django.utils import timezone
 
+from music.cache import deferred_invalidation
 from music.models import Song
+from music.signals import bulk_saved
+from music.transfer import TransferStage, transfer_workers
 
 
 class Command(BaseCommand):
@@ -31,7 +37,25 @@ class Command(BaseCommand):
             default=Song.STATUS_PUBLISHED,
             help="Status for imported songs",
         )
+        parser.add_argument(
+            "--workers",
+            type=int,
+            default=transfer_workers(),
+            help="Parallel file copies (1 copies sequentially)",
+        )
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=500,
+            help="Songs inserted per bulk INSERT",
+        )
+        parser.add_argument(
+            "--dry-run",
+            action="store_true",
+            help="Validate the file and report planned work without writing",
+        )
 
+    @deferred_invalidation()
     def handle(self, *args, **options):
         json_path = Path(options["path"]).expanduser()
         source_root = Path(options["source_root"]).expanduser()
@@ -43,44 +67,111 @@ class Command(BaseCommand):
 
         raw = json_path.read_text(encoding="utf-8", errors="replace")
         data = json.loads(raw)
+        if not isinstance(data, list):
+            raise CommandError(f"{json_path}: expected a JSON list of songs")
+
+        entries, skipped = self._validate(data)
+        if options["verbosity"] > 1:
+            for index, reason in skipped:
+                self.stdout.write(f"Skipped entry {index}: {reason}")
+
+        songs = []
+        # Storage name -> fields waiting for that file; the first one copies it.
+        pending = {}
+        missing = []
+        stage = TransferStage(
+            workers=options["workers"],
+            progress=self._progress if options["verbosity"] > 1 else None,
+        )
+        attach = partial(
+            self._attach_file, stage=stage, pending=pending, missing=missing
+        )
+        for title, style, audio_rel, lyrics_rel, image_rel in entries:
+            song = Song(title=title, style=style, status=status)
+            attach(song.audio_file, source_root, audio_rel, name=Path(audio_rel).name)
+            attach(song.lyrics_file, source_root, lyrics_rel, warn_missing=False)
+            attach(song.cover_image, source_root, image_rel)
+            created_at = self._get_audio_mtime(source_root, audio_rel)
+            if created_at:
+                song.created_at = created_at
+            songs.append(song)
+
+        if options["dry_run"]:
+            for path in missing:
+                self.stdout.write(self.style.WARNING(f"Missing file: {path}"))
+            self.stdout.write(
+                f"Dry run. Would create: {len(songs)}, Skipped: {len(skipped)}, "
+                f"Files to copy: {len(pending)}"
+            )
+            return
 
-        created = 0
-        skipped = 0
-
-        for item in data:
-            title = (item.get("title") or "").strip()
-            audio_rel = self._normalize_rel(item.get("audio"))
-            lyrics_rel = self._normalize_rel(item.get("lyrics"))
-            image_rel = self._normalize_rel(item.get("image"))
-            style = (item.get("style") or "").strip()
+        errors = stage.run()
+        for name, fields in pending.items():
+            if name in errors:
+                exc = errors[name]
+                missing.append(f"{name} ({exc.strerror or exc})")
+                continue
+            for field in fields[1:]:
+                field.name = fields[0].name
+        for path in missing:
+            self.stdout.write(self.style.WARNING(f"Missing file: {path}"))
+
+        created = self._insert(songs, max(options["batch_size"], 1))
+        self.stdout.write(
+            f"Import complete. Created: {created}, Skipped: {len(skipped)}"
+        )
 
+    @staticmethod
+    def _validate(data):
+        """Split ``data`` into importable entries and ``(index, reason)`` skips.
+
+        Existing songs are matched on ``(title, audio file name)``, loaded
+        once up front instead of queried per entry.
+        """
+        existing = {
+            (title, os.path.basename(audio))
+            for title, audio in Song.objects.values_list("title", "audio_file")
+        }
+        max_title = Song._meta.get_field("title").max_length
+        normalize = Command._normalize_rel
+        entries = []
+        skipped = []
+        for index, item in enumerate(data):
+            if not isinstance(item, dict):
+                skipped.append((index, "not an object"))
+                continue
+            title = str(item.get("title") or "").strip()
+            audio_rel = normalize(item.get("audio"))
             if not title or not audio_rel:
-                skipped += 1
+                skipped.append((index, "missing title or audio"))
                 continue
-
-            audio_name = Path(audio_rel).name
-            if Song.objects.filter(
-                title=title, audio_file__endswith=audio_name
-            ).exists():
-                skipped += 1
+            if len(title) > max_title:
+                skipped.append((index, f"title longer than {max_title} characters"))
                 continue
-
-            song = Song(title=title, style=style, status=status)
-            self._attach_file(song.audio_file, source_root, audio_rel, name=audio_name)
-            self._attach_file(
-                song.lyrics_file,
-                source_root,
-                lyrics_rel,
-                warn_missing=False,
+            key = (title, Path(audio_rel).name)
+            if key in existing:
+                skipped.append((index, "already imported"))
+                continue
+            existing.add(key)
+            entries.append(
+                (
+                    title,
+                    str(item.get("style") or "").strip(),
+                    audio_rel,
+                    normalize(item.get("lyrics")),
+                    normalize(item.get("image")),
+                )
             )
-            self._attach_file(song.cover_image, source_root, image_rel)
-            created_at = self._get_audio_mtime(source_root, audio_rel)
-            if created_at:
-                song.created_at = created_at
-            song.save()
-            created += 1
+        return entries, skipped
 
-        self.stdout.write(f"Import complete. Created: {created}, Skipped: {skipped}")
+    @staticmethod
+    def _insert(songs, batch_size):
+        """Insert ``songs`` in batches inside one transaction."""
+        with transaction.atomic():
+            for start in range(0, len(songs), batch_size):
+                Song.objects.bulk_create(songs[start : start + batch_size])
+            bulk_saved(songs)
+        return len(songs)
 
     @staticmethod
     def _normalize_rel(value):
@@ -88,23 +179,44 @@ class Command(BaseCommand):
             return ""
         return str(value).replace("\\", "/").lstrip("/")
 
-    def _attach_file(self, field, source_root, rel_path, warn_missing=True, name=None):
+    def _attach_file(
+        self,
+        field,
+        source_root,
+        rel_path,
+        stage,
+        pending,
+        missing,
+        warn_missing=True,
+        name=None,
+    ):
         if not rel_path:
             return
         if name is None:
             name = rel_path
         storage = field.storage
+        if name in pending:
+            pending[name].append(field)
+            return
         if storage.exists(name):
             field.name = name
             return
         source_path = source_root / rel_path
         if not source_path.exists():
             if warn_missing:
-                self.stdout.write(self.style.WARNING(f"Missing file: {source_path}"))
+                missing.append(str(source_path))
             return
+        pending[name] = [field]
+        stage.add(name, self._store_file, field, name, source_path)
+
+    @staticmethod
+    def _store_file(field, name, source_path):
         with source_path.open("rb") as handle:
             field.save(name, File(handle), save=False)
 
+    def _progress(self, done, total):
+        self.stdout.write(f"Copied {done}/{total} files")
+
     def _get_audio_mtime(self, source_root, rel_path):
         if not rel_path:
             return None
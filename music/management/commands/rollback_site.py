@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from music.publish import Publisher
+from music.sync import get_web_root
+
+
+class Command(BaseCommand):
+    help = "Restore the previously published songs.json, songs_data.js and datori.html"
+
+    def handle(self, *args, **options):
+        web_root = get_web_root()
+        if web_root is None:
+            raise CommandError("PUTEKLIS_WEB_PATH is not configured")
+        restored = Publisher(web_root).rollback()
+        if not restored:
+            raise CommandError("No previous generation to restore")
+        self.stdout.write(self.style.SUCCESS(f"Restored: {', '.join(restored)}"))
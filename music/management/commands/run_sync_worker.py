@@ -0,0 +1,42 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from music.jobs import process_pending_audio, run_pending
+
+
+class Command(BaseCommand):
+    help = (
+        "Run queued static-site sync jobs and read new audio files "
+        "(keep one worker running)"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--once",
+            action="store_true",
+            help="Run the jobs and audio queued now, then exit",
+        )
+        parser.add_argument(
+            "--interval",
+            type=float,
+            default=getattr(settings, "PUTEKLIS_SYNC_WORKER_INTERVAL", 2.0),
+            help="Seconds between polls for new jobs",
+        )
+
+    def handle(self, *args, **options):
+        while True:
+            # Audio first, so that a sync due now already has its metadata;
+            # one batch per round, so a large import does not hold syncs up.
+            audio = process_pending_audio()
+            if audio:
+                self.stdout.write(f"Read {audio} audio file(s).")
+            count = run_pending()
+            if count:
+                self.stdout.write(f"Ran {count} sync job(s).")
+            if audio:
+                continue
+            if options["once"]:
+                return
+            time.sleep(options["interval"])
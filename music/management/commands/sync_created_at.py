@@ -4,9 +4,13 @@ from pathlib import Path
 
 from django.conf import settings
 from django.core.management.base import BaseCommand
+from django.db import transaction
 from django.utils import timezone
 
+from music.cache import deferred_invalidation
 from music.models import Song
+from music.signals import bulk_saved
+from music.transfer import stat_files, transfer_workers
 
 
 class Command(BaseCommand):
@@ -29,37 +33,79 @@ class Command(BaseCommand):
             action="store_true",
             help="Fallback to media/ if source-root file missing",
         )
+        parser.add_argument(
+            "--dry-run",
+            action="store_true",
+            help="Report changes without modifying the DB",
+        )
+        parser.add_argument(
+            "--workers",
+            type=int,
+            default=transfer_workers(),
+            help="Parallel file checks (1 checks sequentially)",
+        )
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=500,
+            help="Songs per UPDATE statement",
+        )
 
+    @deferred_invalidation()
     def handle(self, *args, **options):
         source_root = Path(options["source_root"]).expanduser()
         json_path = Path(options["json_path"]).expanduser()
+        media_root = Path(settings.MEDIA_ROOT)
         use_media = options["use_media"]
-        updated = 0
-        skipped = 0
 
         title_to_audio = self._load_title_audio(json_path)
 
-        for song in Song.objects.all():
+        songs = Song.objects.only("id", "title", "audio_file", "created_at")
+        candidates = []
+        for song in songs:
             rel_path = title_to_audio.get(song.title, song.audio_file.name)
-            if not rel_path:
-                skipped += 1
-                continue
-            source_path = source_root / rel_path
-            if not source_path.exists() and use_media:
-                source_path = Path(settings.MEDIA_ROOT) / rel_path
-            if not source_path.exists():
+            paths = [source_root / rel_path] if rel_path else []
+            if rel_path and use_media:
+                paths.append(media_root / rel_path)
+            candidates.append((song, paths))
+        stats = stat_files(
+            (path for _, paths in candidates for path in paths),
+            workers=options["workers"],
+        )
+
+        changed = []
+        skipped = 0
+        for song, paths in candidates:
+            stat = next((stats[path] for path in paths if stats[path]), None)
+            if stat is None:
                 skipped += 1
                 continue
-            mtime = source_path.stat().st_mtime
-            created_at = timezone.make_aware(datetime.fromtimestamp(mtime))
+            created_at = timezone.make_aware(datetime.fromtimestamp(stat.st_mtime))
             if song.created_at == created_at:
                 skipped += 1
                 continue
+            self.stdout.write(
+                f"{song.title}: created_at {song.created_at or '-'} -> {created_at}"
+            )
             song.created_at = created_at
-            song.save(update_fields=["created_at"])
-            updated += 1
+            changed.append(song)
+
+        if options["dry_run"]:
+            self.stdout.write(
+                f"Dry run. Would update: {len(changed)}, Skipped: {skipped}"
+            )
+            return
 
-        self.stdout.write(f"Sync complete. Updated: {updated}, Skipped: {skipped}")
+        now = timezone.now()
+        for song in changed:
+            song.updated_at = now
+        fields = ["created_at", "updated_at"]
+        with transaction.atomic():
+            Song.objects.bulk_update(
+                changed, fields, batch_size=max(options["batch_size"], 1)
+            )
+            bulk_saved(changed, update_fields=fields)
+        self.stdout.write(f"Sync complete. Updated: {len(changed)}, Skipped: {skipped}")
 
     def _load_title_audio(self, json_path):
         if not json_path.exists():
@@ -0,0 +1,175 @@
+import json
+import os
+import threading
+import time
+from pathlib import Path
+
+from django.conf import settings
+from django.db.models import Count, Q
+
+from .cache import get_cache
+from .models import Song
+
+COUNTS_KEY = "songs:metric-counts"
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+FILE_PREFIX = "puteklis-"
+
+
+def song_counts():
+    """Return total/published/draft counts from one cached aggregate query."""
+    cache = get_cache()
+    counts = cache.get(COUNTS_KEY)
+    if counts is None:
+        counts = Song.objects.order_by().aggregate(
+            songs_total=Count("id"),
+            songs_published=Count("id", filter=Q(status=Song.STATUS_PUBLISHED)),
+            songs_draft=Count("id", filter=Q(status=Song.STATUS_DRAFT)),
+        )
+        cache.set(
+            COUNTS_KEY,
+            counts,
+            timeout=getattr(settings, "PUTEKLIS_METRICS_CACHE_TTL", 15),
+        )
+    return counts
+
+
+class MetricsRegistry:
+    """Per-process request metrics, optionally shared through a directory.
+
+    With ``PUTEKLIS_METRICS_DIR`` set every process periodically writes its
+    snapshot to ``<dir>/puteklis-<pid>.json`` (atomic rename, one writer per
+    file) and a scrape sums all files, so any gunicorn worker can answer.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._requests = {}
+        self._durations = {}
+        self._queries = {}
+        self._last_flush = 0.0
+
+    def observe(self, view, method, status, duration, queries):
+        with self._lock:
+            key = f"{view}|{method}|{status}"
+            self._requests[key] = self._requests.get(key, 0) + 1
+
+            key = f"{view}|{method}"
+            # Cumulative bucket counts, then total count and sum.
+            histogram = self._durations.setdefault(
+                key, [0] * (len(DURATION_BUCKETS) + 1) + [0.0]
+            )
+            for idx, bound in enumerate(DURATION_BUCKETS):
+                if duration <= bound:
+                    histogram[idx] += 1
+            histogram[-2] += 1
+            histogram[-1] += duration
+
+            self._queries[key] = self._queries.get(key, 0) + queries
+        self.flush()
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                "requests": dict(self._requests),
+                "durations": {
+                    key: list(value) for key, value in self._durations.items()
+                },
+                "queries": dict(self._queries),
+            }
+
+    def flush(self, force=False):
+        directory = getattr(settings, "PUTEKLIS_METRICS_DIR", "")
+        if not directory:
+            return
+        interval = getattr(settings, "PUTEKLIS_METRICS_FLUSH_INTERVAL", 1.0)
+        now = time.monotonic()
+        if not force and now - self._last_flush < interval:
+            return
+        self._last_flush = now
+
+        directory = Path(directory)
+        directory.mkdir(parents=True, exist_ok=True)
+        target = directory / f"{FILE_PREFIX}{os.getpid()}.json"
+        tmp_path = directory / f".{os.getpid()}.{threading.get_ident()}.tmp"
+        tmp_path.write_text(json.dumps(self.snapshot()), encoding="utf-8")
+        os.replace(tmp_path, target)
+
+    def collect(self):
+        """Return this process's snapshot merged with every other worker's."""
+        directory = getattr(settings, "PUTEKLIS_METRICS_DIR", "")
+        if not directory:
+            return self.snapshot()
+
+        self.flush(force=True)
+        merged = {"requests": {}, "durations": {}, "queries": {}}
+        for path in Path(directory).glob(f"{FILE_PREFIX}*.json"):
+            try:
+                snapshot = json.loads(path.read_text(encoding="utf-8"))
+            except (OSError, ValueError):
+                continue
+            for name in ("requests", "queries"):
+                for key, value in snapshot.get(name, {}).items():
+                    merged[name][key] = merged[name].get(key, 0) + value
+            for key, value in snapshot.get("durations", {}).items():
+                current = merged["durations"].get(key)
+                if current is None:
+                    merged["durations"][key] = list(value)
+                else:
+                    merged["durations"][key] = [a + b for a, b in zip(current, value)]
+        return merged
+
+
+registry = MetricsRegistry()
+
+
+def _labels(**labels):
+    inner = ",".join(
+        '{}="{}"'.format(name, str(value).replace("\\", r"\\").replace('"', r"\""))
+        for name, value in labels.items()
+    )
+    return "{" + inner + "}"
+
+
+def prometheus_exposition(counts, collected):
+    """Render counts and request metrics in text format 0.0.4."""
+    lines = [
+        "# HELP puteklis_songs Number of songs by status.",
+        "# TYPE puteklis_songs gauge",
+        f'puteklis_songs{_labels(status="published")} {counts["songs_published"]}',
+        f'puteklis_songs{_labels(status="draft")} {counts["songs_draft"]}',
+        "# HELP puteklis_songs_all Number of songs in the catalogue.",
+        "# TYPE puteklis_songs_all gauge",
+        f"puteklis_songs_all {counts['songs_total']}",
+        "# HELP puteklis_http_requests_total HTTP requests by view and status.",
+        "# TYPE puteklis_http_requests_total counter",
+    ]
+    for key, value in sorted(collected["requests"].items()):
+        view, method, status = key.split("|")
+        labels = _labels(view=view, method=method, status=status)
+        lines.append(f"puteklis_http_requests_total{labels} {value}")
+
+    lines += [
+        "# HELP puteklis_http_request_duration_seconds Request latency by view.",
+        "# TYPE puteklis_http_request_duration_seconds histogram",
+    ]
+    name = "puteklis_http_request_duration_seconds"
+    for key, value in sorted(collected["durations"].items()):
+        view, method = key.split("|")
+        for bound, count in zip(DURATION_BUCKETS, value):
+            labels = _labels(view=view, method=method, le=bound)
+            lines.append(f"{name}_bucket{labels} {count}")
+        labels = _labels(view=view, method=method, le="+Inf")
+        lines.append(f"{name}_bucket{labels} {value[-2]}")
+        labels = _labels(view=view, method=method)
+        lines.append(f"{name}_count{labels} {value[-2]}")
+        lines.append(f"{name}_sum{labels} {value[-1]}")
+
+    lines += [
+        "# HELP puteklis_http_db_queries_total Database queries issued by view.",
+        "# TYPE puteklis_http_db_queries_total counter",
+    ]
+    for key, value in sorted(collected["queries"].items()):
+        view, method = key.split("|")
+        labels = _labels(view=view, method=method)
+        lines.append(f"puteklis_http_db_queries_total{labels} {value}")
+    return "\n".join(lines) + "\n"
@@ -0,0 +1,34 @@
+import time
+
+from django.db import connection
+
+from .metrics import registry
+
+# Anything else becomes "other", so a client cannot mint label values.
+METHODS = {"GET", "HEAD", "POST", "PUT", "PATCH", "DELETE", "OPTIONS"}
+
+
+class MetricsMiddleware:
+    """Record per-view request counts, latency and database queries."""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        queries = 0
+
+        def count_query(execute, sql, params, many, context):
+            nonlocal queries
+            queries += 1
+            return execute(sql, params, many, context)
+
+        started = time.perf_counter()
+        with connection.execute_wrapper(count_query):
+            response = self.get_response(request)
+        duration = time.perf_counter() - started
+
+        match = getattr(request, "resolver_match", None)
+        view = match.view_name if match else "unmatched"
+        method = request.method if request.method in METHODS else "other"
+        registry.observe(view, method, response.status_code, duration, queries)
+        return response
@@ -0,0 +1,50 @@
+# Generated by Django 5.2.18 on 2026-10-18 08:36
+
+import datetime
+import django.db.models.functions.comparison
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("music", "0004_alter_song_options_alter_song_audio_file_and_more"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="song",
+            name="created_key",
+            field=models.GeneratedField(
+                db_persist=True,
+                expression=django.db.models.functions.comparison.Coalesce(
+                    "created_at",
+                    models.Value(
+                        datetime.datetime(1, 1, 1, 0, 0, tzinfo=datetime.timezone.utc)
+                    ),
+                ),
+                output_field=models.DateTimeField(),
+                verbose_name="Izveidots (kārtošanai)",
+            ),
+        ),
+        migrations.AddField(
+            model_name="song",
+            name="published_key",
+            field=models.GeneratedField(
+                db_persist=True,
+                expression=django.db.models.functions.comparison.Coalesce(
+                    "published_at", models.Value(datetime.date(1, 1, 1))
+                ),
+                output_field=models.DateField(),
+                verbose_name="Publicēts (kārtošanai)",
+            ),
+        ),
+        migrations.AlterModelOptions(
+            name="song",
+            options={
+                "ordering": ["-published_key", "-created_key", "-id"],
+                "verbose_name": "Dziesma",
+                "verbose_name_plural": "Dziesmas",
+            },
+        ),
+    ]
@@ -0,0 +1,30 @@
+# Generated by Django 5.2.18 on 2026-10-18 08:38
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("music", "0005_song_keyset_ordering"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="song",
+            index=models.Index(
+                fields=["status", "-published_key", "-created_key", "-id"],
+                name="song_status_order_idx",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="song",
+            index=models.Index(
+                fields=["-published_key", "-created_key", "-id"], name="song_order_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="song",
+            index=models.Index(fields=["updated_at"], name="song_updated_at_idx"),
+        ),
+    ]
@@ -0,0 +1,69 @@
+# Generated by Django 5.2.18 on 2026-10-18 08:47
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("music", "0007_catalogueversion"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="SongTombstone",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "song_id",
+                    models.BigIntegerField(db_index=True, verbose_name="Dziesmas ID"),
+                ),
+                ("title", models.CharField(max_length=200, verbose_name="Nosaukums")),
+                (
+                    "audio",
+                    models.CharField(
+                        blank=True, max_length=255, verbose_name="Audio fails"
+                    ),
+                ),
+                (
+                    "reason",
+                    models.CharField(
+                        choices=[
+                            ("deleted", "Deleted"),
+                            ("unpublished", "Unpublished"),
+                        ],
+                        max_length=12,
+                        verbose_name="Iemesls",
+                    ),
+                ),
+                (
+                    "removed_at",
+                    models.DateTimeField(
+                        db_index=True,
+                        default=django.utils.timezone.now,
+                        verbose_name="Noņemts",
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "Noņemta dziesma",
+                "verbose_name_plural": "Noņemtās dziesmas",
+                "ordering": ["removed_at", "id"],
+            },
+        ),
+        migrations.AddIndex(
+            model_name="song",
+            index=models.Index(
+                fields=["status", "updated_at"], name="song_status_updated_idx"
+            ),
+        ),
+    ]
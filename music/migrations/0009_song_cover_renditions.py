@@ -0,0 +1,30 @@
+# Generated by Django 5.2.18 on 2026-10-18 08:49
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("music", "0008_song_change_feed"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="song",
+            name="cover_hash",
+            field=models.CharField(
+                blank=True,
+                editable=False,
+                max_length=64,
+                verbose_name="Vāka kontrolsumma",
+            ),
+        ),
+        migrations.AddField(
+            model_name="song",
+            name="cover_renditions",
+            field=models.JSONField(
+                blank=True, default=dict, editable=False, verbose_name="Vāka varianti"
+            ),
+        ),
+    ]
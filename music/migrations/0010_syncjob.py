@@ -0,0 +1,140 @@
+# Generated by Django 5.2.18 on 2026-10-18 08:56
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("music", "0009_song_cover_renditions"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="SyncJob",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "status",
+                    models.CharField(
+                        choices=[
+                            ("queued", "Queued"),
+                            ("running", "Running"),
+                            ("done", "Done"),
+                            ("failed", "Failed"),
+                        ],
+                        default="queued",
+                        max_length=10,
+                        verbose_name="Statuss",
+                    ),
+                ),
+                (
+                    "requests",
+                    models.PositiveIntegerField(default=1, verbose_name="Pieprasījumi"),
+                ),
+                (
+                    "created_at",
+                    models.DateTimeField(
+                        default=django.utils.timezone.now, verbose_name="Izveidots"
+                    ),
+                ),
+                (
+                    "started_at",
+                    models.DateTimeField(blank=True, null=True, verbose_name="Sākts"),
+                ),
+                (
+                    "heartbeat_at",
+                    models.DateTimeField(
+                        blank=True, null=True, verbose_name="Pēdējā aktivitāte"
+                    ),
+                ),
+                (
+                    "finished_at",
+                    models.DateTimeField(
+                        blank=True, null=True, verbose_name="Pabeigts"
+                    ),
+                ),
+                (
+                    "progress_done",
+                    models.PositiveIntegerField(
+                        default=0, verbose_name="Apstrādāti faili"
+                    ),
+                ),
+                (
+                    "progress_total",
+                    models.PositiveIntegerField(default=0, verbose_name="Faili kopā"),
+                ),
+                (
+                    "added",
+                    models.PositiveIntegerField(default=0, verbose_name="Pievienoti"),
+                ),
+                (
+                    "updated",
+                    models.PositiveIntegerField(default=0, verbose_name="Atjaunināti"),
+                ),
+                (
+                    "removed",
+                    models.PositiveIntegerField(default=0, verbose_name="Izņemti"),
+                ),
+                (
+                    "bytes_copied",
+                    models.PositiveBigIntegerField(
+                        default=0, verbose_name="Nokopēti baiti"
+                    ),
+                ),
+                (
+                    "bytes_skipped",
+                    models.PositiveBigIntegerField(
+                        default=0, verbose_name="Izlaisti baiti"
+                    ),
+                ),
+                (
+                    "missing",
+                    models.JSONField(
+                        blank=True, default=list, verbose_name="Trūkstošie faili"
+                    ),
+                ),
+                ("error", models.TextField(blank=True, verbose_name="Kļūda")),
+                (
+                    "requested_by",
+                    models.ForeignKey(
+                        blank=True,
+                        null=True,
+                        on_delete=django.db.models.deletion.SET_NULL,
+                        related_name="+",
+                        to=settings.AUTH_USER_MODEL,
+                        verbose_name="Pieprasīja",
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "Sinhronizācijas uzdevums",
+                "verbose_name_plural": "Sinhronizācijas uzdevumi",
+                "ordering": ["-created_at", "-id"],
+                "indexes": [
+                    models.Index(
+                        fields=["status", "created_at"], name="syncjob_status_idx"
+                    )
+                ],
+                "constraints": [
+                    models.UniqueConstraint(
+                        condition=models.Q(("status", "queued")),
+                        fields=("status",),
+                        name="syncjob_single_queued",
+                    )
+                ],
+            },
+        ),
+    ]
@@ -0,0 +1,31 @@
+# Generated by Django 5.2.18 on 2026-10-18 08:58
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("music", "0010_syncjob"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="syncjob",
+            name="kind",
+            field=models.CharField(
+                choices=[("full", "Full"), ("incremental", "Incremental")],
+                default="full",
+                max_length=12,
+                verbose_name="Veids",
+            ),
+        ),
+        migrations.AddField(
+            model_name="syncjob",
+            name="run_after",
+            field=models.DateTimeField(
+                default=django.utils.timezone.now, verbose_name="Izpildīt pēc"
+            ),
+        ),
+    ]
@@ -0,0 +1,42 @@
+# Generated by Django 5.2.18 on 2026-10-18 09:07
+
+import music.storage
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("music", "0011_syncjob_kind"),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name="song",
+            name="audio_file",
+            field=models.FileField(
+                storage=music.storage.ContentAddressedStorage(),
+                upload_to="music/",
+                verbose_name="Audio fails",
+            ),
+        ),
+        migrations.AlterField(
+            model_name="song",
+            name="cover_image",
+            field=models.ImageField(
+                storage=music.storage.ContentAddressedStorage(),
+                upload_to="cover/",
+                verbose_name="Vāka attēls",
+            ),
+        ),
+        migrations.AlterField(
+            model_name="song",
+            name="lyrics_file",
+            field=models.FileField(
+                blank=True,
+                storage=music.storage.ContentAddressedStorage(),
+                upload_to="lyrics/",
+                verbose_name="Teksta fails",
+            ),
+        ),
+    ]
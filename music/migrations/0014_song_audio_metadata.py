@@ -0,0 +1,50 @@
+# Generated by Django 5.2.18 on 2026-10-18 09:12
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("music", "0013_uploadsession"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="song",
+            name="audio_bitrate",
+            field=models.PositiveIntegerField(
+                blank=True,
+                editable=False,
+                null=True,
+                verbose_name="Bitu ātrums, kbit/s",
+            ),
+        ),
+        migrations.AddField(
+            model_name="song",
+            name="audio_duration",
+            field=models.FloatField(
+                blank=True, editable=False, null=True, verbose_name="Ilgums, s"
+            ),
+        ),
+        migrations.AddField(
+            model_name="song",
+            name="audio_hash",
+            field=models.CharField(
+                blank=True,
+                editable=False,
+                max_length=64,
+                verbose_name="Audio kontrolsumma",
+            ),
+        ),
+        migrations.AddField(
+            model_name="song",
+            name="audio_size",
+            field=models.PositiveBigIntegerField(
+                blank=True,
+                editable=False,
+                null=True,
+                verbose_name="Audio izmērs, baiti",
+            ),
+        ),
+    ]
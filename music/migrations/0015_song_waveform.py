@@ -0,0 +1,20 @@
+# Generated by Django 5.2.18 on 2026-10-18 09:14
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("music", "0014_song_audio_metadata"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="song",
+            name="waveform",
+            field=models.CharField(
+                blank=True, editable=False, max_length=255, verbose_name="Viļņu forma"
+            ),
+        ),
+    ]
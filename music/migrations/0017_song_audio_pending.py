@@ -0,0 +1,28 @@
+# Generated by Django 5.2.18 on 2026-10-18 09:47
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("music", "0015_song_waveform"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="song",
+            name="audio_pending",
+            field=models.BooleanField(
+                default=False, editable=False, verbose_name="Audio jāapstrādā"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="song",
+            index=models.Index(
+                condition=models.Q(("audio_pending", True)),
+                fields=["id"],
+                name="song_audio_pending_idx",
+            ),
+        ),
+    ]
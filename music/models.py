@@ -1,6 +1,18 @@
-from django.db import models
+import uuid
+from datetime import date, datetime
+from datetime import timezone as dt_timezone
 
-from .storage import OverwriteStorage
+from django.conf import settings
+from django.db import IntegrityError, models, transaction
+from django.db.models import F, Q, Value
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from .storage import ContentAddressedStorage
+
+# What the sort keys map a NULL date to: below every real value.
+PUBLISHED_FLOOR = date.min
+CREATED_FLOOR = datetime.min.replace(tzinfo=dt_timezone.utc)
 
 
 class Song(models.Model):
@@ -15,18 +27,42 @@ class Song(models.Model):
     audio_file = models.FileField(
         "Audio fails",
         upload_to="music/",
-        storage=OverwriteStorage(),
+        storage=ContentAddressedStorage(),
     )
     lyrics_file = models.FileField(
         "Teksta fails",
         upload_to="lyrics/",
-        storage=OverwriteStorage(),
+        storage=ContentAddressedStorage(),
         blank=True,
     )
     cover_image = models.ImageField(
         "Vāka attēls",
         upload_to="cover/",
-        storage=OverwriteStorage(),
+        storage=ContentAddressedStorage(),
+    )
+    cover_hash = models.CharField(
+        "Vāka kontrolsumma", max_length=64, blank=True, editable=False
+    )
+    cover_renditions = models.JSONField(
+        "Vāka varianti", default=dict, blank=True, editable=False
+    )
+    audio_duration = models.FloatField(
+        "Ilgums, s", null=True, blank=True, editable=False
+    )
+    audio_bitrate = models.PositiveIntegerField(
+        "Bitu ātrums, kbit/s", null=True, blank=True, editable=False
+    )
+    audio_size = models.PositiveBigIntegerField(
+        "Audio izmērs, baiti", null=True, blank=True, editable=False
+    )
+    audio_hash = models.CharField(
+        "Audio kontrolsumma", max_length=64, blank=True, editable=False
+    )
+    audio_pending = models.BooleanField(
+        "Audio jāapstrādā", default=False, editable=False
+    )
+    waveform = models.CharField(
+        "Viļņu forma", max_length=255, blank=True, editable=False
     )
     style = models.TextField("Stils", blank=True)
     status = models.CharField(
@@ -38,9 +74,50 @@ class Song(models.Model):
     published_at = models.DateField("Publicēts", blank=True, null=True)
     created_at = models.DateTimeField("Izveidots", blank=True, null=True)
     updated_at = models.DateTimeField("Atjaunināts", auto_now=True)
+    # The dates with NULL mapped below every real value, kept by the database.
+    # Sorting on them puts NULLs last on every backend, and the keyset becomes
+    # one row-value comparison over plain columns that an index can seek to.
+    published_key = models.GeneratedField(
+        verbose_name="Publicēts (kārtošanai)",
+        expression=Coalesce("published_at", Value(PUBLISHED_FLOOR)),
+        output_field=models.DateField(),
+        db_persist=True,
+    )
+    created_key = models.GeneratedField(
+        verbose_name="Izveidots (kārtošanai)",
+        expression=Coalesce("created_at", Value(CREATED_FLOOR)),
+        output_field=models.DateTimeField(),
+        db_persist=True,
+    )
 
     class Meta:
-        ordering = ["-published_at", "-created_at"]
+        # Matches the keyset used by SongCursorPagination and the indexes below.
+        ordering = ["-published_key", "-created_key", "-id"]
+        indexes = [
+            # Public list: WHERE status = 'published' ORDER BY Meta.ordering,
+            # and the cursor's row-value comparison after it.
+            models.Index(
+                fields=["status", "-published_key", "-created_key", "-id"],
+                name="song_status_order_idx",
+            ),
+            # Staff list and admin changelist: Meta.ordering without a filter.
+            models.Index(
+                fields=["-published_key", "-created_key", "-id"],
+                name="song_order_idx",
+            ),
+            # Change tracking: WHERE updated_at > %s ORDER BY updated_at.
+            models.Index(fields=["updated_at"], name="song_updated_at_idx"),
+            # Public change feed: the same, restricted to published songs.
+            models.Index(
+                fields=["status", "updated_at"], name="song_status_updated_idx"
+            ),
+            # Audio waiting for run_sync_worker; usually none.
+            models.Index(
+                fields=["id"],
+                condition=Q(audio_pending=True),
+                name="song_audio_pending_idx",
+            ),
+        ]
         constraints = [
             models.UniqueConstraint(
                 fields=["title", "audio_file"],
@@ -52,3 +129,285 @@ class Song(models.Model):
 
     def __str__(self) -> str:
         return self.title
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Remembered so that an unpublish can be told apart from a draft edit.
+        instance._loaded_status = instance.__dict__.get("status")
+        # Likewise, so that only a new audio file or cover queues work.
+        instance._loaded_audio = instance.__dict__.get("audio_file")
+        instance._loaded_cover = instance.__dict__.get("cover_image")
+        return instance
+
+
+class SongTombstone(models.Model):
+    """Marks a song that left the public catalogue, for the change feed."""
+
+    REASON_DELETED = "deleted"
+    REASON_UNPUBLISHED = "unpublished"
+    REASON_CHOICES = [
+        (REASON_DELETED, "Deleted"),
+        (REASON_UNPUBLISHED, "Unpublished"),
+    ]
+
+    song_id = models.BigIntegerField("Dziesmas ID", db_index=True)
+    title = models.CharField("Nosaukums", max_length=200)
+    audio = models.CharField("Audio fails", max_length=255, blank=True)
+    reason = models.CharField("Iemesls", max_length=12, choices=REASON_CHOICES)
+    removed_at = models.DateTimeField("Noņemts", default=timezone.now, db_index=True)
+
+    class Meta:
+        ordering = ["removed_at", "id"]
+        verbose_name = "Noņemta dziesma"
+        verbose_name_plural = "Noņemtās dziesmas"
+
+    def __str__(self) -> str:
+        return f"{self.title} ({self.reason})"
+
+
+class CatalogueVersion(models.Model):
+    """Single-row counter bumped whenever any song is saved or deleted.
+
+    Lets list endpoints build validators and cache keys with one primary key
+    lookup instead of aggregating over the songs table.
+    """
+
+    SINGLETON_ID = 1
+
+    version = models.PositiveBigIntegerField(default=0)
+    changed_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        verbose_name = "Kataloga versija"
+        verbose_name_plural = "Kataloga versijas"
+
+    def __str__(self) -> str:
+        return str(self.version)
+
+    @classmethod
+    def current(cls):
+        state = (
+            cls.objects.filter(pk=cls.SINGLETON_ID)
+            .values_list("version", "changed_at")
+            .first()
+        )
+        return state or (0, None)
+
+    @classmethod
+    def bump(cls):
+        now = timezone.now()
+        updated = cls.objects.filter(pk=cls.SINGLETON_ID).update(
+            version=F("version") + 1,
+            changed_at=now,
+        )
+        if not updated:
+            cls.objects.get_or_create(
+                pk=cls.SINGLETON_ID,
+                defaults={"version": 1, "changed_at": now},
+            )
+
+
+class SyncJob(models.Model):
+    """A static-site sync, run by ``run_sync_worker``.
+
+    Full jobs come from the admin; incremental ones are scheduled after song
+    changes and wait until ``run_after`` so a burst of edits is synced once.
+    At most one job is queued at a time: further requests while it waits are
+    counted on it instead of creating new jobs, and a full request upgrades a
+    queued incremental job.
+    """
+
+    KIND_FULL = "full"
+    KIND_INCREMENTAL = "incremental"
+    KIND_CHOICES = [
+        (KIND_FULL, "Full"),
+        (KIND_INCREMENTAL, "Incremental"),
+    ]
+
+    STATUS_QUEUED = "queued"
+    STATUS_RUNNING = "running"
+    STATUS_DONE = "done"
+    STATUS_FAILED = "failed"
+    STATUS_CHOICES = [
+        (STATUS_QUEUED, "Queued"),
+        (STATUS_RUNNING, "Running"),
+        (STATUS_DONE, "Done"),
+        (STATUS_FAILED, "Failed"),
+    ]
+
+    status = models.CharField(
+        "Statuss", max_length=10, choices=STATUS_CHOICES, default=STATUS_QUEUED
+    )
+    kind = models.CharField(
+        "Veids", max_length=12, choices=KIND_CHOICES, default=KIND_FULL
+    )
+    requested_by = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        verbose_name="Pieprasīja",
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name="+",
+    )
+    requests = models.PositiveIntegerField("Pieprasījumi", default=1)
+    created_at = models.DateTimeField("Izveidots", default=timezone.now)
+    run_after = models.DateTimeField("Izpildīt pēc", default=timezone.now)
+    started_at = models.DateTimeField("Sākts", null=True, blank=True)
+    heartbeat_at = models.DateTimeField("Pēdējā aktivitāte", null=True, blank=True)
+    finished_at = models.DateTimeField("Pabeigts", null=True, blank=True)
+    progress_done = models.PositiveIntegerField("Apstrādāti faili", default=0)
+    progress_total = models.PositiveIntegerField("Faili kopā", default=0)
+    added = models.PositiveIntegerField("Pievienoti", default=0)
+    updated = models.PositiveIntegerField("Atjaunināti", default=0)
+    removed = models.PositiveIntegerField("Izņemti", default=0)
+    bytes_copied = models.PositiveBigIntegerField("Nokopēti baiti", default=0)
+    bytes_skipped = models.PositiveBigIntegerField("Izlaisti baiti", default=0)
+    missing = models.JSONField("Trūkstošie faili", default=list, blank=True)
+    error = models.TextField("Kļūda", blank=True)
+
+    class Meta:
+        ordering = ["-created_at", "-id"]
+        indexes = [
+            models.Index(fields=["status", "created_at"], name="syncjob_status_idx"),
+        ]
+        constraints = [
+            models.UniqueConstraint(
+                fields=["status"],
+                condition=Q(status="queued"),
+                name="syncjob_single_queued",
+            ),
+        ]
+        verbose_name = "Sinhronizācijas uzdevums"
+        verbose_name_plural = "Sinhronizācijas uzdevumi"
+
+    def __str__(self) -> str:
+        return f"#{self.pk} ({self.status})"
+
+    @property
+    def is_finished(self):
+        return self.status in (self.STATUS_DONE, self.STATUS_FAILED)
+
+    @classmethod
+    def enqueue(cls, user=None, kind=KIND_FULL, delay=None, max_delay=None):
+        """Return the queued job, creating it if nothing is waiting yet.
+
+        ``delay`` postpones an incremental job; joining a waiting one pushes
+        it back again (trailing debounce), but never past ``max_delay`` after
+        it was created.
+        """
+        while True:
+            now = timezone.now()
+            job = cls.objects.filter(status=cls.STATUS_QUEUED).first()
+            if job is None:
+                run_after = now + delay if delay else now
+                try:
+                    with transaction.atomic():
+                        return cls.objects.create(
+                            kind=kind, requested_by=user, run_after=run_after
+                        )
+                except IntegrityError:
+                    # Another request queued one first; join it.
+                    continue
+
+            changes = {"requests": F("requests") + 1}
+            if kind == cls.KIND_FULL and job.kind != cls.KIND_FULL:
+                changes.update(kind=cls.KIND_FULL, run_after=now)
+            elif job.kind == cls.KIND_INCREMENTAL and delay:
+                run_after = now + delay
+                if max_delay is not None:
+                    run_after = min(run_after, job.created_at + max_delay)
+                changes["run_after"] = max(run_after, job.run_after)
+            # Only join the job if it was not claimed meanwhile.
+            if cls.objects.filter(pk=job.pk, status=cls.STATUS_QUEUED).update(
+                **changes
+            ):
+                job.refresh_from_db()
+                return job
+
+    @classmethod
+    def claim_next(cls):
+        """Mark the oldest due queued job running and return it.
+
+        Returns ``None`` when nothing is due, another worker won the race or
+        a job is already running (syncs write the same files).
+        """
+        if cls.objects.filter(status=cls.STATUS_RUNNING).exists():
+            return None
+        now = timezone.now()
+        job = (
+            cls.objects.filter(status=cls.STATUS_QUEUED, run_after__lte=now)
+            .order_by("created_at", "id")
+            .first()
+        )
+        if job is None:
+            return None
+        claimed = cls.objects.filter(pk=job.pk, status=cls.STATUS_QUEUED).update(
+            status=cls.STATUS_RUNNING, started_at=now, heartbeat_at=now
+        )
+        if not claimed:
+            return None
+        job.refresh_from_db()
+        return job
+
+    @classmethod
+    def last_synced_at(cls):
+        """When the last successful job started reading the catalogue."""
+        return (
+            cls.objects.filter(status=cls.STATUS_DONE, error="")
+            .order_by("-started_at")
+            .values_list("started_at", flat=True)
+            .first()
+        )
+
+    @classmethod
+    def fail_stale(cls, older_than):
+        """Fail running jobs whose worker has not reported since ``older_than``."""
+        return cls.objects.filter(
+            status=cls.STATUS_RUNNING, heartbeat_at__lt=older_than
+        ).update(
+            status=cls.STATUS_FAILED,
+            finished_at=timezone.now(),
+            error="Sinhronizācijas process pārtrūka.",
+        )
+
+
+class UploadSession(models.Model):
+    """A chunked audio upload, resumable from ``offset``; see ``music.uploads``."""
+
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    created_by = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        verbose_name="Augšupielādēja",
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name="+",
+    )
+    filename = models.CharField("Faila nosaukums", max_length=255)
+    size = models.PositiveBigIntegerField("Izmērs")
+    offset = models.PositiveBigIntegerField("Saņemts", default=0)
+    sha256 = models.CharField("Kontrolsumma", max_length=64, blank=True)
+    song = models.ForeignKey(
+        Song,
+        verbose_name="Dziesma",
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name="+",
+    )
+    created_at = models.DateTimeField("Izveidots", default=timezone.now)
+    updated_at = models.DateTimeField("Pēdējā aktivitāte", auto_now=True)
+    finished_at = models.DateTimeField("Pabeigts", null=True, blank=True)
+
+    class Meta:
+        ordering = ["-created_at"]
+        verbose_name = "Augšupielāde"
+        verbose_name_plural = "Augšupielādes"
+
+    def __str__(self) -> str:
+        return f"{self.filename} ({self.offset}/{self.size})"
+
+    @property
+    def is_complete(self):
+        return self.offset == self.size
@@ -0,0 +1,198 @@
+import base64
+import binascii
+import json
+from collections import OrderedDict
+
+from django.conf import settings
+from django.db.models import BooleanField, DateField, DateTimeField, F, Func, Value
+from django.utils.dateparse import parse_date, parse_datetime
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
+
+from .models import CREATED_FLOOR, PUBLISHED_FLOOR
+
+# Keyset columns in sort order, all descending: Song's generated sort keys,
+# which are never NULL, and the primary key. Must stay in sync with
+# Song.Meta.ordering so that paginated and plain lists return the same order.
+KEYSET_FIELDS = ("published_key", "created_key", "id")
+KEYSET_OUTPUT_FIELDS = (DateField(), DateTimeField(), None)
+# The key of a NULL date; older cursors still carry ``None`` for it.
+KEYSET_FLOORS = (PUBLISHED_FLOOR, CREATED_FLOOR, None)
+
+
+def keyset_ordering():
+    return [F(field).desc() for field in KEYSET_FIELDS]
+
+
+class RowBefore(Func):
+    """``(a, b, c) < (x, y, z)``: one range condition an index can seek to.
+
+    Unlike the equivalent ``a < x OR (a = x AND ...)`` expansion, both
+    PostgreSQL and SQLite start the scan of a matching index right at the
+    cursor instead of walking it from the first row.
+    """
+
+    output_field = BooleanField()
+
+    def __init__(self, keys, values):
+        super().__init__(*keys, *values)
+
+    def as_sql(self, compiler, connection, **extra_context):
+        parts, params = [], []
+        for expression in self.get_source_expressions():
+            sql, expression_params = compiler.compile(expression)
+            parts.append(sql)
+            params.extend(expression_params)
+        half = len(parts) // 2
+        lhs, rhs = ", ".join(parts[:half]), ", ".join(parts[half:])
+        return f"({lhs}) < ({rhs})", params
+
+
+def keyset_after(position):
+    """Build a filter for rows strictly after ``position`` in keyset order."""
+    values = [
+        Value(floor if value is None else value, output_field=output_field)
+        for value, floor, output_field in zip(
+            position, KEYSET_FLOORS, KEYSET_OUTPUT_FIELDS
+        )
+    ]
+    return RowBefore([F(field) for field in KEYSET_FIELDS], values)
+
+
+class SongCursorPagination(BasePagination):
+    """Opt-in keyset pagination over ``(-published_at, -created_at, -id)``.
+
+    Enabled when the request carries ``cursor`` or ``page_size``; otherwise the
+    endpoint keeps returning a plain list. Pages are fetched with
+    ``LIMIT page_size + 1`` and never issue a ``COUNT(*)``.
+    """
+
+    cursor_query_param = "cursor"
+    page_size_query_param = "page_size"
+    invalid_cursor_message = "Invalid cursor"
+
+    def get_page_size(self, request):
+        default = getattr(settings, "PUTEKLIS_SONGS_PAGE_SIZE", 50)
+        maximum = getattr(settings, "PUTEKLIS_SONGS_MAX_PAGE_SIZE", 500)
+        raw = request.query_params.get(self.page_size_query_param)
+        if not raw:
+            return min(default, maximum)
+        try:
+            size = int(raw)
+        except ValueError:
+            return min(default, maximum)
+        if size < 1:
+            return min(default, maximum)
+        return min(size, maximum)
+
+    def is_enabled(self, request):
+        params = request.query_params
+        return self.cursor_query_param in params or self.page_size_query_param in params
+
+    def paginate_queryset(self, queryset, request, view=None):
+        if not self.is_enabled(request):
+            return None
+
+        self.request = request
+        self.base_url = request.build_absolute_uri()
+        self.page_size = self.get_page_size(request)
+
+        queryset = queryset.order_by(*keyset_ordering())
+        position = self.decode_cursor(request)
+        if position is not None:
+            queryset = queryset.filter(keyset_after(position))
+
+        rows = list(queryset[: self.page_size + 1])
+        self.has_next = len(rows) > self.page_size
+        self.page = rows[: self.page_size]
+        return self.page
+
+    def get_paginated_response(self, data):
+        return Response(
+            OrderedDict(
+                [
+                    ("next", self.get_next_link()),
+                    ("results", data),
+                ]
+            )
+        )
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            "type": "object",
+            "required": ["results"],
+            "properties": {
+                "next": {
+                    "type": "string",
+                    "nullable": True,
+                    "format": "uri",
+                },
+                "results": schema,
+            },
+        }
+
+    def get_next_link(self):
+        if not self.has_next:
+            return None
+        last = self.page[-1]
+        if isinstance(last, dict):
+            position = [last[field] for field in KEYSET_FIELDS]
+        else:
+            position = [getattr(last, field) for field in KEYSET_FIELDS]
+        return replace_query_param(
+            self.base_url,
+            self.cursor_query_param,
+            self.encode_cursor(position),
+        )
+
+    def encode_cursor(self, position):
+        published_at, created_at, pk = position
+        payload = {
+            "p": published_at.isoformat() if published_at else None,
+            "c": created_at.isoformat() if created_at else None,
+            "i": pk,
+        }
+        raw = json.dumps(payload, separators=(",", ":")).encode("ascii")
+        return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+    def decode_cursor(self, request):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if not encoded:
+            return None
+        try:
+            padded = encoded + "=" * (-len(encoded) % 4)
+            payload = json.loads(base64.urlsafe_b64decode(padded.encode("ascii")))
+            published_at = payload["p"]
+            created_at = payload["c"]
+            pk = int(payload["i"])
+            if published_at is not None:
+                published_at = parse_date(published_at)
+                if published_at is None:
+                    raise ValueError
+            if created_at is not None:
+                created_at = parse_datetime(created_at)
+                if created_at is None:
+                    raise ValueError
+        except (binascii.Error, KeyError, TypeError, ValueError, UnicodeError):
+            raise NotFound(self.invalid_cursor_message)
+        return [published_at, created_at, pk]
+
+    def get_schema_operation_parameters(self, view):
+        return [
+            {
+                "name": self.cursor_query_param,
+                "required": False,
+                "in": "query",
+                "description": "Opaque cursor returned in `next`.",
+                "schema": {"type": "string"},
+            },
+            {
+                "name": self.page_size_query_param,
+                "required": False,
+                "in": "query",
+                "description": "Number of results per page; enables pagination.",
+                "schema": {"type": "integer"},
+            },
+        ]
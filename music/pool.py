@@ -0,0 +1,43 @@
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from concurrent.futures.process import BrokenProcessPool
+
+import django
+
+
+def _setup_django():
+    # Workers started with spawn or forkserver (the default on Windows and
+    # macOS) import the job's module afresh, and music.* modules import
+    # models, which needs the app registry.
+    django.setup()
+
+
+def run_jobs(function, jobs, workers, errors=(OSError,), mp_context=None):
+    """Call ``function(*args)`` for each ``(key, args)`` in ``jobs``.
+
+    Yields ``(key, result, error)`` as calls finish, with ``error`` set to the
+    exception for calls that raised one of ``errors``. Meant for CPU-bound
+    work (resizing covers, hashing and decoding audio): with more than one
+    worker the calls run in a process pool, while the caller keeps the ORM
+    writes in its own process. ``function`` must therefore be a pure,
+    module-level function that does not touch the ORM; only its arguments and
+    result cross the process boundary. If the pool breaks (a worker was
+    killed), the calls left are yielded with that error instead of aborting
+    the caller.
+    """
+    jobs = list(jobs)
+    if workers <= 1 or len(jobs) <= 1:
+        for key, args in jobs:
+            try:
+                yield key, function(*args), None
+            except errors as exc:
+                yield key, None, exc
+        return
+    with ProcessPoolExecutor(
+        max_workers=workers, mp_context=mp_context, initializer=_setup_django
+    ) as executor:
+        futures = {executor.submit(function, *args): key for key, args in jobs}
+        for future in as_completed(futures):
+            try:
+                yield futures[future], future.result(), None
+            except (*errors, BrokenProcessPool) as exc:
+                yield futures[future], None, exc
@@ -0,0 +1,120 @@
+import os
+import shutil
+from pathlib import Path
+
+from django.conf import settings
+
+
+def previous_dir():
+    return Path(
+        getattr(
+            settings,
+            "PUTEKLIS_PUBLISH_PREVIOUS_DIR",
+            Path(settings.BASE_DIR) / "site_previous",
+        )
+    )
+
+
+def _fsync_dir(path):
+    # Makes the renames durable; directories cannot be opened on Windows.
+    if os.name != "posix":
+        return
+    fd = os.open(path, os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+def _link_or_copy(source, destination):
+    destination.unlink(missing_ok=True)
+    try:
+        os.link(source, destination)
+    except OSError:
+        # Different filesystem or no hard link support.
+        shutil.copy2(source, destination)
+
+
+class Publisher:
+    """Swap a set of generated files into ``root`` as one generation.
+
+    Changed files are written to temporary files next to their targets and
+    fsynced; only then are they renamed over the live files, back to back,
+    so a reader sees either the old or the new file and never a partial one.
+    Files whose bytes did not change are left alone, and nothing is written
+    when none changed. The files being replaced are kept (hard links where
+    possible) in ``previous`` for ``rollback``.
+    """
+
+    def __init__(self, root, previous=None):
+        self.root = Path(root)
+        self.previous = Path(previous) if previous else previous_dir()
+
+    def publish(self, files):
+        """Publish ``{name: bytes}``; return the names that changed."""
+        changed = {}
+        for name, content in files.items():
+            target = self.root / name
+            try:
+                if target.read_bytes() == content:
+                    continue
+            except FileNotFoundError:
+                pass
+            changed[name] = content
+        if not changed:
+            return []
+
+        temporary = {}
+        try:
+            for name, content in changed.items():
+                tmp_path = self.root / f".{name}.{os.getpid()}.tmp"
+                with open(tmp_path, "wb") as handle:
+                    handle.write(content)
+                    handle.flush()
+                    os.fsync(handle.fileno())
+                temporary[name] = tmp_path
+            self._keep_previous(changed)
+            for name, tmp_path in temporary.items():
+                os.replace(tmp_path, self.root / name)
+        finally:
+            for tmp_path in temporary.values():
+                tmp_path.unlink(missing_ok=True)
+        _fsync_dir(self.root)
+        return list(changed)
+
+    def _keep_previous(self, names):
+        # Only the files being replaced: whatever an older generation left
+        # there (e.g. hashed artifacts since pruned) would be rolled back too.
+        self.previous.mkdir(parents=True, exist_ok=True)
+        for kept in self.previous.iterdir():
+            if kept.is_file() and kept.name not in names:
+                kept.unlink()
+        for name in names:
+            current = self.root / name
+            if current.exists():
+                _link_or_copy(current, self.previous / name)
+            else:
+                (self.previous / name).unlink(missing_ok=True)
+
+    def rollback(self):
+        """Swap the previous generation back in; return the restored names.
+
+        The generation rolled back from becomes the previous one, so a second
+        rollback rolls forward again.
+        """
+        if not self.previous.is_dir():
+            return []
+        restored = []
+        for kept in sorted(self.previous.iterdir()):
+            if not kept.is_file():
+                continue
+            name = kept.name
+            live = self.root / name
+            tmp_path = self.root / f".{name}.{os.getpid()}.tmp"
+            shutil.copy2(kept, tmp_path)
+            if live.exists():
+                _link_or_copy(live, kept)
+            os.replace(tmp_path, live)
+            restored.append(name)
+        _fsync_dir(self.root)
+        return restored
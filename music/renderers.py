@@ -0,0 +1,54 @@
+from rest_framework.renderers import BaseRenderer, JSONRenderer
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+class FastJSONRenderer(JSONRenderer):
+    """JSONRenderer that uses orjson when installed, for the same JSON values.
+
+    orjson's compact output matches ``json.dumps`` with DRF's compact
+    separators and ``ensure_ascii=False``, except for the spelling of some
+    floats (``1e16`` rather than ``1e+16``), which parse to the same number.
+    Anything it cannot encode (lazy strings, Decimal, ...) or an indented
+    request falls back to the stdlib.
+    """
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if (
+            orjson is None
+            or data is None
+            or self.ensure_ascii
+            or not self.compact
+            or self.get_indent(accepted_media_type, renderer_context or {}) is not None
+        ):
+            return super().render(data, accepted_media_type, renderer_context)
+        try:
+            ret = orjson.dumps(data)
+        except TypeError:
+            return super().render(data, accepted_media_type, renderer_context)
+        # Same JavaScript-safety escaping as JSONRenderer.
+        return ret.replace(b"\xe2\x80\xa8", b"\\u2028").replace(
+            b"\xe2\x80\xa9", b"\\u2029"
+        )
+
+
+class PrometheusRenderer(BaseRenderer):
+    """Pass through a pre-rendered Prometheus text exposition."""
+
+    media_type = "text/plain"
+    format = "prometheus"
+    charset = "utf-8"
+    # Sent as the Content-Type; media_type stays bare so that Accept: */* and
+    # text/plain;version=0.0.4 both negotiate to this renderer.
+    content_type = "text/plain; version=0.0.4; charset=utf-8"
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if isinstance(data, str):
+            return data.encode(self.charset)
+        # Errors (e.g. 403) arrive as dicts; keep them readable.
+        return "\n".join(f"# {key}: {value}" for key, value in data.items()).encode(
+            self.charset
+        )
@@ -0,0 +1,126 @@
+from pathlib import Path
+
+from django.conf import settings
+from django.utils import timezone
+from PIL import Image, ImageOps, features
+
+from .cache import invalidate_catalogue
+from .models import Song
+from .transfer import file_sha256
+
+FORMATS = {
+    "jpeg": ("jpg", {"quality": 85, "optimize": True, "progressive": True}),
+    "webp": ("webp", {"quality": 80, "method": 4}),
+}
+
+
+def rendition_sizes():
+    return getattr(settings, "PUTEKLIS_COVER_RENDITIONS", {"thumb": 160, "medium": 480})
+
+
+def available_formats():
+    return [name for name in FORMATS if name != "webp" or features.check("webp")]
+
+
+def rendition_name(source_hash, size, fmt):
+    extension = FORMATS[fmt][0]
+    return f"renditions/{source_hash[:2]}/{source_hash}_{size}.{extension}"
+
+
+def render_cover(source_path, media_root, sizes, formats):
+    """Write every missing rendition of ``source_path`` under ``media_root``.
+
+    Names are derived from the source's SHA-256, so an existing file is
+    already the right rendition and is kept as is.
+
+    Returns ``(source_hash, {label: {format: relative_name}})``.
+    """
+    source_hash = file_sha256(source_path)
+    media_root = Path(media_root)
+    renditions = {}
+    image = None
+    try:
+        for label, size in sizes.items():
+            renditions[label] = {}
+            for fmt in formats:
+                name = rendition_name(source_hash, size, fmt)
+                renditions[label][fmt] = name
+                target = media_root / name
+                if target.exists():
+                    continue
+                if image is None:
+                    image = Image.open(source_path)
+                    image.load()
+                fitted = ImageOps.fit(
+                    image, (size, size), method=Image.Resampling.LANCZOS
+                )
+                if fmt == "jpeg" or fitted.mode not in ("RGB", "RGBA"):
+                    fitted = fitted.convert("RGB")
+                target.parent.mkdir(parents=True, exist_ok=True)
+                tmp_path = target.with_name(f".{target.name}.tmp")
+                fitted.save(tmp_path, format=fmt.upper(), **FORMATS[fmt][1])
+                tmp_path.replace(target)
+    finally:
+        if image is not None:
+            image.close()
+    return source_hash, renditions
+
+
+def cover_job(song):
+    """Arguments for ``render_cover`` for ``song``, or ``None`` if no cover."""
+    if not song.cover_image:
+        return None
+    storage = song.cover_image.storage
+    return (
+        storage.path(song.cover_image.name),
+        storage.location,
+        rendition_sizes(),
+        available_formats(),
+    )
+
+
+def store_renditions(song_id, source_hash, renditions):
+    """Persist rendition names without re-running save() and its signals."""
+    Song.objects.filter(pk=song_id).update(
+        cover_hash=source_hash,
+        cover_renditions=renditions,
+        updated_at=timezone.now(),
+    )
+    invalidate_catalogue()
+
+
+def needs_renditions(song):
+    if not song.cover_image:
+        return bool(song.cover_renditions)
+    if not song.cover_hash or not song.cover_renditions:
+        return True
+    storage = song.cover_image.storage
+    if set(song.cover_renditions) != set(rendition_sizes()):
+        return True
+    return not all(
+        storage.exists(name)
+        for formats in song.cover_renditions.values()
+        for name in formats.values()
+    )
+
+
+def generate_for_song(song_id):
+    """Create missing renditions for one song; used after save."""
+    song = (
+        Song.objects.filter(pk=song_id)
+        .only("id", "cover_image", "cover_hash", "cover_renditions")
+        .first()
+    )
+    if song is None:
+        return
+    job = cover_job(song)
+    if job is None:
+        if song.cover_renditions:
+            store_renditions(song.pk, "", {})
+        return
+    try:
+        source_hash, renditions = render_cover(*job)
+    except (OSError, Image.DecompressionBombError):
+        return
+    if source_hash != song.cover_hash or renditions != song.cover_renditions:
+        store_renditions(song.pk, source_hash, renditions)
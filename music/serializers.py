@@ -1,9 +1,55 @@
+import os
+import re
+from functools import partial
+
+from django.conf import settings
+from django.utils import timezone
+from django.utils.encoding import filepath_to_uri
+from drf_spectacular.utils import extend_schema_field
 from rest_framework import serializers
 
-from .models import Song
+from .models import Song, SongTombstone, UploadSession
+from .uploads import chunk_size, max_upload_size
+
+SHA256_RE = re.compile(r"^[0-9a-f]{64}$")
+
+
+def parse_sparse_fields(query_params, allowed):
+    """Return the fields picked by ``?fields=``/``?omit=`` or ``None`` for all.
+
+    Both take comma-separated names from ``allowed``; the result keeps the
+    order of ``allowed`` so the output shape does not depend on the query.
+    """
+    selected = set(allowed)
+    errors = {}
+    for param in ("fields", "omit"):
+        raw = query_params.get(param)
+        if raw is None:
+            continue
+        names = {name.strip() for name in raw.split(",") if name.strip()}
+        unknown = sorted(names - set(allowed))
+        if unknown:
+            errors[param] = [f"Unknown field(s): {', '.join(unknown)}."]
+        elif param == "fields":
+            selected &= names
+        else:
+            selected -= names
+    if errors:
+        raise serializers.ValidationError(errors)
+    if selected == set(allowed):
+        return None
+    return tuple(name for name in allowed if name in selected)
 
 
 class SongSerializer(serializers.ModelSerializer):
+    cover_renditions = serializers.SerializerMethodField()
+
+    def __init__(self, *args, fields=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        if fields is not None:
+            for name in set(self.fields) - set(fields):
+                self.fields.pop(name)
+
     class Meta:
         model = Song
         fields = (
@@ -12,9 +58,187 @@ class SongSerializer(serializers.ModelSerializer):
             "audio_file",
             "lyrics_file",
             "cover_image",
+            "cover_renditions",
+            "audio_duration",
+            "audio_bitrate",
+            "audio_size",
+            "audio_hash",
             "style",
             "status",
             "published_at",
             "created_at",
             "updated_at",
         )
+
+    @extend_schema_field(
+        {
+            "type": "object",
+            "description": "Cover thumbnails by size label, then format.",
+            "additionalProperties": {
+                "type": "object",
+                "additionalProperties": {"type": "string", "format": "uri"},
+            },
+        }
+    )
+    def get_cover_renditions(self, obj):
+        storage = Song._meta.get_field("cover_image").storage
+        request = self.context.get("request")
+        result = {}
+        for label, formats in (obj.cover_renditions or {}).items():
+            result[label] = {}
+            for fmt, name in formats.items():
+                url = storage.url(name)
+                result[label][fmt] = (
+                    request.build_absolute_uri(url) if request is not None else url
+                )
+        return result
+
+
+class SongTombstoneSerializer(serializers.Serializer):
+    id = serializers.IntegerField()
+    title = serializers.CharField()
+    audio = serializers.CharField()
+    reason = serializers.ChoiceField(choices=SongTombstone.REASON_CHOICES)
+    removed_at = serializers.DateTimeField()
+
+
+class SongChangesSerializer(serializers.Serializer):
+    """Schema of ``/api/songs/changes/``; the view builds the payload directly."""
+
+    watermark = serializers.DateTimeField(allow_null=True)
+    changed = SongSerializer(many=True)
+    removed = SongTombstoneSerializer(many=True)
+
+
+class UploadSessionSerializer(serializers.ModelSerializer):
+    chunk_size = serializers.SerializerMethodField()
+
+    class Meta:
+        model = UploadSession
+        fields = (
+            "id",
+            "filename",
+            "size",
+            "offset",
+            "sha256",
+            "chunk_size",
+            "song",
+            "created_at",
+            "updated_at",
+            "finished_at",
+        )
+        read_only_fields = (
+            "offset",
+            "song",
+            "created_at",
+            "updated_at",
+            "finished_at",
+        )
+
+    def get_chunk_size(self, obj) -> int:
+        return chunk_size()
+
+    def validate_filename(self, value):
+        if value != os.path.basename(value) or value in (".", ".."):
+            raise serializers.ValidationError("Expected a file name, not a path.")
+        return value
+
+    def validate_size(self, value):
+        if not 0 < value <= max_upload_size():
+            raise serializers.ValidationError(
+                f"Expected 1 to {max_upload_size()} bytes."
+            )
+        return value
+
+    def validate_sha256(self, value):
+        value = value.lower()
+        if value and not SHA256_RE.match(value):
+            raise serializers.ValidationError("Expected 64 hex digits.")
+        return value
+
+
+class UploadFinalizeSerializer(serializers.Serializer):
+    song = serializers.PrimaryKeyRelatedField(queryset=Song.objects.all())
+
+
+class SongRowSerializer:
+    """Read-only twin of SongSerializer for ``.values()`` rows.
+
+    Produces the same dicts (and therefore the same JSON bytes) without the
+    ModelSerializer field machinery: file URLs are joined onto an absolute
+    media prefix computed once per request.
+    """
+
+    fields = SongSerializer.Meta.fields
+    file_fields = ("audio_file", "lyrics_file", "cover_image")
+    datetime_fields = ("created_at", "updated_at")
+
+    def __init__(self, request=None, fields=None):
+        self.request = request
+        self.prefixes = {}
+        for name in self.file_fields:
+            base_url = Song._meta.get_field(name).storage.base_url
+            if request is not None:
+                base_url = request.build_absolute_uri(base_url)
+            self.prefixes[name] = base_url
+        self.timezone = timezone.get_current_timezone() if settings.USE_TZ else None
+
+        converters = {name: None for name in self.fields}
+        for name in self.file_fields:
+            converters[name] = partial(self._file_url, name)
+        converters["cover_renditions"] = self._renditions
+        converters["published_at"] = self._date
+        for name in self.datetime_fields:
+            converters[name] = self.format_datetime
+        self.converters = [
+            (name, converters[name])
+            for name in (self.fields if fields is None else fields)
+        ]
+
+    def to_representation(self, row):
+        return {
+            name: row[name] if convert is None else convert(row[name])
+            for name, convert in self.converters
+        }
+
+    def many(self, rows):
+        return [self.to_representation(row) for row in rows]
+
+    def _file_url(self, field_name, name):
+        if not name:
+            return None
+        if ".." in name:
+            # Let the storage resolve relative segments exactly as it would.
+            url = Song._meta.get_field(field_name).storage.url(name)
+            if self.request is not None:
+                return self.request.build_absolute_uri(url)
+            return url
+        return self.prefixes[field_name] + filepath_to_uri(name).lstrip("/")
+
+    def _renditions(self, value):
+        return {
+            label: {
+                fmt: self._file_url("cover_image", name)
+                for fmt, name in formats.items()
+            }
+            for label, formats in (value or {}).items()
+        }
+
+    @staticmethod
+    def _date(value):
+        return value.isoformat() if value else None
+
+    def format_datetime(self, value):
+        if not value:
+            return None
+        if self.timezone is not None:
+            if timezone.is_aware(value):
+                value = value.astimezone(self.timezone)
+            else:
+                value = timezone.make_aware(value, self.timezone)
+        elif timezone.is_aware(value):
+            value = timezone.make_naive(value, timezone.utc)
+        text = value.isoformat()
+        if text.endswith("+00:00"):
+            text = text[:-6] + "Z"
+        return text
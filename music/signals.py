@@ -0,0 +1,121 @@
+from functools import partial
+from pathlib import Path
+
+from django.conf import settings
+from django.core.files import File
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from .cache import invalidate_catalogue
+from .jobs import autosync_enabled, queue_audio, request_autosync
+from .models import Song, SongTombstone
+from .renditions import generate_for_song
+
+
+@receiver(post_save, sender=Song)
+@receiver(post_delete, sender=Song)
+def song_changed(sender, **kwargs):
+    invalidate_catalogue()
+
+
+def _record_tombstone(song, reason):
+    audio_name = Path(song.audio_file.name).name if song.audio_file else ""
+    SongTombstone.objects.create(
+        song_id=song.pk,
+        title=song.title,
+        audio=f"music/{audio_name}" if audio_name else "",
+        reason=reason,
+    )
+
+
+@receiver(post_save, sender=Song)
+def record_unpublish(sender, instance, created, **kwargs):
+    previous = getattr(instance, "_loaded_status", None)
+    if (
+        not created
+        and previous == Song.STATUS_PUBLISHED
+        and instance.status != Song.STATUS_PUBLISHED
+    ):
+        _record_tombstone(instance, SongTombstone.REASON_UNPUBLISHED)
+    instance._loaded_status = instance.status
+
+
+@receiver(post_delete, sender=Song)
+def record_delete(sender, instance, **kwargs):
+    _record_tombstone(instance, SongTombstone.REASON_DELETED)
+
+
+@receiver(pre_save, sender=Song)
+def note_uploads(sender, instance, **kwargs):
+    # An upload may reuse the old name; the field commits it after this.
+    # Read from __dict__ so a deferred file field is not loaded for it.
+    instance._uploaded = set()
+    for field in ("audio_file", "cover_image"):
+        value = instance.__dict__.get(field)
+        if isinstance(value, File) and not getattr(value, "_committed", False):
+            instance._uploaded.add(field)
+
+
+def _file_replaced(song, field, loaded_attr):
+    """Whether ``song.<field>`` holds another file than when it was loaded.
+
+    Also remembers the current name, for the next save of the same instance.
+    """
+    previous = getattr(song, loaded_attr, None) or ""
+    name = getattr(song, field).name or ""
+    setattr(song, loaded_attr, name)
+    return name != previous or field in getattr(song, "_uploaded", ())
+
+
+@receiver(post_save, sender=Song)
+def schedule_cover_renditions(sender, instance, raw, update_fields, **kwargs):
+    if raw or not getattr(settings, "PUTEKLIS_COVER_RENDITIONS_ON_SAVE", True):
+        return
+    if update_fields is not None and "cover_image" not in update_fields:
+        return
+    # Edits that keep the cover have nothing to render.
+    if _file_replaced(instance, "cover_image", "_loaded_cover"):
+        transaction.on_commit(partial(generate_for_song, instance.pk))
+
+
+@receiver(post_save, sender=Song)
+def schedule_audio_processing(sender, instance, raw, update_fields, **kwargs):
+    if raw or (update_fields is not None and "audio_file" not in update_fields):
+        return
+    # Title and status edits keep the audio: there is nothing to re-read.
+    if _file_replaced(instance, "audio_file", "_loaded_audio"):
+        queue_audio([instance])
+
+
+@receiver(post_save, sender=Song)
+@receiver(post_delete, sender=Song)
+def schedule_autosync(sender, raw=False, **kwargs):
+    # Covers the admin, the REST API and scripts alike; the worker picks the
+    # debounced job up once the burst of changes is over.
+    if raw or not autosync_enabled():
+        return
+    transaction.on_commit(request_autosync)
+
+
+def bulk_saved(songs, update_fields=None):
+    """Do once what the post_save receivers do, for rows written in bulk.
+
+    ``bulk_create`` and ``bulk_update`` send no signals. Status changes are
+    not covered: bulk writers here never change ``status``.
+    """
+    songs = list(songs)
+    if not songs:
+        return
+    invalidate_catalogue()
+    if getattr(settings, "PUTEKLIS_COVER_RENDITIONS_ON_SAVE", True) and (
+        update_fields is None or "cover_image" in update_fields
+    ):
+        for song in songs:
+            if _file_replaced(song, "cover_image", "_loaded_cover"):
+                transaction.on_commit(partial(generate_for_song, song.pk))
+    if update_fields is None or "audio_file" in update_fields:
+        # Bulk writers set audio_file on purpose (new rows, renamed files).
+        queue_audio(song for song in songs if song.audio_file)
+    if autosync_enabled():
+        transaction.on_commit(request_autosync)
@@ -1,8 +1,197 @@
+import hashlib
+import os
+import uuid
+
+from django.conf import settings
 from django.core.files.storage import FileSystemStorage
 
+from .transfer import file_sha256
+
+
+def _link_as(source, destination, tmp_path):
+    """Atomically make ``destination`` a hard link to ``source``."""
+    os.link(source, tmp_path)
+    try:
+        os.replace(tmp_path, destination)
+    finally:
+        # rename() between two links to one file is a no-op that keeps both.
+        if os.path.lexists(tmp_path):
+            os.unlink(tmp_path)
+
 
 class OverwriteStorage(FileSystemStorage):
+    """Storage that replaces an existing file of the same name.
+
+    Deprecated: superseded by ContentAddressedStorage; kept only because old
+    migrations import it.
+    """
+
     def get_available_name(self, name, max_length=None):
         if self.exists(name):
             self.delete(name)
         return name
+
+
+class ContentAddressedStorage(FileSystemStorage):
+    """File storage that keeps one copy of each distinct content.
+
+    Every saved file is stored once as a blob named by its SHA-256 under
+    ``blobs/ab/cd/<digest>``; the logical name the field keeps (``music/x.mp3``)
+    is a hard link to that blob. The same audio uploaded under two names is
+    therefore one file on disk, and the link count (``st_nlink``) is the blob's
+    reference count: a blob whose count drops to 1 is no longer used by any
+    name and is removed. Saving over an existing name replaces the link
+    atomically, so readers never see a half-written file.
+
+    Where hard links are not supported the file is stored as a plain copy
+    and nothing is deduplicated.
+    """
+
+    def __init__(self, *args, blob_dir=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._blob_dir = blob_dir
+
+    @property
+    def blob_dir(self):
+        if self._blob_dir is not None:
+            return self._blob_dir
+        return getattr(settings, "PUTEKLIS_MEDIA_BLOB_DIR", "blobs")
+
+    def blob_name(self, digest):
+        return f"{self.blob_dir}/{digest[:2]}/{digest[2:4]}/{digest}"
+
+    def blob_url(self, digest):
+        """URL of the blob itself; its content never changes."""
+        return self.url(self.blob_name(digest))
+
+    def get_available_name(self, name, max_length=None):
+        # Saving over a name replaces it; ``_save`` swaps the link atomically.
+        return name
+
+    def _save(self, name, content):
+        full_path = self.path(name)
+        directory = os.path.dirname(full_path)
+        os.makedirs(directory, exist_ok=True)
+        tmp_path = os.path.join(directory, f".{uuid.uuid4().hex}.upload")
+        digest = hashlib.sha256()
+        try:
+            with open(tmp_path, "wb") as handle:
+                for chunk in content.chunks():
+                    digest.update(chunk)
+                    handle.write(chunk)
+            if self.file_permissions_mode is not None:
+                os.chmod(tmp_path, self.file_permissions_mode)
+            blob_path = self.path(self.blob_name(digest.hexdigest()))
+            self._store(tmp_path, blob_path, full_path)
+        finally:
+            if os.path.exists(tmp_path):
+                os.unlink(tmp_path)
+        return name.replace("\\", "/")
+
+    def ingest(self, path, name, digest=None):
+        """Store the local file ``path`` as ``name`` by linking, not copying.
+
+        ``path`` must be on the same filesystem as the storage (the chunked
+        upload directory is) and is consumed. Returns the stored name.
+        """
+        name = self.get_available_name(name)
+        full_path = self.path(name)
+        os.makedirs(os.path.dirname(full_path), exist_ok=True)
+        digest = digest or file_sha256(path)
+        try:
+            self._store(path, self.path(self.blob_name(digest)), full_path)
+        finally:
+            if os.path.exists(path):
+                os.unlink(path)
+        return name.replace("\\", "/")
+
+    def _store(self, tmp_path, blob_path, full_path):
+        os.makedirs(os.path.dirname(blob_path), exist_ok=True)
+        released = self._released_blob(full_path)
+        try:
+            # Creates the blob only if no other upload got there first.
+            os.link(tmp_path, blob_path)
+        except FileExistsError:
+            pass
+        except OSError:
+            # No hard links here: store a plain copy.
+            os.replace(tmp_path, full_path)
+            self._drop_if_unused(released)
+            return
+        _link_as(blob_path, full_path, f"{tmp_path}.link")
+        self._drop_if_unused(released)
+
+    def _released_blob(self, full_path):
+        """The blob ``full_path`` was the last name of, if any.
+
+        Only hashes the file when its link count says it might be.
+        """
+        try:
+            stat = os.stat(full_path)
+        except FileNotFoundError:
+            return None
+        if stat.st_nlink != 2:
+            return None
+        blob_path = self.path(self.blob_name(file_sha256(full_path)))
+        try:
+            if os.stat(blob_path).st_ino == stat.st_ino:
+                return blob_path
+        except FileNotFoundError:
+            pass
+        return None
+
+    @staticmethod
+    def _drop_if_unused(blob_path):
+        try:
+            if blob_path and os.stat(blob_path).st_nlink == 1:
+                os.unlink(blob_path)
+        except FileNotFoundError:
+            pass
+
+    def delete(self, name):
+        if not name:
+            raise ValueError("The name must be given to delete().")
+        full_path = self.path(name)
+        released = self._released_blob(full_path)
+        super().delete(name)
+        self._drop_if_unused(released)
+
+    def adopt(self, name):
+        """Move an existing plain file into the blob store.
+
+        Returns ``True`` if ``name`` now shares a blob, ``False`` if it
+        already did or hard links are not supported.
+        """
+        full_path = self.path(name)
+        stat = os.stat(full_path)
+        if stat.st_nlink > 1:
+            return False
+        blob_path = self.path(self.blob_name(file_sha256(full_path)))
+        os.makedirs(os.path.dirname(blob_path), exist_ok=True)
+        try:
+            try:
+                os.link(full_path, blob_path)
+                return True
+            except FileExistsError:
+                pass
+            _link_as(blob_path, full_path, f"{full_path}.{uuid.uuid4().hex}.link")
+        except OSError:
+            return False
+        return True
+
+    def prune_blobs(self, dry_run=False):
+        """Delete blobs no name links to any more; return how many there were.
+
+        Normally ``_save`` and ``delete`` clean up after themselves; this
+        catches blobs orphaned by files removed outside the storage API.
+        """
+        unused = 0
+        root = self.path(self.blob_dir)
+        for directory, _, files in os.walk(root):
+            for file_name in files:
+                path = os.path.join(directory, file_name)
+                if os.stat(path).st_nlink == 1:
+                    unused += 1
+                    if not dry_run:
+                        self._drop_if_unused(path)
+        return unused
@@ -0,0 +1,191 @@
+import hashlib
+import mimetypes
+import re
+from pathlib import Path
+
+from django.conf import settings
+from django.http import Http404, HttpResponse, StreamingHttpResponse
+from django.utils.cache import get_conditional_response
+from django.utils.encoding import filepath_to_uri
+from django.utils.http import http_date, parse_http_date_safe, quote_etag
+from django.views.decorators.http import require_safe
+
+from .models import Song
+
+RANGE_RE = re.compile(r"^bytes=(\d*)-(\d*)$")
+
+
+def parse_range(header, size):
+    """Return ``(start, end)`` (inclusive) for a single byte range.
+
+    Returns ``None`` when the header is absent, malformed or asks for several
+    ranges (the full body is served then) and ``False`` when the range cannot
+    be satisfied.
+    """
+    if not header:
+        return None
+    match = RANGE_RE.match(header.strip())
+    if not match:
+        return None
+    first, last = match.groups()
+    if not first and not last:
+        return None
+    if not first:
+        # Suffix range: the last N bytes.
+        length = int(last)
+        if length == 0:
+            return False
+        return max(size - length, 0), size - 1
+    start = int(first)
+    end = int(last) if last else size - 1
+    if start > end and last:
+        return None
+    if start >= size:
+        return False
+    return start, min(end, size - 1)
+
+
+def if_range_passes(header, etag, last_modified):
+    """Whether a Range request may be honoured given its ``If-Range``."""
+    if not header:
+        return True
+    header = header.strip()
+    if header.startswith(('"', "W/")):
+        # Strong comparison only; weak validators never match.
+        return header == etag
+    since = parse_http_date_safe(header)
+    return since is not None and since == last_modified
+
+
+def iter_file(handle, start, length, chunk_size):
+    try:
+        handle.seek(start)
+        remaining = length
+        while remaining > 0:
+            chunk = handle.read(min(chunk_size, remaining))
+            if not chunk:
+                break
+            remaining -= len(chunk)
+            yield chunk
+    finally:
+        handle.close()
+
+
+def _sendfile_response(field, content_type):
+    mode = getattr(settings, "PUTEKLIS_AUDIO_SENDFILE", "")
+    if mode == "x-accel-redirect":
+        prefix = getattr(settings, "PUTEKLIS_AUDIO_ACCEL_PREFIX", "/protected-media/")
+        response = HttpResponse(content_type=content_type)
+        response["X-Accel-Redirect"] = (
+            prefix.rstrip("/") + "/" + filepath_to_uri(field.name)
+        )
+        return response
+    if mode == "x-sendfile":
+        response = HttpResponse(content_type=content_type)
+        response["X-Sendfile"] = field.path
+        return response
+    return None
+
+
+@require_safe
+def song_audio(request, pk):
+    """Stream a published song's audio with Range, If-Range and ETag support."""
+    song = (
+        Song.objects.filter(pk=pk, status=Song.STATUS_PUBLISHED)
+        .only("id", "audio_file")
+        .first()
+    )
+    if song is None or not song.audio_file:
+        raise Http404("Song not found")
+
+    field = song.audio_file
+    storage = field.storage
+    try:
+        size = storage.size(field.name)
+        modified = storage.get_modified_time(field.name)
+    except (OSError, NotImplementedError):
+        raise Http404("Audio file not found")
+    last_modified = int(modified.timestamp())
+    digest = hashlib.sha256(f"{field.name}|{size}|{modified.timestamp()}".encode())
+    etag = quote_etag(digest.hexdigest()[:32])
+    content_type = mimetypes.guess_type(field.name)[0] or "application/octet-stream"
+
+    def with_validators(response):
+        response["ETag"] = etag
+        response["Last-Modified"] = http_date(last_modified)
+        response["Accept-Ranges"] = "bytes"
+        return response
+
+    not_modified = get_conditional_response(
+        request, etag=etag, last_modified=last_modified
+    )
+    if not_modified is not None:
+        return with_validators(not_modified)
+
+    handoff = _sendfile_response(field, content_type)
+    if handoff is not None:
+        # The proxy serves the bytes and handles Range itself.
+        return with_validators(handoff)
+
+    byte_range = None
+    if if_range_passes(request.META.get("HTTP_IF_RANGE"), etag, last_modified) and size:
+        byte_range = parse_range(request.META.get("HTTP_RANGE"), size)
+    if byte_range is False:
+        response = HttpResponse(status=416)
+        response["Content-Range"] = f"bytes */{size}"
+        return with_validators(response)
+
+    start, end = byte_range or (0, size - 1)
+    length = end - start + 1 if size else 0
+    status = 206 if byte_range else 200
+
+    if request.method == "HEAD":
+        response = HttpResponse(status=status, content_type=content_type)
+    else:
+        # The file may have gone since the stat above.
+        try:
+            handle = storage.open(field.name, "rb")
+        except OSError:
+            raise Http404("Audio file not found")
+        chunk_size = getattr(settings, "PUTEKLIS_AUDIO_CHUNK_SIZE", 64 * 1024)
+        response = StreamingHttpResponse(
+            iter_file(handle, start, length, chunk_size),
+            status=status,
+            content_type=content_type,
+        )
+    response["Content-Length"] = str(length)
+    if byte_range:
+        response["Content-Range"] = f"bytes {start}-{end}/{size}"
+    return with_validators(response)
+
+
+@require_safe
+def song_peaks(request, pk):
+    """Waveform peaks of a published song (see ``music.waveform``).
+
+    The file name carries the audio's SHA-256 and the resolution, so it is a
+    strong ETag: clients revalidate with one indexed lookup and get 304.
+    """
+    song = (
+        Song.objects.filter(pk=pk, status=Song.STATUS_PUBLISHED)
+        .only("id", "audio_file", "waveform")
+        .first()
+    )
+    if song is None or not song.waveform:
+        raise Http404("Waveform not found")
+
+    etag = quote_etag(Path(song.waveform).stem)
+    max_age = getattr(settings, "PUTEKLIS_WAVEFORM_MAX_AGE", 3600)
+    not_modified = get_conditional_response(request, etag=etag)
+    if not_modified is not None:
+        response = not_modified
+    else:
+        try:
+            with song.audio_file.storage.open(song.waveform, "rb") as handle:
+                content = handle.read()
+        except OSError:
+            raise Http404("Waveform not found")
+        response = HttpResponse(content, content_type="application/octet-stream")
+    response["ETag"] = etag
+    response["Cache-Control"] = f"public, max-age={max_age}"
+    return response
@@ -0,0 +1,256 @@
+import json
+import os
+from pathlib import Path
+
+from django.conf import settings
+from django.template.defaultfilters import filesizeformat
+
+from .artifacts import catalogue_artifacts, compressed, prune_hashed, read_manifest
+from .datori import DatoriTemplate
+from .models import Song
+from .publish import Publisher
+from .transfer import CopyPlanner, TransferStage
+
+ADDED = "added"
+UPDATED = "updated"
+
+
+def get_web_root():
+    web_root = getattr(settings, "PUTEKLIS_WEB_PATH", None)
+    return Path(web_root) if web_root else None
+
+
+class SongCatalogue:
+    """``songs.json`` entries indexed by ``(title, audio)``, in file order.
+
+    Lookups, updates and removals are O(1), so merging a whole catalogue is
+    O(n). Duplicate keys already present in the file are kept; an update
+    touches the first of them and a removal drops all of them, exactly as the
+    old list scans did.
+    """
+
+    def __init__(self, items=()):
+        self._items = []
+        self._positions = {}
+        for item in items:
+            self._append(item)
+
+    @staticmethod
+    def key(item):
+        return item.get("title"), item.get("audio")
+
+    def _append(self, item):
+        self._positions.setdefault(self.key(item), []).append(len(self._items))
+        self._items.append(item)
+
+    def upsert(self, entry):
+        """Add or replace ``entry``; return ``ADDED``, ``UPDATED`` or ``None``."""
+        positions = self._positions.get(self.key(entry))
+        if not positions:
+            self._append(entry)
+            return ADDED
+        idx = positions[0]
+        if self._items[idx] == entry:
+            return None
+        self._items[idx] = entry
+        return UPDATED
+
+    def remove(self, title, audio):
+        """Drop every entry with this key and return how many there were."""
+        positions = self._positions.pop((title, audio), [])
+        for idx in positions:
+            self._items[idx] = None
+        return len(positions)
+
+    def entries(self):
+        return [item for item in self._items if item is not None]
+
+
+class SyncResult:
+    def __init__(self):
+        self.added = 0
+        self.updated = 0
+        self.removed = 0
+        self.missing = []
+        self.bytes_copied = 0
+        self.bytes_skipped = 0
+
+
+def _file_name(field):
+    # os.path rather than pathlib: this runs three times per song.
+    return os.path.basename(field.name) if field else ""
+
+
+def song_key(song):
+    audio_name = _file_name(song.audio_file)
+    return song.title, f"music/{audio_name}" if audio_name else ""
+
+
+def song_entry(song):
+    lyrics_name = _file_name(song.lyrics_file)
+    image_name = _file_name(song.cover_image)
+    title, audio = song_key(song)
+    entry = {
+        "title": title,
+        "audio": audio,
+        "lyrics": f"lyrics/{lyrics_name}" if lyrics_name else "",
+        "image": f"cover/{image_name}" if image_name else "",
+        "style": song.style or "",
+    }
+    if song.audio_hash:
+        # Lets the player show lengths without fetching the audio.
+        entry.update(
+            duration=song.audio_duration,
+            bitrate=song.audio_bitrate,
+            size=song.audio_size,
+            hash=song.audio_hash,
+        )
+    return entry
+
+
+def load_catalogue(web_root):
+    songs_path = Path(web_root) / "songs.json"
+    if not songs_path.exists():
+        return SongCatalogue()
+    raw = songs_path.read_text(encoding="utf-8", errors="replace")
+    return SongCatalogue(json.loads(raw))
+
+
+def render_songs_json(data):
+    return json.dumps(data, ensure_ascii=False, indent=2)
+
+
+def render_songs_data_js(data):
+    payload = json.dumps(data, ensure_ascii=False, indent=2)
+    return f"const songs = {payload};\n"
+
+
+def write_catalogue(web_root, catalogue):
+    """Publish the generated site files; return missing paths.
+
+    Besides songs.json, songs_data.js and datori.html this writes their
+    precompressed siblings and the hashed, minified artifacts with their
+    manifest. Everything is swapped in together by a ``Publisher`` and left
+    untouched when the contents would not change.
+    """
+    web_root = Path(web_root)
+    data = catalogue.entries()
+    files = {
+        "songs.json": render_songs_json(data).encode("utf-8"),
+        "songs_data.js": render_songs_data_js(data).encode("utf-8"),
+    }
+    for name, content in list(files.items()):
+        files.update(compressed(name, content))
+    files.update(catalogue_artifacts(data))
+
+    missing = []
+    html_path = web_root / "datori.html"
+    template = DatoriTemplate.load(html_path)
+    if template is None:
+        missing.append(str(html_path))
+    else:
+        files["datori.html"] = template.render(data).encode("utf-8")
+
+    # Keep the artifacts the replaced manifest points to, for pages and
+    # caches that still reference them (and for rollback_site).
+    keep = set(read_manifest(web_root).values())
+    if "datori.html" in Publisher(web_root).publish(files):
+        DatoriTemplate.remember(html_path, template)
+    keep.update(read_manifest(web_root).values())
+    prune_hashed(web_root, keep)
+    return missing
+
+
+def transfer_summary(result):
+    return (
+        f"Nokopēti: {filesizeformat(result.bytes_copied)}, "
+        f"izlaisti nemainītie: {filesizeformat(result.bytes_skipped)}."
+    )
+
+
+def sync_summary(result):
+    """Counts of a ``SyncResult`` (or a finished ``SyncJob``) for messages."""
+    return (
+        f"Pievienoti: {result.added}, atjaunināti: {result.updated}, "
+        f"izņemti: {result.removed}. {transfer_summary(result)}"
+    )
+
+
+def get_copy_planner():
+    return CopyPlanner(getattr(settings, "PUTEKLIS_SYNC_MANIFEST", None))
+
+
+def song_files(song, web_root):
+    """``(source, destination)`` paths of a song's media in the web root."""
+    web_root = Path(web_root)
+    for field, folder in (
+        (song.audio_file, "music"),
+        (song.lyrics_file, "lyrics"),
+        (song.cover_image, "cover"),
+    ):
+        if field:
+            yield Path(field.path), web_root / folder / _file_name(field)
+
+
+def merge_song(catalogue, song, result):
+    """Apply one song to ``catalogue``; return whether it is published."""
+    if song.status != Song.STATUS_PUBLISHED:
+        title, audio = song_key(song)
+        if audio:
+            result.removed += catalogue.remove(title, audio)
+        return False
+    outcome = catalogue.upsert(song_entry(song))
+    if outcome == ADDED:
+        result.added += 1
+    elif outcome == UPDATED:
+        result.updated += 1
+    return True
+
+
+def sync_songs(songs, catalogue=None, copy_files=True, progress=None, removals=()):
+    """Merge ``songs`` into the static site and write it once.
+
+    Starts from the current ``songs.json`` unless a ``catalogue`` is given
+    (``SongCatalogue()`` rebuilds the file from scratch). ``removals`` are
+    ``(title, audio)`` keys dropped before the songs are merged. Media files are
+    copied by a ``TransferStage``; ``progress(done, total)`` follows it.
+    Returns ``None`` when ``PUTEKLIS_WEB_PATH`` is not configured.
+    """
+    web_root = get_web_root()
+    if web_root is None:
+        return None
+    if catalogue is None:
+        catalogue = load_catalogue(web_root)
+    result = SyncResult()
+    planner = get_copy_planner()
+    stage = TransferStage(progress=progress)
+    for title, audio in removals:
+        result.removed += catalogue.remove(title, audio)
+    for song in songs:
+        if merge_song(catalogue, song, result) and copy_files:
+            for source, destination in song_files(song, web_root):
+                stage.add(
+                    destination, planner.copy, source, destination, result.missing
+                )
+    try:
+        errors = stage.run()
+    finally:
+        planner.save()
+    for destination, exc in errors.items():
+        result.missing.append(f"{destination} ({exc.strerror or exc})")
+    result.bytes_copied = planner.bytes_copied
+    result.bytes_skipped = planner.bytes_skipped
+    result.missing.extend(write_catalogue(web_root, catalogue))
+    return result
+
+
+def remove_song(song):
+    """Drop ``song`` from songs.json; return whether anything was removed."""
+    web_root = get_web_root()
+    if web_root is None or not (web_root / "songs.json").exists():
+        return False
+    catalogue = load_catalogue(web_root)
+    if not catalogue.remove(*song_key(song)):
+        return False
+    write_catalogue(web_root, catalogue)
+    return True
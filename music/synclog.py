@@ -0,0 +1,138 @@
+import json
+import os
+from contextlib import contextmanager
+from pathlib import Path
+
+from django.conf import settings
+from django.utils import timezone
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+try:
+    import msvcrt
+except ImportError:
+    msvcrt = None
+
+RESULT_FIELDS = ("added", "updated", "removed", "bytes_copied", "bytes_skipped")
+
+
+@contextmanager
+def _file_lock(path):
+    """Exclusive lock shared by every process appending to the log."""
+    with open(path, "a+b") as handle:
+        if fcntl is not None:
+            fcntl.flock(handle, fcntl.LOCK_EX)
+        elif msvcrt is not None:
+            handle.seek(0)
+            msvcrt.locking(handle.fileno(), msvcrt.LK_LOCK, 1)
+        try:
+            yield
+        finally:
+            if fcntl is not None:
+                fcntl.flock(handle, fcntl.LOCK_UN)
+            elif msvcrt is not None:
+                handle.seek(0)
+                msvcrt.locking(handle.fileno(), msvcrt.LK_UNLCK, 1)
+
+
+class SyncLog:
+    """Append-only JSON-lines log, rotated by size.
+
+    Each entry is one ``write`` to a file opened in append mode, under a
+    lock file so that rotation and appends from several processes do not
+    interleave. Rotation renames ``sync.jsonl`` to ``sync.jsonl.1`` and so on,
+    keeping ``backups`` old files.
+    """
+
+    def __init__(self, path, max_bytes=1024 * 1024, backups=5):
+        self.path = Path(path)
+        self.max_bytes = max_bytes
+        self.backups = backups
+
+    def write(self, entry):
+        line = json.dumps(entry, ensure_ascii=False, separators=(",", ":"))
+        data = (line + "\n").encode("utf-8")
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        with _file_lock(self.path.with_name(f"{self.path.name}.lock")):
+            try:
+                size = self.path.stat().st_size
+            except FileNotFoundError:
+                size = 0
+            if size and size + len(data) > self.max_bytes:
+                self._rotate()
+            fd = os.open(self.path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+            try:
+                os.write(fd, data)
+            finally:
+                os.close(fd)
+
+    def _rotate(self):
+        if self.backups <= 0:
+            self.path.unlink(missing_ok=True)
+            return
+        for index in range(self.backups - 1, 0, -1):
+            source = self.path.with_name(f"{self.path.name}.{index}")
+            if source.exists():
+                os.replace(source, self.path.with_name(f"{self.path.name}.{index + 1}"))
+        os.replace(self.path, self.path.with_name(f"{self.path.name}.1"))
+
+    def tail(self, count, block_size=8192):
+        """Return the last ``count`` entries, newest first.
+
+        Reads backwards from the end in blocks, so the cost depends on the
+        entries returned, not on the size of the file.
+        """
+        try:
+            handle = open(self.path, "rb")
+        except FileNotFoundError:
+            return []
+        with handle:
+            handle.seek(0, os.SEEK_END)
+            position = handle.tell()
+            buffer = b""
+            while position > 0 and buffer.count(b"\n") <= count:
+                step = min(block_size, position)
+                position -= step
+                handle.seek(position)
+                buffer = handle.read(step) + buffer
+        lines = buffer.splitlines()
+        if position > 0:
+            # The first line may be cut off.
+            lines = lines[1:]
+        entries = []
+        for line in reversed(lines):
+            if len(entries) == count:
+                break
+            try:
+                entries.append(json.loads(line))
+            except ValueError:
+                continue
+        return entries
+
+
+def get_sync_log():
+    return SyncLog(
+        getattr(settings, "PUTEKLIS_SYNC_LOG", Path(settings.BASE_DIR) / "sync.jsonl"),
+        max_bytes=getattr(settings, "PUTEKLIS_SYNC_LOG_MAX_BYTES", 1024 * 1024),
+        backups=getattr(settings, "PUTEKLIS_SYNC_LOG_BACKUPS", 5),
+    )
+
+
+def log_sync(action, message, missing=(), result=None, duration=None, **extra):
+    """Record one sync event; counts are taken from ``result`` if given."""
+    entry = {
+        "time": timezone.now().isoformat(),
+        "action": action,
+        "message": message,
+    }
+    if duration is not None:
+        entry["duration"] = round(duration, 3)
+    if result is not None:
+        for name in RESULT_FIELDS:
+            entry[name] = getattr(result, name)
+    entry["missing"] = list(missing)
+    entry["pid"] = os.getpid()
+    entry.update(extra)
+    get_sync_log().write(entry)
@@ -1,13 +1,53 @@
+import gzip
+import hashlib
 import io
+import json
+import multiprocessing
+import os
+import shutil
+import struct
+import sys
 import tempfile
+import time
+import wave
+from array import array
+from concurrent.futures.process import BrokenProcessPool
+from datetime import date, timedelta
+from pathlib import Path
+from unittest import mock, skipUnless
 
+from django.conf import settings
 from django.contrib.auth import get_user_model
+from django.core.cache import cache
 from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db import connection
+from django.db.models import F
 from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
 from PIL import Image
-from rest_framework.test import APIClient
+from rest_framework.renderers import JSONRenderer
+from rest_framework.request import Request
+from rest_framework.test import APIClient, APIRequestFactory
 
-from .models import Song
+from .audiometa import probe
+from .datori import DatoriTemplate
+from .jobs import process_pending_audio, request_autosync
+from .metrics import registry
+from .models import Song, SyncJob
+from .pagination import SongCursorPagination
+from .pool import run_jobs
+from .publish import Publisher
+from .renderers import FastJSONRenderer
+from .renditions import render_cover
+from .serializers import SongSerializer
+from .storage import ContentAddressedStorage
+from .sync import remove_song, song_entry, sync_songs
+from .synclog import SyncLog, get_sync_log
+from .transfer import CopyPlanner, TransferStage
+from .waveform import compute_peaks, decode, decode_peaks, encode, render_waveform
 
 
 def _make_image_file(name="cover.png"):
@@ -20,6 +60,7 @@ def _make_image_file(name="cover.png"):
 @override_settings(MEDIA_ROOT=tempfile.mkdtemp())
 class SongApiTests(TestCase):
     def setUp(self):
+        cache.clear()
         self.client = APIClient()
 
     def test_list_only_published_songs(self):
@@ -64,3 +105,1586 @@ class SongApiTests(TestCase):
         self.assertEqual(response.status_code, 200)
         titles = {item["title"] for item in response.json()}
         self.assertIn("Draft song", titles)
+
+
+def _make_song(title, status=Song.STATUS_PUBLISHED, **extra):
+    slug = title.lower().replace(" ", "_")
+    return Song.objects.create(
+        title=title,
+        audio_file=SimpleUploadedFile(f"{slug}.mp3", b"audio"),
+        cover_image=_make_image_file(f"{slug}.png"),
+        status=status,
+        **extra,
+    )
+
+
+@override_settings(MEDIA_ROOT=tempfile.mkdtemp())
+class SongPaginationTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+
+    def test_list_is_unpaginated_by_default(self):
+        _make_song("Song A")
+        response = self.client.get("/api/songs/")
+        self.assertIsInstance(response.json(), list)
+
+    @override_settings(PUTEKLIS_SONGS_MAX_PAGE_SIZE=3)
+    def test_cursor_walks_catalogue_in_order_without_count(self):
+        for idx in range(7):
+            _make_song(
+                f"Song {idx}",
+                published_at=date(2024, 1, 1 + idx % 3) if idx % 4 else None,
+            )
+        expected = list(
+            Song.objects.filter(status=Song.STATUS_PUBLISHED).values_list(
+                "title", flat=True
+            )
+        )
+
+        titles = []
+        url = "/api/songs/?page_size=10"
+        with CaptureQueriesContext(connection) as queries:
+            while url:
+                payload = self.client.get(url).json()
+                self.assertLessEqual(len(payload["results"]), 3)
+                titles.extend(item["title"] for item in payload["results"])
+                url = payload["next"]
+
+        self.assertEqual(titles, expected)
+        self.assertFalse(any("COUNT(" in q["sql"].upper() for q in queries))
+
+    def test_cursor_with_null_dates_from_older_links(self):
+        first = _make_song("First", published_at=date(2024, 1, 1))
+        _make_song("Undated")
+        pagination = SongCursorPagination()
+        # Cursors issued before the sort keys carried None for NULL dates.
+        cursor = pagination.encode_cursor([None, None, first.pk + 10])
+        payload = self.client.get(f"/api/songs/?page_size=5&cursor={cursor}").json()
+        self.assertEqual([item["title"] for item in payload["results"]], ["Undated"])
+
+    def test_invalid_cursor_returns_404(self):
+        response = self.client.get("/api/songs/?cursor=not-a-cursor")
+        self.assertEqual(response.status_code, 404)
+
+
+class QueryPlanTests(TestCase):
+    def test_api_querysets_use_indexes(self):
+        out = io.StringIO()
+        call_command("check_query_plans", stdout=out)
+        self.assertNotIn("FAIL", out.getvalue())
+
+
+@override_settings(MEDIA_ROOT=tempfile.mkdtemp())
+class ConditionalGetTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.song = _make_song("Song A")
+
+    def test_list_revalidates_with_etag(self):
+        response = self.client.get("/api/songs/")
+        etag = response["ETag"]
+        self.assertTrue(response.has_header("Last-Modified"))
+
+        with self.assertNumQueries(0):
+            cached = self.client.get("/api/songs/", HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(cached.status_code, 304)
+
+        _make_song("Song B")
+        fresh = self.client.get("/api/songs/", HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(fresh.status_code, 200)
+        self.assertNotEqual(fresh["ETag"], etag)
+
+    def test_list_etag_changes_on_delete(self):
+        etag = self.client.get("/api/songs/")["ETag"]
+        self.song.delete()
+        response = self.client.get("/api/songs/", HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json(), [])
+
+    def test_detail_revalidates_with_last_modified(self):
+        url = f"/api/songs/{self.song.pk}/"
+        last_modified = self.client.get(url)["Last-Modified"]
+        cached = self.client.get(url, HTTP_IF_MODIFIED_SINCE=last_modified)
+        self.assertEqual(cached.status_code, 304)
+        self.assertEqual(self.client.get("/api/songs/abc/").status_code, 404)
+
+
+@override_settings(MEDIA_ROOT=tempfile.mkdtemp())
+class SongResponseCacheTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.song = _make_song("Song A")
+
+    def test_repeat_list_is_served_from_cache(self):
+        first = self.client.get("/api/songs/")
+        with self.assertNumQueries(0):
+            second = self.client.get("/api/songs/")
+        self.assertEqual(second.content, first.content)
+        self.assertEqual(second["ETag"], first["ETag"])
+
+    def test_save_and_delete_invalidate(self):
+        url = f"/api/songs/{self.song.pk}/"
+        self.client.get(url)
+        self.song.title = "Renamed"
+        self.song.save()
+        self.assertEqual(self.client.get(url).json()["title"], "Renamed")
+        self.song.delete()
+        self.assertEqual(self.client.get(url).status_code, 404)
+
+    def test_staff_and_public_do_not_share_entries(self):
+        _make_song("Draft song", status=Song.STATUS_DRAFT)
+        self.client.get("/api/songs/")
+        staff = get_user_model().objects.create_user(
+            username="admin", password="pass12345", is_staff=True
+        )
+        self.client.force_authenticate(user=staff)
+        titles = {item["title"] for item in self.client.get("/api/songs/").json()}
+        self.assertIn("Draft song", titles)
+
+
+@override_settings(MEDIA_ROOT=tempfile.mkdtemp())
+class MetricsViewTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        _make_song("Song A")
+        _make_song("Draft song", status=Song.STATUS_DRAFT)
+
+    def test_json_counts_use_one_cached_query(self):
+        with self.assertNumQueries(1):
+            first = self.client.get("/api/metrics/")
+        with self.assertNumQueries(0):
+            second = self.client.get("/api/metrics/")
+        expected = {"songs_total": 2, "songs_published": 1, "songs_draft": 1}
+        self.assertEqual(first.json(), expected)
+        self.assertEqual(second.json(), expected)
+
+    def test_prometheus_output_merges_worker_files(self):
+        metrics_dir = tempfile.mkdtemp()
+        Path(metrics_dir, "puteklis-999999.json").write_text(
+            json.dumps(
+                {
+                    "requests": {"song-list|GET|200": 5},
+                    "durations": {},
+                    "queries": {"song-list|GET": 7},
+                }
+            ),
+            encoding="utf-8",
+        )
+        with override_settings(PUTEKLIS_METRICS_DIR=metrics_dir):
+            self.client.get("/api/songs/")
+            response = self.client.get("/api/metrics/?format=prometheus")
+
+        self.assertTrue(response["Content-Type"].startswith("text/plain"))
+        self.assertIn("version=0.0.4", response["Content-Type"])
+        body = response.content.decode()
+        self.assertIn('puteklis_songs{status="published"} 1', body)
+        self.assertIn(
+            'puteklis_http_requests_total{view="song-list",method="GET",status="200"}',
+            body,
+        )
+        self.assertNotIn(
+            'puteklis_http_requests_total{view="song-list",method="GET",status="200"}'
+            " 1\n",
+            body,
+        )
+        self.assertIn("puteklis_http_request_duration_seconds_bucket", body)
+
+    def test_unknown_methods_share_one_label(self):
+        before = registry.snapshot()["requests"].get("song-list|other|403", 0)
+        self.client.generic("BREW", "/api/songs/")
+        self.client.generic("PROPFIND", "/api/songs/")
+        requests = registry.snapshot()["requests"]
+        self.assertFalse([key for key in requests if "BREW" in key])
+        self.assertEqual(requests["song-list|other|403"], before + 2)
+
+    @override_settings(PUTEKLIS_METRICS_TOKEN="secret")
+    def test_token_is_required_when_configured(self):
+        self.assertEqual(self.client.get("/api/metrics/").status_code, 403)
+        response = self.client.get("/api/metrics/", HTTP_AUTHORIZATION="Bearer secret")
+        self.assertEqual(response.status_code, 200)
+
+
+@override_settings(MEDIA_ROOT=tempfile.mkdtemp())
+class FastSerializerTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+
+    def test_fast_path_matches_song_serializer_bytes(self):
+        _make_song(
+            'Dziesma ar garumzīmēm\u2028un "pēdiņām"',
+            published_at=date(2024, 5, 1),
+            created_at=timezone.now(),
+            style="<b>rock</b>",
+        )
+        _make_song("Otrā dziesma")
+
+        response = self.client.get("/api/songs/")
+        request = Request(APIRequestFactory().get("/api/songs/"))
+        expected = JSONRenderer().render(
+            SongSerializer(
+                Song.objects.filter(status=Song.STATUS_PUBLISHED),
+                many=True,
+                context={"request": request},
+            ).data
+        )
+        self.assertEqual(response.content, expected)
+
+        song = Song.objects.first()
+        detail = self.client.get(f"/api/songs/{song.pk}/")
+        expected = JSONRenderer().render(
+            SongSerializer(song, context={"request": request}).data
+        )
+        self.assertEqual(detail.content, expected)
+
+    def test_floats_parse_to_the_same_values(self):
+        data = {"audio_duration": [0.1, 2.5, 123.456, 1e16, 1e-7, 1 / 3]}
+        fast = FastJSONRenderer().render(data)
+        self.assertEqual(json.loads(fast), json.loads(JSONRenderer().render(data)))
+
+        song = _make_song("Garā")
+        Song.objects.filter(pk=song.pk).update(audio_duration=1e16)
+        item = self.client.get(f"/api/songs/{song.pk}/").json()
+        self.assertEqual(item["audio_duration"], 1e16)
+
+
+@override_settings(MEDIA_ROOT=tempfile.mkdtemp())
+class SparseFieldsetTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.song = _make_song("Song A", style="long style text")
+
+    def test_fields_trim_output_and_select(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get("/api/songs/?fields=title,id,audio_file")
+        self.assertEqual(list(response.json()[0]), ["id", "title", "audio_file"])
+        select = [q["sql"] for q in queries if "music_song" in q["sql"]][-1]
+        self.assertNotIn('"style"', select)
+
+    def test_omit_on_detail_and_browsable_api(self):
+        url = f"/api/songs/{self.song.pk}/?omit=style,status"
+        data = self.client.get(url).json()
+        self.assertNotIn("style", data)
+        self.assertNotIn("status", data)
+        self.assertIn("title", data)
+        html = self.client.get(url + "&format=api")
+        self.assertEqual(html.status_code, 200)
+
+    def test_fields_work_with_pagination(self):
+        _make_song("Song B")
+        payload = self.client.get("/api/songs/?fields=title&page_size=1").json()
+        # Same dates: the newest id comes first.
+        self.assertEqual(payload["results"], [{"title": "Song B"}])
+        self.assertIsNotNone(payload["next"])
+
+    def test_unknown_field_is_rejected(self):
+        response = self.client.get("/api/songs/?fields=title,secret")
+        self.assertEqual(response.status_code, 400)
+        self.assertIn("fields", response.json())
+
+
+@override_settings(MEDIA_ROOT=tempfile.mkdtemp(), PUTEKLIS_CHANGES_OVERLAP=0)
+class ChangeFeedTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+
+    def test_feed_returns_changes_tombstones_and_watermark(self):
+        kept = _make_song("Kept")
+        unpublished = _make_song("Unpublished")
+        deleted = _make_song("Deleted")
+        payload = self.client.get("/api/songs/changes/").json()
+        self.assertEqual(len(payload["changed"]), 3)
+        self.assertEqual(payload["removed"], [])
+        watermark = payload["watermark"]
+
+        unpublished = Song.objects.get(pk=unpublished.pk)
+        unpublished.status = Song.STATUS_DRAFT
+        unpublished.save()
+        deleted_id = deleted.pk
+        Song.objects.get(pk=deleted_id).delete()
+        kept.style = "new style"
+        kept.save()
+
+        payload = self.client.get(
+            "/api/songs/changes/", {"updated_since": watermark}
+        ).json()
+        self.assertEqual([item["title"] for item in payload["changed"]], ["Kept"])
+        removed = {item["id"]: item["reason"] for item in payload["removed"]}
+        self.assertEqual(
+            removed, {unpublished.pk: "unpublished", deleted_id: "deleted"}
+        )
+        self.assertEqual(payload["removed"][0]["audio"], "music/unpublished.mp3")
+        self.assertGreater(payload["watermark"], watermark)
+
+        payload = self.client.get(
+            "/api/songs/changes/", {"updated_since": payload["watermark"]}
+        ).json()
+        self.assertEqual(payload["changed"], [])
+        self.assertEqual(payload["removed"], [])
+
+    def test_draft_edits_leave_no_tombstone(self):
+        draft = _make_song("Draft", status=Song.STATUS_DRAFT)
+        draft = Song.objects.get(pk=draft.pk)
+        draft.style = "edited"
+        draft.save()
+        self.assertEqual(self.client.get("/api/songs/changes/").json()["removed"], [])
+
+    def test_sparse_fields_keep_the_watermark(self):
+        song = _make_song("Sparse")
+        for query in ("?fields=id,title", "?omit=updated_at"):
+            response = self.client.get("/api/songs/changes/" + query)
+            self.assertEqual(response.status_code, 200)
+            payload = response.json()
+            self.assertNotIn("updated_at", payload["changed"][0])
+            self.assertEqual(payload["changed"][0]["title"], "Sparse")
+        self.assertEqual(
+            self.client.get("/api/songs/changes/?fields=id").json()["changed"],
+            [{"id": song.pk}],
+        )
+        full = self.client.get("/api/songs/changes/").json()
+        self.assertEqual(payload["watermark"], full["watermark"])
+
+    @override_settings(PUTEKLIS_CHANGES_OVERLAP=60)
+    def test_late_commits_fall_in_the_overlap(self):
+        early = _make_song("Early")
+        watermark = self.client.get("/api/songs/changes/").json()["watermark"]
+        # Stamped before the watermark, committed after it was handed out.
+        late = _make_song("Late")
+        Song.objects.filter(pk=late.pk).update(
+            updated_at=early.updated_at - timedelta(seconds=30)
+        )
+        Song.objects.filter(pk=early.pk).update(
+            updated_at=early.updated_at - timedelta(seconds=120)
+        )
+        payload = self.client.get(
+            "/api/songs/changes/", {"updated_since": watermark}
+        ).json()
+        self.assertEqual([item["title"] for item in payload["changed"]], ["Late"])
+        self.assertEqual(payload["watermark"], watermark)
+
+    def test_invalid_watermark_is_rejected(self):
+        response = self.client.get("/api/songs/changes/?updated_since=yesterday")
+        self.assertEqual(response.status_code, 400)
+
+
+@override_settings(MEDIA_ROOT=tempfile.mkdtemp())
+class AudioStreamingTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.song = Song.objects.create(
+            title="Stream",
+            audio_file=SimpleUploadedFile("stream.mp3", bytes(range(200))),
+            cover_image=_make_image_file("stream.png"),
+            status=Song.STATUS_PUBLISHED,
+        )
+        self.url = f"/api/songs/{self.song.pk}/audio/"
+
+    def _body(self, response):
+        return b"".join(response.streaming_content)
+
+    def test_full_and_ranged_reads(self):
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response["Accept-Ranges"], "bytes")
+        self.assertEqual(self._body(response), bytes(range(200)))
+
+        response = self.client.get(self.url, HTTP_RANGE="bytes=10-19")
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(response["Content-Range"], "bytes 10-19/200")
+        self.assertEqual(self._body(response), bytes(range(10, 20)))
+
+        response = self.client.get(self.url, HTTP_RANGE="bytes=-5")
+        self.assertEqual(self._body(response), bytes(range(195, 200)))
+
+        response = self.client.get(self.url, HTTP_RANGE="bytes=500-")
+        self.assertEqual(response.status_code, 416)
+        self.assertEqual(response["Content-Range"], "bytes */200")
+
+    def test_if_range_and_etag(self):
+        etag = self.client.get(self.url)["ETag"]
+        response = self.client.get(self.url, HTTP_RANGE="bytes=0-9", HTTP_IF_RANGE=etag)
+        self.assertEqual(response.status_code, 206)
+        response = self.client.get(
+            self.url, HTTP_RANGE="bytes=0-9", HTTP_IF_RANGE='"stale"'
+        )
+        self.assertEqual(response.status_code, 200)
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+
+    def test_drafts_are_not_streamed(self):
+        self.song.status = Song.STATUS_DRAFT
+        self.song.save()
+        self.assertEqual(self.client.get(self.url).status_code, 404)
+
+    def test_file_removed_after_the_stat_is_not_found(self):
+        storage = self.song.audio_file.storage
+        with mock.patch.object(storage, "open", side_effect=FileNotFoundError):
+            self.assertEqual(self.client.get(self.url).status_code, 404)
+            self.assertEqual(self.client.head(self.url).status_code, 200)
+
+    @override_settings(PUTEKLIS_AUDIO_SENDFILE="x-accel-redirect")
+    def test_accel_redirect_handoff(self):
+        response = self.client.get(self.url, HTTP_RANGE="bytes=0-9")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            response["X-Accel-Redirect"], "/protected-media/music/stream.mp3"
+        )
+        self.assertEqual(response.content, b"")
+
+
+@override_settings(MEDIA_ROOT=tempfile.mkdtemp())
+class CoverRenditionTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+
+    def _create(self, title="Cover"):
+        return Song.objects.create(
+            title=title,
+            audio_file=SimpleUploadedFile(f"{title}.mp3", b"audio"),
+            cover_image=_make_image_file(f"{title}.png"),
+            status=Song.STATUS_PUBLISHED,
+        )
+
+    def test_renditions_are_generated_on_save(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            song = self._create()
+        song.refresh_from_db()
+        self.assertEqual(len(song.cover_hash), 64)
+        self.assertEqual(set(song.cover_renditions), {"thumb", "medium"})
+        storage = song.cover_image.storage
+        for formats in song.cover_renditions.values():
+            self.assertIn("jpeg", formats)
+            for name in formats.values():
+                self.assertTrue(storage.exists(name))
+                self.assertIn(song.cover_hash, name)
+
+        item = self.client.get(f"/api/songs/{song.pk}/").json()
+        url = item["cover_renditions"]["thumb"]["jpeg"]
+        self.assertTrue(url.startswith("http://testserver/media/renditions/"))
+        with Image.open(storage.path(song.cover_renditions["thumb"]["jpeg"])) as img:
+            self.assertEqual(img.size, (160, 160))
+
+        # Edits that keep the cover render nothing; a new upload does.
+        song = Song.objects.get(pk=song.pk)
+        with mock.patch("music.signals.generate_for_song") as generate:
+            song.title = "Cover (edit)"
+            with self.captureOnCommitCallbacks(execute=True):
+                song.save()
+            generate.assert_not_called()
+            song.cover_image = _make_image_file("Cover.png")
+            with self.captureOnCommitCallbacks(execute=True):
+                song.save()
+            generate.assert_called_once_with(song.pk)
+
+    def test_command_backfills_missing_renditions(self):
+        song = self._create()
+        self.assertEqual(song.cover_renditions, {})
+        out = io.StringIO()
+        call_command("generate_renditions", "--workers", "1", stdout=out)
+        self.assertIn("Generated 1", out.getvalue())
+        song.refresh_from_db()
+        self.assertTrue(song.cover_renditions)
+
+        out = io.StringIO()
+        call_command("generate_renditions", "--workers", "1", stdout=out)
+        self.assertIn("Generated 0", out.getvalue())
+
+
+def _exit_worker(code):
+    os._exit(code)
+
+
+class ProcessPoolTests(TestCase):
+    def test_spawned_workers_set_up_django(self):
+        # Spawn is the default start method on Windows and macOS.
+        directory = Path(tempfile.mkdtemp())
+        cover = directory / "cover.png"
+        Image.new("RGB", (4, 4)).save(cover)
+        jobs = [
+            (size, (cover, directory, {"thumb": size}, ["jpeg"])) for size in (2, 3)
+        ]
+        results = run_jobs(
+            render_cover, jobs, 2, mp_context=multiprocessing.get_context("spawn")
+        )
+        for _, result, error in results:
+            self.assertIsNone(error)
+            self.assertTrue((directory / result[1]["thumb"]["jpeg"]).exists())
+
+    def test_broken_pool_is_reported_per_job(self):
+        results = list(run_jobs(_exit_worker, [("a", (1,)), ("b", (1,))], 2))
+        self.assertEqual({key for key, _, _ in results}, {"a", "b"})
+        for _, result, error in results:
+            self.assertIsNone(result)
+            self.assertIsInstance(error, BrokenProcessPool)
+
+
+@override_settings(MEDIA_ROOT=tempfile.mkdtemp())
+class StaticSiteSyncTests(TestCase):
+    def setUp(self):
+        self.web_root = Path(tempfile.mkdtemp()) / "site"
+        self.web_root.mkdir()
+        override = override_settings(
+            PUTEKLIS_WEB_PATH=self.web_root,
+            PUTEKLIS_SYNC_MANIFEST=self.web_root.parent / "manifest.json",
+            PUTEKLIS_PUBLISH_PREVIOUS_DIR=self.web_root.parent / "previous",
+            PUTEKLIS_SYNC_LOG=self.web_root.parent / "sync.jsonl",
+            BASE_DIR=Path(tempfile.mkdtemp()),
+        )
+        override.enable()
+        self.addCleanup(override.disable)
+
+    def _song(self, title, status=Song.STATUS_PUBLISHED, **extra):
+        return Song.objects.create(
+            title=title,
+            audio_file=SimpleUploadedFile(f"{title}.mp3", b"audio"),
+            status=status,
+            **extra,
+        )
+
+    def _written(self):
+        return json.loads((self.web_root / "songs.json").read_text(encoding="utf-8"))
+
+    def test_keyed_merge_keeps_order_and_counts(self):
+        (self.web_root / "songs.json").write_text(
+            json.dumps(
+                [
+                    {"title": "Manual", "audio": "music/manual.mp3"},
+                    {"title": "A", "audio": "music/A.mp3", "style": "old"},
+                    {"title": "B", "audio": "music/B.mp3"},
+                    {"title": "B", "audio": "music/B.mp3"},
+                ]
+            ),
+            encoding="utf-8",
+        )
+        songs = [
+            self._song("A", style="rock"),
+            self._song("B", status=Song.STATUS_DRAFT),
+            self._song("C"),
+        ]
+
+        result = sync_songs(songs)
+
+        self.assertEqual((result.added, result.updated, result.removed), (1, 1, 2))
+        data = self._written()
+        self.assertEqual([item["title"] for item in data], ["Manual", "A", "C"])
+        self.assertEqual(data[1]["style"], "rock")
+        self.assertTrue((self.web_root / "music" / "C.mp3").exists())
+        self.assertIn(
+            "const songs = ",
+            (self.web_root / "songs_data.js").read_text(encoding="utf-8"),
+        )
+
+        result = sync_songs(songs)
+        self.assertEqual((result.added, result.updated, result.removed), (0, 0, 0))
+        self.assertEqual((result.bytes_copied, result.bytes_skipped), (0, 10))
+
+    @override_settings(PUTEKLIS_SYNC_WORKER=True)
+    def test_admin_full_sync_rebuilds_catalogue(self):
+        (self.web_root / "songs.json").write_text(
+            json.dumps([{"title": "Stale", "audio": "music/stale.mp3"}]),
+            encoding="utf-8",
+        )
+        self._song("Fresh")
+        self._song("Hidden", status=Song.STATUS_DRAFT)
+        User = get_user_model()
+        admin = User.objects.create_superuser("root", "root@example.com", "pass")
+        self.client.force_login(admin)
+
+        response = self.client.post("/admin/music/song/sync/")
+        job = SyncJob.objects.get()
+        self.assertRedirects(response, f"/admin/music/song/sync/{job.pk}/")
+        # A second request while the job waits joins it.
+        self.client.post("/admin/music/song/sync/")
+        self.assertEqual(SyncJob.objects.get().requests, 2)
+        status_url = f"/admin/music/song/sync/{job.pk}/status/"
+        self.assertEqual(self.client.get(status_url).json()["status"], "queued")
+        self.assertEqual([item["title"] for item in self._written()], ["Stale"])
+
+        call_command("run_sync_worker", "--once", stdout=io.StringIO())
+
+        self.assertEqual([item["title"] for item in self._written()], ["Fresh"])
+        state = self.client.get(status_url).json()
+        self.assertTrue(state["finished"])
+        self.assertEqual((state["done"], state["total"]), (1, 1))
+        self.assertIn("Pievienoti: 1", state["message"])
+        page = self.client.get(f"/admin/music/song/sync/{job.pk}/")
+        self.assertContains(page, "Sinhronizācija pabeigta.")
+
+        # The next request starts a new job.
+        self.client.post("/admin/music/song/sync/")
+        self.assertEqual(SyncJob.objects.filter(status="queued").count(), 1)
+        self.assertEqual(SyncJob.objects.count(), 2)
+
+    def test_hashed_precompressed_artifacts(self):
+        song = self._song("First")
+        sync_songs([song])
+        manifest = json.loads(
+            (self.web_root / "catalogue-manifest.json").read_text(encoding="utf-8")
+        )
+        first = manifest["songs.json"]
+        self.assertRegex(first, r"^songs\.[0-9a-f]{12}\.json$")
+        self.assertEqual(
+            json.loads((self.web_root / first).read_bytes()), self._written()
+        )
+        self.assertEqual(
+            gzip.decompress((self.web_root / f"{first}.gz").read_bytes()),
+            (self.web_root / first).read_bytes(),
+        )
+        self.assertEqual(
+            gzip.decompress((self.web_root / "songs.json.gz").read_bytes()),
+            (self.web_root / "songs.json").read_bytes(),
+        )
+
+        sync_songs([self._song("Second")])
+        second = json.loads(
+            (self.web_root / "catalogue-manifest.json").read_text(encoding="utf-8")
+        )["songs.json"]
+        self.assertNotEqual(second, first)
+        # The previous generation stays for cached pages; older ones go.
+        self.assertTrue((self.web_root / first).exists())
+        sync_songs([self._song("Third")])
+        self.assertFalse((self.web_root / first).exists())
+        self.assertFalse((self.web_root / f"{first}.gz").exists())
+        self.assertTrue((self.web_root / second).exists())
+
+    def test_remove_song(self):
+        song = self._song("Gone")
+        sync_songs([song])
+        self.assertTrue(remove_song(song))
+        self.assertEqual(self._written(), [])
+        self.assertFalse(remove_song(song))
+
+
+class CopyPlannerTests(TestCase):
+    def setUp(self):
+        self.root = Path(tempfile.mkdtemp())
+        self.source = self.root / "src" / "song.mp3"
+        self.source.parent.mkdir()
+        self.source.write_bytes(b"a" * 100)
+        self.destination = self.root / "web" / "music" / "song.mp3"
+        self.manifest = self.root / "manifest.json"
+
+    def _copy(self):
+        planner = CopyPlanner(self.manifest)
+        missing = []
+        planner.copy(self.source, self.destination, missing)
+        planner.save()
+        return planner, missing
+
+    def test_copies_only_changed_files(self):
+        planner, missing = self._copy()
+        self.assertEqual((planner.files_copied, planner.bytes_copied), (1, 100))
+        self.assertEqual(missing, [])
+
+        planner, _ = self._copy()
+        self.assertEqual((planner.files_skipped, planner.bytes_skipped), (1, 100))
+
+        # Touched but identical: hashed once, then skipped.
+        os.utime(self.source, (1_000_000, 1_000_000))
+        planner, _ = self._copy()
+        self.assertEqual(planner.files_skipped, 1)
+        self.assertIn(str(self.source), json.loads(self.manifest.read_text()))
+        self.assertEqual(
+            self.destination.stat().st_mtime_ns, self.source.stat().st_mtime_ns
+        )
+
+        # Same size, new content.
+        self.source.write_bytes(b"b" * 100)
+        os.utime(self.source, (2_000_000, 2_000_000))
+        planner, _ = self._copy()
+        self.assertEqual(planner.files_copied, 1)
+        self.assertEqual(self.destination.read_bytes(), b"b" * 100)
+
+    def test_missing_source_is_reported(self):
+        self.source.unlink()
+        planner, missing = self._copy()
+        self.assertEqual(missing, [str(self.destination)])
+        self.assertEqual(planner.files_copied, 0)
+
+
+class TransferStageTests(TestCase):
+    def test_runs_each_key_once_and_collects_errors(self):
+        calls = []
+        progress = []
+
+        def fail():
+            raise FileNotFoundError(2, "No such file")
+
+        stage = TransferStage(workers=3, progress=lambda *args: progress.append(args))
+        for idx in range(5):
+            stage.add(f"file-{idx}", calls.append, idx)
+        stage.add("file-0", calls.append, "duplicate")
+        stage.add("broken", fail)
+
+        errors = stage.run()
+
+        self.assertEqual(sorted(calls), [0, 1, 2, 3, 4])
+        self.assertEqual(list(errors), ["broken"])
+        self.assertEqual(progress[-1], (6, 6))
+
+
+@override_settings(MEDIA_ROOT=tempfile.mkdtemp())
+class ImportSongsTests(TestCase):
+    def test_parallel_import_shares_files_and_reports_missing(self):
+        root = Path(tempfile.mkdtemp())
+        for rel, content in (
+            ("music/one.mp3", b"one"),
+            ("music/two.mp3", b"two"),
+            ("cover/shared.png", b"png"),
+        ):
+            (root / rel).parent.mkdir(parents=True, exist_ok=True)
+            (root / rel).write_bytes(content)
+        entries = [
+            {"title": "One", "audio": "music/one.mp3", "image": "cover/shared.png"},
+            {"title": "Two", "audio": "music/two.mp3", "image": "cover/shared.png"},
+            {"title": "Two", "audio": "music/two.mp3"},
+            {"title": "Lost", "audio": "music/lost.mp3"},
+        ]
+        (root / "songs.json").write_text(json.dumps(entries), encoding="utf-8")
+        out = io.StringIO()
+
+        call_command(
+            "import_songs",
+            "--path",
+            str(root / "songs.json"),
+            "--source-root",
+            str(root),
+            "--workers",
+            "4",
+            stdout=out,
+        )
+
+        self.assertIn("Created: 3, Skipped: 1", out.getvalue())
+        self.assertIn(f"Missing file: {root / 'music/lost.mp3'}", out.getvalue())
+        one = Song.objects.get(title="One")
+        two = Song.objects.get(title="Two")
+        self.assertTrue(one.cover_image.storage.exists(one.cover_image.name))
+        self.assertEqual(two.cover_image.name, one.cover_image.name)
+        self.assertEqual(two.audio_file.read(), b"two")
+
+    def _write_catalogue(self, entries):
+        root = Path(tempfile.mkdtemp())
+        for entry in entries:
+            if entry.get("audio"):
+                path = root / entry["audio"]
+                path.parent.mkdir(parents=True, exist_ok=True)
+                path.write_bytes(entry["title"].encode("utf-8"))
+        (root / "songs.json").write_text(json.dumps(entries), encoding="utf-8")
+        return root
+
+    def _import(self, root, *args):
+        out = io.StringIO()
+        call_command(
+            "import_songs",
+            "--path",
+            str(root / "songs.json"),
+            "--source-root",
+            str(root),
+            "--workers",
+            "1",
+            *args,
+            stdout=out,
+        )
+        return out.getvalue()
+
+    def test_bulk_import_skips_existing_without_per_entry_queries(self):
+        _make_song("Song 0", Song.STATUS_PUBLISHED)
+        Song.objects.filter(title="Song 0").update(audio_file="music/song_0.mp3")
+        entries = [
+            {"title": f"Song {idx}", "audio": f"music/song_{idx}.mp3"}
+            for idx in range(30)
+        ]
+        entries += [{"title": "", "audio": "music/x.mp3"}, {"title": "x" * 201}]
+        root = self._write_catalogue(entries)
+
+        with CaptureQueriesContext(connection) as queries:
+            output = self._import(root, "--batch-size", "10")
+
+        self.assertIn("Created: 29, Skipped: 3", output)
+        self.assertEqual(Song.objects.count(), 30)
+        inserts = [q for q in queries if q["sql"].startswith("INSERT")]
+        self.assertLessEqual(len(inserts), 3 + 2)  # batches + catalogue version
+        imported = Song.objects.get(title="Song 7")
+        self.assertEqual(imported.audio_file.read(), b"Song 7")
+        self.assertIsNotNone(imported.updated_at)
+
+    def test_dry_run_reports_without_writing(self):
+        root = self._write_catalogue(
+            [
+                {"title": "One", "audio": "music/one.mp3"},
+                {"title": "Lost", "audio": "music/lost.mp3", "image": "cover/x.png"},
+            ]
+        )
+        (root / "music/lost.mp3").unlink()
+
+        output = self._import(root, "--dry-run")
+
+        self.assertIn("Dry run. Would create: 2, Skipped: 0, Files to copy: 1", output)
+        self.assertIn("Missing file:", output)
+        self.assertFalse(Song.objects.exists())
+
+
+@override_settings(MEDIA_ROOT=tempfile.mkdtemp(), PUTEKLIS_SYNC_WORKER=True)
+class ReconcileCommandTests(TestCase):
+    def setUp(self):
+        self.root = Path(tempfile.mkdtemp())
+        self.songs = [_make_song(f"Song {idx}") for idx in range(12)]
+        entries = []
+        for idx, song in enumerate(self.songs):
+            audio = f"music/renamed_{idx}.mp3"
+            (self.root / audio).parent.mkdir(parents=True, exist_ok=True)
+            (self.root / audio).write_bytes(b"audio")
+            os.utime(self.root / audio, (1_600_000_000 + idx,) * 2)
+            entries.append({"title": song.title, "audio": audio})
+        (self.root / "songs.json").write_text(json.dumps(entries), encoding="utf-8")
+
+    def _call(self, name, *args):
+        out = io.StringIO()
+        call_command(
+            name,
+            "--json-path",
+            str(self.root / "songs.json"),
+            "--source-root",
+            str(self.root),
+            "--batch-size",
+            "5",
+            *args,
+            stdout=out,
+        )
+        return out.getvalue()
+
+    def test_fix_media_names_plans_then_bulk_updates(self):
+        output = self._call("fix_media_names", "--dry-run")
+        self.assertIn(
+            "Song 3: audio_file music/song_3.mp3 -> music/renamed_3.mp3", output
+        )
+        self.assertIn("Dry run. Would update: 12, Copy: 12, Skipped: 0", output)
+        self.assertEqual(
+            Song.objects.get(pk=self.songs[3].pk).audio_file.name, "music/song_3.mp3"
+        )
+
+        with CaptureQueriesContext(connection) as queries:
+            output = self._call("fix_media_names")
+
+        self.assertIn("Done. Updated: 12, Copied: 12, Skipped: 0", output)
+        updates = [q for q in queries if q["sql"].startswith('UPDATE "music_song"')]
+        # Three batches, then one statement queueing the renamed audio.
+        self.assertEqual(len(updates), 4)
+        song = Song.objects.get(pk=self.songs[3].pk)
+        self.assertEqual(song.audio_file.name, "music/renamed_3.mp3")
+        self.assertTrue(song.audio_pending)
+        # Copied into the blob store: every copy here shares one blob.
+        storage = song.audio_file.storage
+        renamed = os.stat(storage.path("music/renamed_3.mp3"))
+        blob = os.stat(
+            storage.path(storage.blob_name(hashlib.sha256(b"audio").hexdigest()))
+        )
+        self.assertEqual(renamed.st_ino, blob.st_ino)
+        self.assertTrue(song.audio_file.storage.exists("music/renamed_3.mp3"))
+        self.assertIn("Updated: 0", self._call("fix_media_names"))
+
+    def test_fix_media_names_reads_audio_lyrics_and_image_keys(self):
+        # Older versions looked the audio and cover up under "music" and
+        # "cover", which songs.json does not have, and renamed only lyrics.
+        for rel in ("music/a.mp3", "lyrics/a.txt", "cover/a.png"):
+            (self.root / rel).parent.mkdir(parents=True, exist_ok=True)
+            (self.root / rel).write_bytes(b"x")
+        entry = {
+            "title": "Song 0",
+            "audio": "music/a.mp3",
+            "lyrics": "lyrics/a.txt",
+            "image": "cover/a.png",
+        }
+        (self.root / "songs.json").write_text(json.dumps([entry]), encoding="utf-8")
+
+        output = self._call("fix_media_names", "--dry-run")
+        self.assertIn("Song 0: audio_file music/song_0.mp3 -> music/a.mp3", output)
+        self.assertIn("Song 0: lyrics_file - -> lyrics/a.txt", output)
+        self.assertIn("Song 0: cover_image cover/song_0.png -> cover/a.png", output)
+
+        self._call("fix_media_names")
+        song = Song.objects.get(pk=self.songs[0].pk)
+        self.assertEqual(
+            (song.audio_file.name, song.lyrics_file.name, song.cover_image.name),
+            ("music/a.mp3", "lyrics/a.txt", "cover/a.png"),
+        )
+
+    def test_sync_created_at_uses_file_mtimes(self):
+        output = self._call("sync_created_at", "--dry-run")
+        self.assertIn("Dry run. Would update: 12, Skipped: 0", output)
+        self.assertIsNone(Song.objects.get(pk=self.songs[0].pk).created_at)
+
+        with CaptureQueriesContext(connection) as queries:
+            output = self._call("sync_created_at", "--workers", "4")
+
+        self.assertIn("Song 2: created_at - -> ", output)
+        self.assertIn("Sync complete. Updated: 12, Skipped: 0", output)
+        updates = [q for q in queries if q["sql"].startswith('UPDATE "music_song"')]
+        self.assertEqual(len(updates), 3)
+        song = Song.objects.get(pk=self.songs[2].pk)
+        self.assertEqual(song.created_at.timestamp(), 1_600_000_002)
+        self.assertIn("Updated: 0, Skipped: 12", self._call("sync_created_at"))
+
+
+class ContentAddressedStorageTests(TestCase):
+    def setUp(self):
+        self.root = Path(tempfile.mkdtemp())
+        self.storage = ContentAddressedStorage(location=self.root)
+
+    def _blobs(self):
+        return sorted(p.name for p in (self.root / "blobs").rglob("*") if p.is_file())
+
+    def test_identical_content_is_stored_once(self):
+        self.storage.save("music/a.mp3", io.BytesIO(b"same"))
+        self.storage.save("music/b.mp3", io.BytesIO(b"same"))
+
+        digest = hashlib.sha256(b"same").hexdigest()
+        self.assertEqual(self._blobs(), [digest])
+        a = (self.root / "music/a.mp3").stat()
+        self.assertEqual(a.st_ino, (self.root / "music/b.mp3").stat().st_ino)
+        self.assertEqual(a.st_nlink, 3)
+        self.assertEqual(
+            self.storage.blob_url(digest),
+            f"/media/blobs/{digest[:2]}/{digest[2:4]}/{digest}",
+        )
+
+    def test_overwrite_and_delete_release_unused_blobs(self):
+        self.storage.save("music/a.mp3", io.BytesIO(b"old"))
+        self.storage.save("music/a.mp3", io.BytesIO(b"new"))
+        self.assertEqual(self._blobs(), [hashlib.sha256(b"new").hexdigest()])
+        self.assertEqual(self.storage.open("music/a.mp3").read(), b"new")
+        self.storage.save("music/a.mp3", io.BytesIO(b"new"))
+        self.assertEqual(os.listdir(self.root / "music"), ["a.mp3"])
+
+        self.storage.save("music/b.mp3", io.BytesIO(b"new"))
+        self.storage.delete("music/a.mp3")
+        self.assertEqual(len(self._blobs()), 1)
+        self.storage.delete("music/b.mp3")
+        self.assertEqual(self._blobs(), [])
+
+    def test_dedupe_media_adopts_existing_files(self):
+        with override_settings(MEDIA_ROOT=self.root):
+            for name in ("one", "two"):
+                (self.root / "music").mkdir(exist_ok=True)
+                (self.root / f"music/{name}.mp3").write_bytes(b"audio")
+                Song.objects.create(title=name, audio_file=f"music/{name}.mp3")
+            orphan = self.root / "blobs/00/00/orphan"
+            orphan.parent.mkdir(parents=True)
+            orphan.write_bytes(b"x")
+            out = io.StringIO()
+
+            call_command("dedupe_media", stdout=out)
+
+        self.assertIn("Linked 2 of 2 files. Removed 1 unused blobs.", out.getvalue())
+        self.assertEqual(self._blobs(), [hashlib.sha256(b"audio").hexdigest()])
+        self.assertEqual((self.root / "music/one.mp3").stat().st_nlink, 3)
+
+
+@override_settings(MEDIA_ROOT=tempfile.mkdtemp(), PUTEKLIS_UPLOAD_CHUNK_SIZE=16)
+class ChunkedUploadTests(TestCase):
+    DATA = bytes(range(40))
+
+    def setUp(self):
+        self.client = APIClient()
+        staff = get_user_model().objects.create_user(
+            username="uploader", password="pass12345", is_staff=True
+        )
+        self.client.force_authenticate(staff)
+        self.song = _make_song("Master")
+
+    def _start(self, **extra):
+        response = self.client.post(
+            "/api/uploads/",
+            {"filename": "master.mp3", "size": len(self.DATA), **extra},
+            format="json",
+        )
+        self.assertEqual(response.status_code, 201, response.data)
+        self.assertEqual(response.data["chunk_size"], 16)
+        return f"/api/uploads/{response.data['id']}/"
+
+    def _send(self, url, offset, chunk, checksum=None):
+        headers = {"HTTP_UPLOAD_OFFSET": str(offset)}
+        if checksum is not None:
+            headers["HTTP_UPLOAD_CHECKSUM"] = f"sha256 {checksum}"
+        return self.client.generic(
+            "PATCH",
+            url,
+            chunk,
+            content_type="application/offset+octet-stream",
+            **headers,
+        )
+
+    def test_resumable_upload_attaches_audio(self):
+        url = self._start(sha256=hashlib.sha256(self.DATA).hexdigest())
+        first = self.DATA[:16]
+        response = self._send(url, 0, first, hashlib.sha256(first).hexdigest())
+        self.assertEqual(response["Upload-Offset"], "16")
+
+        # A corrupted chunk is rejected and leaves the offset where it was.
+        response = self._send(url, 16, self.DATA[16:32], "0" * 64)
+        self.assertEqual(response.status_code, 400)
+        # So is a chunk sent from a stale offset; the client learns where to resume.
+        response = self._send(url, 0, first)
+        self.assertEqual((response.status_code, response.data["offset"]), (409, 16))
+        self.assertEqual(self.client.get(url).data["offset"], 16)
+
+        self._send(url, 16, self.DATA[16:32])
+        response = self.client.post(f"{url}finalize/", {"song": self.song.pk})
+        self.assertEqual(response.status_code, 400)
+        self._send(url, 32, self.DATA[32:])
+        response = self.client.post(f"{url}finalize/", {"song": self.song.pk})
+
+        self.assertEqual(response.status_code, 200, response.data)
+        self.assertEqual(response.data["song"], self.song.pk)
+        self.song.refresh_from_db()
+        self.assertEqual(self.song.audio_file.name, "music/master.mp3")
+        self.assertEqual(self.song.audio_file.read(), self.DATA)
+        self.assertFalse(any((Path(settings.MEDIA_ROOT) / "uploads").iterdir()))
+
+    def test_limits_and_permissions(self):
+        url = self._start()
+        self.assertEqual(self._send(url, 0, bytes(17)).status_code, 413)
+        self.assertEqual(self._send(url, 32, bytes(16)).status_code, 409)
+        response = self.client.post(
+            "/api/uploads/", {"filename": "../x.mp3", "size": 1}, format="json"
+        )
+        self.assertEqual(response.status_code, 400)
+
+        self.assertEqual(self.client.delete(url).status_code, 204)
+        self.assertEqual(self.client.get(url).status_code, 404)
+        self.client.force_authenticate(None)
+        self.assertEqual(self._send(url, 0, bytes(16)).status_code, 403)
+
+
+def _wav_bytes(seconds, rate=8000):
+    buffer = io.BytesIO()
+    with wave.open(buffer, "wb") as handle:
+        handle.setnchannels(1)
+        handle.setsampwidth(2)
+        handle.setframerate(rate)
+        handle.writeframes(bytes(2 * rate * seconds))
+    return buffer.getvalue()
+
+
+@override_settings(MEDIA_ROOT=tempfile.mkdtemp(), PUTEKLIS_SYNC_WORKER=True)
+class AudioMetadataTests(TestCase):
+    # MPEG-1 Layer III, 128 kbit/s, 44.1 kHz, stereo: 417-byte frames.
+    MP3_FRAME = bytes([0xFF, 0xFB, 0x90, 0x00]) + bytes(413)
+
+    def _probe(self, data):
+        return probe(io.BytesIO(data), len(data))
+
+    def test_probe_formats(self):
+        self.assertEqual(self._probe(_wav_bytes(3)), (3.0, 128.0))
+
+        id3 = b"ID3\x03\x00\x00\x00\x00\x00\x0a" + bytes(10)
+        duration, bitrate = self._probe(id3 + self.MP3_FRAME * 100)
+        self.assertEqual(bitrate, 128.0)
+        self.assertAlmostEqual(duration, 100 * 417 * 8 / 128000)
+
+        xing = bytearray(self.MP3_FRAME)
+        xing[36:48] = b"Xing" + struct.pack(">II", 1, 200)
+        duration, _ = self._probe(bytes(xing) + self.MP3_FRAME * 199)
+        self.assertAlmostEqual(duration, 200 * 1152 / 44100)
+
+        def page(granule, payload):
+            header = struct.pack("<4sBBqIII", b"OggS", 0, 0, granule, 7, 0, 0)
+            return header + bytes([1, len(payload)]) + payload
+
+        vorbis = b"\x01vorbis" + struct.pack("<IBIiii", 0, 2, 44100, 0, 0, 0)
+        data = page(0, vorbis) + bytes(1000) + page(44100 * 5, b"end")
+        self.assertEqual(self._probe(data)[0], 5.0)
+        self.assertEqual(self._probe(b"not audio" * 20), (None, None))
+
+    def test_damaged_files_are_unknown(self):
+        self.assertEqual(self._probe(b"OggS" + bytes(20)), (None, None))
+        self.assertEqual(self._probe(b"OggS" + bytes(22) + b"\xff"), (None, None))
+        self.assertEqual(self._probe(b"RIFF\0\0\0\0WAVEfmt "), (None, None))
+
+    def test_worker_skips_a_song_that_fails(self):
+        songs = [
+            Song.objects.create(
+                title=f"Take {idx}",
+                audio_file=SimpleUploadedFile(f"take{idx}.ogg", b"OggS" + bytes(20)),
+            )
+            for idx in range(2)
+        ]
+        with (
+            mock.patch(
+                "music.jobs.read_audio_metadata", side_effect=[RuntimeError, OSError]
+            ),
+            self.assertLogs("music.jobs", "WARNING"),
+        ):
+            self.assertEqual(process_pending_audio(), 2)
+        self.assertFalse(Song.objects.filter(audio_pending=True).exists())
+        self.assertIsNone(Song.objects.get(pk=songs[0].pk).audio_duration)
+
+        # A truncated Ogg file is stored with its size and hash, no duration.
+        Song.objects.filter(pk=songs[0].pk).update(audio_pending=True)
+        process_pending_audio()
+        song = Song.objects.get(pk=songs[0].pk)
+        self.assertEqual((song.audio_duration, song.audio_size), (None, 24))
+
+    def test_new_audio_is_read_by_the_worker_and_synced(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            song = Song.objects.create(
+                title="Wave",
+                audio_file=SimpleUploadedFile("wave.wav", _wav_bytes(2)),
+                cover_image=_make_image_file("wave.png"),
+                status=Song.STATUS_PUBLISHED,
+            )
+        song.refresh_from_db()
+        # Nothing was read in the request; the worker picks it up.
+        self.assertTrue(song.audio_pending)
+        self.assertIsNone(song.audio_duration)
+
+        self.assertEqual(process_pending_audio(), 1)
+        song.refresh_from_db()
+        self.assertFalse(song.audio_pending)
+        self.assertEqual((song.audio_duration, song.audio_bitrate), (2.0, 128))
+        self.assertEqual(song.audio_size, len(_wav_bytes(2)))
+        self.assertEqual(song.audio_hash, hashlib.sha256(_wav_bytes(2)).hexdigest())
+
+        data = SongSerializer(song).data
+        self.assertEqual(data["audio_duration"], 2.0)
+        entry = song_entry(song)
+        self.assertEqual((entry["duration"], entry["size"]), (2.0, song.audio_size))
+
+        # Edits that keep the audio do not queue it again.
+        song.title = "Wave (edit)"
+        song.save()
+        self.assertFalse(Song.objects.get(pk=song.pk).audio_pending)
+        self.assertEqual(process_pending_audio(), 0)
+
+        # A new upload does, even under the same name.
+        song.audio_file = SimpleUploadedFile("wave.wav", _wav_bytes(3))
+        song.save()
+        self.assertEqual(song.audio_file.name, "music/wave.wav")
+        self.assertTrue(Song.objects.get(pk=song.pk).audio_pending)
+        process_pending_audio()
+        self.assertEqual(Song.objects.get(pk=song.pk).audio_duration, 3.0)
+
+    def test_backfill_reads_only_missing_metadata(self):
+        songs = [
+            Song.objects.create(
+                title=f"Take {idx}",
+                audio_file=SimpleUploadedFile(f"take{idx}.wav", _wav_bytes(idx + 1)),
+            )
+            for idx in range(3)
+        ]
+        out = io.StringIO()
+        call_command("extract_audio_metadata", "--workers", "2", stdout=out)
+        self.assertIn("Read 3, updated 3, failed 0.", out.getvalue())
+        durations = Song.objects.order_by("title").values_list(
+            "audio_duration", flat=True
+        )
+        self.assertEqual(list(durations), [1.0, 2.0, 3.0])
+
+        Song.objects.filter(pk=songs[0].pk).update(audio_hash="")
+        call_command("extract_audio_metadata", "--workers", "1", stdout=out)
+        self.assertIn("Read 1, updated 1, failed 0.", out.getvalue())
+
+
+@override_settings(
+    MEDIA_ROOT=tempfile.mkdtemp(),
+    PUTEKLIS_WAVEFORM_PEAKS=4,
+    PUTEKLIS_FFMPEG="",
+    PUTEKLIS_SYNC_WORKER=True,
+)
+class WaveformTests(TestCase):
+    def _wav(self, samples, width=2):
+        buffer = io.BytesIO()
+        with wave.open(buffer, "wb") as handle:
+            handle.setnchannels(1)
+            handle.setsampwidth(width)
+            handle.setframerate(8000)
+            handle.writeframes(samples)
+        return buffer.getvalue()
+
+    def test_peaks_from_pcm(self):
+        samples = array("h", [0, 1000, -2000, 3000, 32767, -32768, 5, 6])
+        path = Path(tempfile.mkdtemp()) / "a.wav"
+        path.write_bytes(self._wav(samples.tobytes()))
+        pairs = compute_peaks(*decode(path, 4), 4, 16)
+        self.assertEqual(list(pairs), [0, 1000, -2000, 3000, -32768, 32767, 5, 6])
+        self.assertEqual(decode_peaks(encode(pairs, 16)), (16, list(pairs)))
+        pairs = compute_peaks(*decode(path, 2), 2, 8)
+        self.assertEqual(list(pairs), [-8, 11, -128, 127])
+
+        # 8-bit WAV is unsigned; 24-bit keeps its two high bytes.
+        path.write_bytes(self._wav(bytes([0, 128, 255, 128]), width=1))
+        self.assertEqual(list(decode(path, 4)[0]), [-32768, 0, 32512, 0])
+        path.write_bytes(self._wav(bytes([0xFF, 0x00, 0x80, 0x00, 0x00, 0x7F]), 3))
+        self.assertEqual(list(decode(path, 4)[1]), [-32768, 32512])
+        path.write_bytes(b"not audio")
+        self.assertIsNone(decode(path, 4))
+
+    def test_long_audio_is_folded_block_by_block(self):
+        samples = array("h", ((i * 7919) % 65536 - 32768 for i in range(5000)))
+        path = Path(tempfile.mkdtemp()) / "long.wav"
+        path.write_bytes(self._wav(samples.tobytes()))
+        whole = decode(path, 4)
+        # 5000 samples for 4 peaks: granules of 78, whatever the block size.
+        self.assertEqual(len(whole[0]), 65)
+        with mock.patch("music.waveform.BLOCK_FRAMES", 7):
+            self.assertEqual(decode(path, 4), whole)
+        pairs = compute_peaks(*whole, 4, 16)
+        self.assertEqual(list(pairs[:2]), [min(samples[:1248]), max(samples[:1248])])
+
+    @skipUnless(os.name == "posix", "needs an executable script as ffmpeg")
+    def test_ffmpeg_is_streamed_and_stopped_after_timeout(self):
+        directory = Path(tempfile.mkdtemp())
+        source = directory / "song.mp3"
+        source.write_bytes(b"not a wav")
+        fake = directory / "ffmpeg"
+        fake.write_text(
+            f"#!{sys.executable}\n"
+            "import sys, time\n"
+            "from array import array\n"
+            "if sys.argv[-1] == 'slow': time.sleep(30)\n"
+            "sys.stdout.buffer.write(array('h', range(-500, 500)).tobytes())\n"
+        )
+        fake.chmod(0o755)
+        lows, highs = decode(source, 2, ffmpeg=str(fake), timeout=10)
+        self.assertEqual(list(compute_peaks(lows, highs, 2, 16)), [-500, 11, 12, 499])
+
+        fake.write_text(fake.read_text().replace("sys.argv[-1]", "'slow'"))
+        started = time.monotonic()
+        self.assertIsNone(decode(source, 2, ffmpeg=str(fake), timeout=0.5))
+        self.assertLess(time.monotonic() - started, 10)
+
+    def test_drawn_by_the_worker_and_served_with_etag(self):
+        samples = array("h", range(-400, 400, 100)).tobytes()
+        with self.captureOnCommitCallbacks(execute=True):
+            song = Song.objects.create(
+                title="Peaks",
+                audio_file=SimpleUploadedFile("peaks.wav", self._wav(samples)),
+                cover_image=_make_image_file("peaks.png"),
+                status=Song.STATUS_PUBLISHED,
+            )
+        self.assertEqual(Song.objects.get(pk=song.pk).waveform, "")
+        process_pending_audio()
+        song.refresh_from_db()
+        self.assertTrue(song.waveform.endswith("_4_8.peaks"))
+        self.assertIn(song.audio_hash, song.waveform)
+
+        client = APIClient()
+        url = f"/api/songs/{song.pk}/peaks/"
+        response = client.get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            decode_peaks(response.content), (8, [-2, -2, -1, -1, 0, 0, 0, 1])
+        )
+        self.assertIn("max-age", response["Cache-Control"])
+        response = client.get(url, HTTP_IF_NONE_MATCH=response["ETag"])
+        self.assertEqual(response.status_code, 304)
+
+        Song.objects.filter(pk=song.pk).update(status=Song.STATUS_DRAFT)
+        self.assertEqual(client.get(url).status_code, 404)
+
+    def test_damaged_wav_gets_no_waveform(self):
+        path = Path(tempfile.mkdtemp()) / "a.wav"
+        path.write_bytes(self._wav(bytes(16))[:30])
+        self.assertIsNone(decode(path, 4))
+        for error in (struct.error, ValueError):
+            with mock.patch("music.waveform.wave.open", side_effect=error):
+                self.assertIsNone(decode(path, 4))
+
+        Song.objects.create(
+            title="Damaged", audio_file=SimpleUploadedFile("a.wav", path.read_bytes())
+        )
+        Song.objects.create(
+            title="Fine", audio_file=SimpleUploadedFile("b.wav", self._wav(bytes(16)))
+        )
+
+        def render(source_path, *args, **kwargs):
+            if source_path.endswith("a.wav"):
+                raise RuntimeError("decoder crashed")
+            return render_waveform(source_path, *args, **kwargs)
+
+        out, err = io.StringIO(), io.StringIO()
+        with mock.patch(
+            "music.management.commands.generate_waveforms.render_waveform", render
+        ):
+            call_command("generate_waveforms", "--workers", "1", stdout=out, stderr=err)
+        self.assertIn("failed 1.", out.getvalue())
+        self.assertIn("Damaged: decoder crashed", err.getvalue())
+        self.assertTrue(Song.objects.get(title="Fine").waveform)
+
+    def test_command_backfills_in_parallel(self):
+        for idx in range(3):
+            Song.objects.create(
+                title=f"Take {idx}",
+                audio_file=SimpleUploadedFile(
+                    f"take{idx}.wav", self._wav(bytes(range(idx, idx + 16)))
+                ),
+            )
+        Song.objects.create(
+            title="Mp3", audio_file=SimpleUploadedFile("x.mp3", b"\xff\xfb" * 8)
+        )
+        out, err = io.StringIO(), io.StringIO()
+        call_command("generate_waveforms", "--workers", "2", stdout=out, stderr=err)
+        self.assertIn(
+            "Generated 3, cleared 0, unsupported 1, failed 0.", out.getvalue()
+        )
+        self.assertIn("ffmpeg not found", err.getvalue())
+        self.assertEqual(Song.objects.exclude(waveform="").count(), 3)
+
+
+class SyncJobTests(TestCase):
+    def test_claim_runs_one_job_at_a_time(self):
+        first = SyncJob.enqueue()
+        self.assertEqual(SyncJob.enqueue().pk, first.pk)
+        self.assertEqual(SyncJob.claim_next().pk, first.pk)
+
+        second = SyncJob.enqueue()
+        self.assertNotEqual(second.pk, first.pk)
+        self.assertIsNone(SyncJob.claim_next())
+
+    def test_stale_running_jobs_fail(self):
+        job = SyncJob.enqueue()
+        SyncJob.claim_next()
+        self.assertEqual(SyncJob.fail_stale(timezone.now()), 1)
+        job.refresh_from_db()
+        self.assertEqual(job.status, SyncJob.STATUS_FAILED)
+
+    def test_autosync_debounce_coalesces_and_caps_delay(self):
+        delay, cap = timedelta(seconds=5), timedelta(seconds=8)
+        job = SyncJob.enqueue(kind=SyncJob.KIND_INCREMENTAL, delay=delay)
+        self.assertGreater(job.run_after, timezone.now())
+        self.assertIsNone(SyncJob.claim_next())
+
+        # Six seconds later, another change arrives.
+        SyncJob.objects.filter(pk=job.pk).update(
+            created_at=F("created_at") - timedelta(seconds=6),
+            run_after=F("run_after") - timedelta(seconds=6),
+        )
+        joined = SyncJob.enqueue(
+            kind=SyncJob.KIND_INCREMENTAL, delay=delay, max_delay=cap
+        )
+        self.assertEqual(joined.pk, job.pk)
+        self.assertEqual(joined.requests, 2)
+        self.assertEqual(joined.run_after, joined.created_at + cap)
+
+        # A full request takes the waiting job over and runs it right away.
+        full = SyncJob.enqueue()
+        self.assertEqual((full.pk, full.kind), (job.pk, SyncJob.KIND_FULL))
+        self.assertEqual(SyncJob.claim_next().pk, job.pk)
+
+
+@override_settings(
+    MEDIA_ROOT=tempfile.mkdtemp(),
+    PUTEKLIS_AUTOSYNC_DEBOUNCE=0,
+    PUTEKLIS_SYNC_WORKER=True,
+)
+class AutoSyncTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.web_root = Path(tempfile.mkdtemp()) / "site"
+        self.web_root.mkdir()
+        override = override_settings(
+            PUTEKLIS_WEB_PATH=self.web_root,
+            PUTEKLIS_SYNC_MANIFEST=self.web_root.parent / "manifest.json",
+            PUTEKLIS_PUBLISH_PREVIOUS_DIR=self.web_root.parent / "previous",
+            PUTEKLIS_SYNC_LOG=self.web_root.parent / "sync.jsonl",
+            BASE_DIR=Path(tempfile.mkdtemp()),
+        )
+        override.enable()
+        self.addCleanup(override.disable)
+        self.client = APIClient()
+        staff = get_user_model().objects.create_user(
+            username="editor", password="pass12345", is_staff=True
+        )
+        self.client.force_authenticate(user=staff)
+
+    def _titles(self):
+        path = self.web_root / "songs.json"
+        return [item["title"] for item in json.loads(path.read_text(encoding="utf-8"))]
+
+    def _work(self):
+        call_command("run_sync_worker", "--once", stdout=io.StringIO())
+
+    def test_changes_from_any_path_are_synced_once(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            keep = _make_song("Keep")
+            gone = _make_song("Gone")
+        job = SyncJob.objects.get()
+        self.assertEqual((job.kind, job.requests), (SyncJob.KIND_INCREMENTAL, 2))
+        self._work()
+        self.assertEqual(sorted(self._titles()), ["Gone", "Keep"])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.delete(f"/api/songs/{gone.pk}/")
+            self.assertEqual(response.status_code, 204)
+            response = self.client.patch(
+                f"/api/songs/{keep.pk}/", {"style": "folk"}, format="json"
+            )
+            self.assertEqual(response.status_code, 200)
+        self.assertEqual(SyncJob.objects.filter(status="queued").count(), 1)
+        self._work()
+
+        job = SyncJob.objects.first()
+        self.assertEqual((job.updated, job.removed), (1, 1))
+        data = json.loads((self.web_root / "songs.json").read_text(encoding="utf-8"))
+        self.assertEqual(data, [dict(data[0], title="Keep", style="folk")])
+
+    @override_settings(PUTEKLIS_CHANGES_OVERLAP=60)
+    def test_incremental_sync_catches_late_commits(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            _make_song("First")
+        self._work()
+        started = SyncJob.objects.get().started_at
+        # Stamped before the job started, committed after it read the rows.
+        late = _make_song("Late")
+        Song.objects.filter(pk=late.pk).update(
+            updated_at=started - timedelta(seconds=30)
+        )
+        request_autosync()
+        self._work()
+        self.assertEqual(sorted(self._titles()), ["First", "Late"])
+
+    @override_settings(PUTEKLIS_SYNC_WORKER=False)
+    def test_without_a_worker_syncs_run_in_the_request(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            _make_song("Keep")
+        self.assertFalse(SyncJob.objects.exists())
+
+        admin = get_user_model().objects.create_superuser(
+            username="admin", password="pass12345"
+        )
+        self.client.force_login(admin)
+        response = self.client.post(reverse("admin:music_song_sync"))
+        job = SyncJob.objects.get()
+        self.assertRedirects(
+            response, reverse("admin:music_song_sync_job", args=[job.pk])
+        )
+        self.assertEqual(job.status, SyncJob.STATUS_DONE)
+        self.assertEqual(self._titles(), ["Keep"])
+
+
+class PublisherTests(TestCase):
+    def setUp(self):
+        self.root = Path(tempfile.mkdtemp())
+        self.publisher = Publisher(self.root, previous=self.root.parent / "prev")
+        self.addCleanup(shutil.rmtree, self.publisher.previous, ignore_errors=True)
+
+    def test_publish_skips_identical_bytes_and_rolls_back(self):
+        files = {"songs.json": b"[1]", "songs_data.js": b"const songs = [1];\n"}
+        self.assertEqual(sorted(self.publisher.publish(files)), sorted(files))
+        mtime = (self.root / "songs.json").stat().st_mtime_ns
+
+        self.assertEqual(self.publisher.publish(files), [])
+        self.assertEqual((self.root / "songs.json").stat().st_mtime_ns, mtime)
+
+        changed = dict(files, **{"songs.json": b"[2]"})
+        self.assertEqual(self.publisher.publish(changed), ["songs.json"])
+        self.assertEqual((self.root / "songs.json").read_bytes(), b"[2]")
+        self.assertEqual(list(self.root.glob(".*.tmp")), [])
+
+        self.assertIn("songs.json", self.publisher.rollback())
+        self.assertEqual((self.root / "songs.json").read_bytes(), b"[1]")
+        self.assertEqual(
+            (self.root / "songs_data.js").read_bytes(), b"const songs = [1];\n"
+        )
+        # Rolling back again restores the newer generation.
+        self.publisher.rollback()
+        self.assertEqual((self.root / "songs.json").read_bytes(), b"[2]")
+
+    def test_previous_keeps_only_the_replaced_files(self):
+        self.publisher.publish({"songs.json": b"[1]", "songs.aaaa.json": b"[1]"})
+        self.publisher.publish({"songs.json": b"[2]", "songs.bbbb.json": b"[2]"})
+        self.assertEqual(
+            sorted(path.name for path in self.publisher.previous.iterdir()),
+            ["songs.json"],
+        )
+        self.publisher.publish(
+            {"songs.json": b"[2]", "songs.bbbb.json": b"[2]", "datori.html": b"<p>"}
+        )
+        # The older songs.json is not kept any more, so it is not restored.
+        self.assertEqual(list(self.publisher.previous.iterdir()), [])
+        self.assertEqual(self.publisher.rollback(), [])
+        self.assertEqual((self.root / "songs.json").read_bytes(), b"[2]")
+
+
+class DatoriTemplateTests(TestCase):
+    PAGE = (
+        "<html><body>\n"
+        '  <select class="x" id="songSelector">\n'
+        "    <option>old</option>\n  </select>\n"
+        '<select id="other"></select>\n</body></html>\n'
+    )
+
+    def test_render_escapes_and_keeps_the_page(self):
+        template = DatoriTemplate.parse(self.PAGE)
+        html = template.render(
+            [
+                {"title": "Rock & <Roll>", "audio": 'music/a"b.mp3'},
+                {"title": "No audio", "audio": ""},
+            ]
+        )
+        self.assertEqual(
+            html,
+            "<html><body>\n"
+            '  <select class="x" id="songSelector">\n'
+            '    <option value="">-- Izvēlies dziesmu --</option>\n'
+            '    <option value="music/a&quot;b.mp3">Rock &amp; &lt;Roll&gt;</option>\n'
+            "  </select>\n"
+            '<select id="other"></select>\n</body></html>\n',
+        )
+        self.assertIsNone(DatoriTemplate.parse("<select></select>"))
+
+    def test_load_reuses_template_until_file_changes(self):
+        path = Path(tempfile.mkdtemp()) / "datori.html"
+        path.write_text(self.PAGE, encoding="utf-8")
+        first = DatoriTemplate.load(path)
+        self.assertIs(DatoriTemplate.load(path), first)
+        path.write_text(self.PAGE.replace("<body>", "<body class='new'>"))
+        os.utime(path, ns=(0, path.stat().st_mtime_ns + 1))
+        self.assertIsNot(DatoriTemplate.load(path), first)
+
+
+class SyncLogTests(TestCase):
+    def setUp(self):
+        self.path = Path(tempfile.mkdtemp()) / "sync.jsonl"
+
+    def test_rotates_by_size_and_keeps_backups(self):
+        log = SyncLog(self.path, max_bytes=200, backups=2)
+        for index in range(20):
+            log.write({"action": "save", "index": index, "message": "x" * 40})
+
+        self.assertLessEqual(self.path.stat().st_size, 200)
+        self.assertTrue(self.path.with_name("sync.jsonl.2").exists())
+        self.assertFalse(self.path.with_name("sync.jsonl.3").exists())
+        lines = self.path.read_text(encoding="utf-8").splitlines()
+        self.assertEqual(json.loads(lines[-1])["index"], 19)
+
+    def test_tail_reads_newest_first(self):
+        log = SyncLog(self.path, max_bytes=10 * 1024 * 1024)
+        for index in range(500):
+            log.write({"action": "save", "index": index})
+
+        entries = log.tail(3, block_size=64)
+        self.assertEqual([entry["index"] for entry in entries], [499, 498, 497])
+        self.assertEqual(len(log.tail(1000)), 500)
+        self.assertEqual(SyncLog(self.path.with_name("none.jsonl")).tail(5), [])
+
+    def test_admin_view_shows_recent_entries(self):
+        with override_settings(PUTEKLIS_SYNC_LOG=self.path):
+            get_sync_log().write(
+                {"action": "sync_now", "message": "Ziņa & <b>", "added": 2}
+            )
+            staff = get_user_model().objects.create_superuser(
+                username="admin", password="pass12345"
+            )
+            self.client.force_login(staff)
+            response = self.client.get(reverse("admin:music_song_sync_log"))
+
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, "Ziņa &amp; &lt;b&gt;")
@@ -0,0 +1,194 @@
+import hashlib
+import json
+import os
+import shutil
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from pathlib import Path
+
+from django.conf import settings
+
+
+def file_sha256(path, chunk_size=1024 * 1024):
+    digest = hashlib.sha256()
+    with open(path, "rb") as handle:
+        for chunk in iter(lambda: handle.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class CopyPlanner:
+    """Copy files only when the destination's contents differ.
+
+    Equal size and mtime count as unchanged (``copy2`` preserves mtime). With
+    equal sizes but different mtimes the SHA-256 digests decide. Digests are
+    kept in a JSON manifest keyed by path and are reused for as long as the
+    file's size and mtime still match, so a file is hashed at most once.
+
+    Safe to share between the threads of a ``TransferStage``.
+    """
+
+    def __init__(self, manifest_path=None):
+        self.manifest_path = Path(manifest_path) if manifest_path else None
+        self._lock = threading.Lock()
+        self._digests = self._load()
+        self._dirty = False
+        self.files_copied = 0
+        self.files_skipped = 0
+        self.bytes_copied = 0
+        self.bytes_skipped = 0
+
+    def _load(self):
+        if self.manifest_path is None or not self.manifest_path.exists():
+            return {}
+        try:
+            return json.loads(self.manifest_path.read_text(encoding="utf-8"))
+        except (OSError, ValueError):
+            return {}
+
+    def digest(self, path, stat):
+        key = str(path)
+        cached = self._digests.get(key)
+        if cached and cached[:2] == [stat.st_size, stat.st_mtime_ns]:
+            return cached[2]
+        value = file_sha256(path)
+        with self._lock:
+            self._digests[key] = [stat.st_size, stat.st_mtime_ns, value]
+            self._dirty = True
+        return value
+
+    def needs_copy(self, source, source_stat, destination):
+        try:
+            destination_stat = destination.stat()
+        except FileNotFoundError:
+            return True
+        if destination_stat.st_size != source_stat.st_size:
+            return True
+        if destination_stat.st_mtime_ns == source_stat.st_mtime_ns:
+            return False
+        if self.digest(source, source_stat) != self.digest(
+            destination, destination_stat
+        ):
+            return True
+        # Same bytes: align the mtime so the next run takes the fast path.
+        os.utime(destination, ns=(source_stat.st_atime_ns, source_stat.st_mtime_ns))
+        self._forget(destination)
+        return False
+
+    def copy(self, source, destination, missing):
+        """Copy ``source`` to ``destination`` unless it is already there.
+
+        A missing source is reported by appending the destination to
+        ``missing``.
+        """
+        destination.parent.mkdir(parents=True, exist_ok=True)
+        try:
+            source_stat = source.stat()
+        except FileNotFoundError:
+            with self._lock:
+                missing.append(str(destination))
+            return
+        if not self.needs_copy(source, source_stat, destination):
+            with self._lock:
+                self.files_skipped += 1
+                self.bytes_skipped += source_stat.st_size
+            return
+        shutil.copy2(source, destination)
+        with self._lock:
+            self.files_copied += 1
+            self.bytes_copied += source_stat.st_size
+        self._forget(destination)
+
+    def _forget(self, path):
+        with self._lock:
+            if self._digests.pop(str(path), None) is not None:
+                self._dirty = True
+
+    def save(self):
+        if self.manifest_path is None or not self._dirty:
+            return
+        with self._lock:
+            payload = json.dumps(self._digests)
+            self._dirty = False
+        self.manifest_path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = self.manifest_path.with_name(f".{self.manifest_path.name}.tmp")
+        tmp_path.write_text(payload, encoding="utf-8")
+        os.replace(tmp_path, self.manifest_path)
+
+
+def transfer_workers():
+    return getattr(settings, "PUTEKLIS_TRANSFER_WORKERS", 4)
+
+
+def _stat_or_none(path):
+    try:
+        return os.stat(path)
+    except OSError:
+        return None
+
+
+def stat_files(paths, workers=None):
+    """``{path: os.stat_result or None}`` for ``paths``, stated in parallel.
+
+    On network drives each ``stat`` is a round trip, so overlapping them
+    matters more than the thread overhead.
+    """
+    paths = list(dict.fromkeys(paths))
+    workers = transfer_workers() if workers is None else workers
+    if workers <= 1 or len(paths) <= 1:
+        return {path: _stat_or_none(path) for path in paths}
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="stat") as pool:
+        return dict(zip(paths, pool.map(_stat_or_none, paths)))
+
+
+class TransferStage:
+    """Run queued file transfers on a bounded thread pool.
+
+    Copies are I/O-bound, so a few threads overlap the per-file latency of
+    slow disks or network storage. Tasks are keyed (usually by destination):
+    a key queued twice runs once. ``OSError`` from a task is collected per
+    key instead of aborting the batch. ``progress(done, total)`` is called
+    from the calling thread after each task.
+    """
+
+    def __init__(self, workers=None, progress=None):
+        self.workers = transfer_workers() if workers is None else workers
+        self.progress = progress
+        self._tasks = {}
+
+    def add(self, key, func, *args):
+        self._tasks.setdefault(key, (func, args))
+
+    def __len__(self):
+        return len(self._tasks)
+
+    def run(self):
+        """Run every queued task; return ``{key: exception}`` for failures."""
+        tasks, self._tasks = self._tasks, {}
+        errors = {}
+        total = len(tasks)
+        if self.workers <= 1 or total <= 1:
+            for done, (key, (func, args)) in enumerate(tasks.items(), start=1):
+                try:
+                    func(*args)
+                except OSError as exc:
+                    errors[key] = exc
+                self._report(done, total)
+            return errors
+        with ThreadPoolExecutor(
+            max_workers=self.workers, thread_name_prefix="transfer"
+        ) as executor:
+            futures = {
+                executor.submit(func, *args): key for key, (func, args) in tasks.items()
+            }
+            for done, future in enumerate(as_completed(futures), start=1):
+                try:
+                    future.result()
+                except OSError as exc:
+                    errors[futures[future]] = exc
+                self._report(done, total)
+        return errors
+
+    def _report(self, done, total):
+        if self.progress is not None:
+            self.progress(done, total)
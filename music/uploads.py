@@ -0,0 +1,162 @@
+import hashlib
+import os
+from datetime import timedelta
+from pathlib import Path
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from .models import Song, UploadSession
+from .transfer import file_sha256
+
+READ_SIZE = 64 * 1024
+
+
+class UploadError(Exception):
+    """A chunk or finalize request that cannot be applied to the session."""
+
+
+class OffsetMismatch(UploadError):
+    def __init__(self, offset):
+        super().__init__(f"Expected offset {offset}.")
+        self.offset = offset
+
+
+def chunk_size():
+    return getattr(settings, "PUTEKLIS_UPLOAD_CHUNK_SIZE", 8 * 1024 * 1024)
+
+
+def max_upload_size():
+    return getattr(settings, "PUTEKLIS_UPLOAD_MAX_SIZE", 2 * 1024**3)
+
+
+def session_ttl():
+    return timedelta(seconds=getattr(settings, "PUTEKLIS_UPLOAD_TTL", 24 * 3600))
+
+
+def audio_storage():
+    return Song._meta.get_field("audio_file").storage
+
+
+def part_path(session):
+    """Where the received bytes of ``session`` accumulate.
+
+    Inside the storage location, so finalizing links the file into place
+    instead of copying it.
+    """
+    upload_dir = getattr(settings, "PUTEKLIS_UPLOAD_DIR", "uploads")
+    return Path(audio_storage().path(upload_dir)) / f"{session.pk}.part"
+
+
+def write_chunk(session, offset, stream, length, checksum=""):
+    """Append ``length`` bytes from ``stream`` at ``offset``; return the new offset.
+
+    The bytes go straight to the part file as they are read. A chunk that
+    arrives short or does not match ``checksum`` (SHA-256, hex) is cut off
+    again, so the client can resend it from the same offset. Raises
+    ``OffsetMismatch`` with the offset to resume from.
+    """
+    with transaction.atomic():
+        # Serializes chunks of one session; other sessions are not blocked.
+        session = UploadSession.objects.select_for_update().get(pk=session.pk)
+        path = part_path(session)
+        stored = path.stat().st_size if path.exists() else 0
+        if stored < session.offset:
+            # Bytes acknowledged earlier are gone; resume from what is left.
+            session.offset = stored
+            session.save(update_fields=["offset", "updated_at"])
+        error = _check_chunk(session, offset, length)
+        if error is None:
+            error = _append(path, offset, stream, length, checksum)
+        if error is None:
+            session.offset = offset + length
+            session.save(update_fields=["offset", "updated_at"])
+    if error is not None:
+        raise error
+    return session.offset
+
+
+def _check_chunk(session, offset, length):
+    if session.finished_at:
+        return UploadError("The upload is already finished.")
+    if offset != session.offset:
+        return OffsetMismatch(session.offset)
+    if offset + length > session.size:
+        return UploadError("The chunk goes past the declared size.")
+    return None
+
+
+def _append(path, offset, stream, length, checksum):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    digest = hashlib.sha256()
+    received = 0
+    with open(path, "ab") as handle:
+        handle.truncate(offset)
+        while received < length:
+            block = stream.read(min(READ_SIZE, length - received))
+            if not block:
+                break
+            digest.update(block)
+            handle.write(block)
+            received += len(block)
+        if received != length:
+            handle.truncate(offset)
+            return UploadError(f"Received {received} of {length} bytes.")
+        if checksum and checksum.lower() != digest.hexdigest():
+            handle.truncate(offset)
+            return UploadError("Chunk checksum mismatch.")
+        handle.flush()
+        os.fsync(handle.fileno())
+    return None
+
+
+def finalize(session, song):
+    """Attach the completed upload to ``song`` as its audio file.
+
+    The whole file is hashed once here: to check ``sha256`` if the client
+    declared it, and to name the blob the storage links the file to.
+    """
+    with transaction.atomic():
+        session = UploadSession.objects.select_for_update().get(pk=session.pk)
+        error = None
+        if session.finished_at:
+            error = UploadError("The upload is already finished.")
+        elif not session.is_complete:
+            error = UploadError(f"Received {session.offset} of {session.size} bytes.")
+        else:
+            path = part_path(session)
+            digest = file_sha256(path)
+            if session.sha256 and session.sha256 != digest:
+                path.unlink(missing_ok=True)
+                session.offset = 0
+                session.save(update_fields=["offset", "updated_at"])
+                error = UploadError("File checksum mismatch; upload it again.")
+        if error is None:
+            field = Song._meta.get_field("audio_file")
+            name = field.generate_filename(song, session.filename)
+            song.audio_file.name = field.storage.ingest(path, name, digest=digest)
+            song.save(update_fields=["audio_file", "updated_at"])
+            session.song = song
+            session.finished_at = timezone.now()
+            session.save(update_fields=["song", "finished_at", "updated_at"])
+    if error is not None:
+        raise error
+    return session
+
+
+def abort(session):
+    part_path(session).unlink(missing_ok=True)
+    session.delete()
+
+
+def purge_expired():
+    """Drop sessions idle for longer than ``PUTEKLIS_UPLOAD_TTL``."""
+    expired = UploadSession.objects.filter(
+        updated_at__lt=timezone.now() - session_ttl()
+    )
+    count = 0
+    for session in expired:
+        abort(session)
+        count += 1
+    return count
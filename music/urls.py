@@ -1,13 +1,17 @@
 from django.urls import path
 from rest_framework.routers import DefaultRouter
 
-from .views import HealthView, MetricsView, SongViewSet
+from .streaming import song_audio, song_peaks
+from .views import HealthView, MetricsView, SongViewSet, UploadViewSet
 
 router = DefaultRouter()
 router.register("songs", SongViewSet, basename="song")
+router.register("uploads", UploadViewSet, basename="upload")
 
 urlpatterns = [
     path("health/", HealthView.as_view(), name="health"),
     path("metrics/", MetricsView.as_view(), name="metrics"),
+    path("songs/<int:pk>/audio/", song_audio, name="song-audio"),
+    path("songs/<int:pk>/peaks/", song_peaks, name="song-peaks"),
 ]
 urlpatterns += router.urls
@@ -1,9 +1,45 @@
-from rest_framework import permissions, viewsets
+from datetime import timedelta
+
+from django.conf import settings
+from django.utils import timezone
+from django.utils.crypto import constant_time_compare
+from django.utils.dateparse import parse_datetime
+from drf_spectacular.types import OpenApiTypes
+from drf_spectacular.utils import OpenApiParameter, extend_schema, extend_schema_view
+from rest_framework import mixins, permissions, viewsets
+from rest_framework.decorators import action
+from rest_framework.exceptions import APIException, ValidationError
+from rest_framework.generics import get_object_or_404
 from rest_framework.response import Response
+from rest_framework.settings import api_settings
 from rest_framework.views import APIView
 
-from .models import Song
-from .serializers import SongSerializer
+from . import uploads
+from .cache import (
+    build_response,
+    cache_response,
+    get_cached_response,
+    get_catalogue_version,
+    response_cache_key,
+)
+from .conditional import (
+    conditional_response,
+    make_etag,
+    set_validators,
+    song_version,
+)
+from .metrics import prometheus_exposition, registry, song_counts
+from .models import Song, SongTombstone, UploadSession
+from .pagination import KEYSET_FIELDS, SongCursorPagination
+from .renderers import FastJSONRenderer, PrometheusRenderer
+from .serializers import (
+    SongChangesSerializer,
+    SongRowSerializer,
+    SongSerializer,
+    UploadFinalizeSerializer,
+    UploadSessionSerializer,
+    parse_sparse_fields,
+)
 
 
 class IsAdminOrReadOnly(permissions.BasePermission):
@@ -13,10 +49,32 @@ class IsAdminOrReadOnly(permissions.BasePermission):
         return request.user and request.user.is_staff
 
 
+SPARSE_FIELD_PARAMETERS = [
+    OpenApiParameter(
+        name="fields",
+        type=str,
+        description=(
+            "Comma-separated fields to include, e.g. `id,title,audio_file`. "
+            f"Allowed: {', '.join(SongSerializer.Meta.fields)}."
+        ),
+    ),
+    OpenApiParameter(
+        name="omit",
+        type=str,
+        description="Comma-separated fields to leave out, e.g. `style`.",
+    ),
+]
+
+
+@extend_schema_view(
+    list=extend_schema(parameters=SPARSE_FIELD_PARAMETERS),
+    retrieve=extend_schema(parameters=SPARSE_FIELD_PARAMETERS),
+)
 class SongViewSet(viewsets.ModelViewSet):
     queryset = Song.objects.all()
     serializer_class = SongSerializer
     permission_classes = [IsAdminOrReadOnly]
+    pagination_class = SongCursorPagination
 
     def get_queryset(self):
         queryset = super().get_queryset()
@@ -24,6 +82,290 @@ class SongViewSet(viewsets.ModelViewSet):
             return queryset
         return queryset.filter(status=Song.STATUS_PUBLISHED)
 
+    def filter_queryset(self, queryset):
+        queryset = super().filter_queryset(queryset)
+        if self.get_sparse_fields() is not None:
+            queryset = queryset.only(*self._columns())
+        return queryset
+
+    def get_serializer(self, *args, **kwargs):
+        kwargs.setdefault("fields", self.get_sparse_fields())
+        return super().get_serializer(*args, **kwargs)
+
+    def get_sparse_fields(self):
+        """Fields requested with ``?fields=``/``?omit=`` on reads, else ``None``."""
+        if self.action not in ("list", "retrieve", "changes"):
+            return None
+        if not hasattr(self, "_sparse_fields"):
+            self._sparse_fields = parse_sparse_fields(
+                self.request.query_params, SongSerializer.Meta.fields
+            )
+        return self._sparse_fields
+
+    def _columns(self):
+        # Pagination needs the keyset columns even when they are not shown.
+        fields = self.get_sparse_fields() or SongSerializer.Meta.fields
+        return tuple(dict.fromkeys([*fields, *KEYSET_FIELDS]))
+
+    def list(self, request, *args, **kwargs):
+        version, last_modified = get_catalogue_version()
+
+        def validators():
+            return self._make_etag(request, "list", version), last_modified
+
+        handler = self._fast_list if self._use_fast_path(request) else super().list
+        return self._cached(request, version, validators, handler, **kwargs)
+
+    def retrieve(self, request, *args, **kwargs):
+        version, _ = get_catalogue_version()
+
+        def validators():
+            pk = kwargs.get(self.lookup_field)
+            last_modified = song_version(self.get_queryset(), pk)
+            if last_modified is None:
+                return None
+            return self._make_etag(request, "detail", last_modified), last_modified
+
+        handler = (
+            self._fast_retrieve if self._use_fast_path(request) else super().retrieve
+        )
+        return self._cached(request, version, validators, handler, **kwargs)
+
+    @extend_schema(
+        parameters=[
+            OpenApiParameter(
+                name="updated_since",
+                type=OpenApiTypes.DATETIME,
+                description="Watermark from the previous call; omit for a full feed.",
+            ),
+            *SPARSE_FIELD_PARAMETERS,
+        ],
+        responses=SongChangesSerializer,
+    )
+    @action(detail=False, methods=["get"])
+    def changes(self, request):
+        """Songs changed and removed since ``updated_since``.
+
+        Clients apply ``removed`` first, then upsert ``changed``, and send the
+        returned ``watermark`` as ``updated_since`` next time. Rows from the
+        last ``PUTEKLIS_CHANGES_OVERLAP`` seconds before it come again, so
+        that late commits are not missed; upserting by id absorbs them.
+        """
+        since = self._parse_updated_since(request)
+        serializer = SongRowSerializer(request, fields=self.get_sparse_fields())
+
+        songs = self.get_queryset().order_by("updated_at")
+        tombstones = SongTombstone.objects.all()
+        if self._scope(request) == "staff":
+            # Staff see drafts, so only deletions remove anything for them.
+            tombstones = tombstones.filter(reason=SongTombstone.REASON_DELETED)
+        if since is not None:
+            start = since - timedelta(
+                seconds=getattr(settings, "PUTEKLIS_CHANGES_OVERLAP", 300)
+            )
+            songs = songs.filter(updated_at__gt=start)
+            tombstones = tombstones.filter(removed_at__gt=start)
+
+        # The watermark needs updated_at even when ?fields=/?omit= leave it
+        # out; the serializer only outputs the requested fields.
+        rows = list(songs.values(*dict.fromkeys([*self._columns(), "updated_at"])))
+        removed = list(
+            tombstones.values("song_id", "title", "audio", "reason", "removed_at")
+        )
+        # Rows from the overlap may be older than ``since``: never go back.
+        stamps = [row["updated_at"] for row in rows]
+        stamps += [item["removed_at"] for item in removed]
+        stamps += [since] if since is not None else []
+        watermark = max(stamps, default=None)
+
+        for item in removed:
+            item["id"] = item.pop("song_id")
+            item["removed_at"] = serializer.format_datetime(item["removed_at"])
+        return Response(
+            {
+                "watermark": serializer.format_datetime(watermark),
+                "changed": serializer.many(rows),
+                "removed": removed,
+            }
+        )
+
+    @staticmethod
+    def _parse_updated_since(request):
+        raw = request.query_params.get("updated_since")
+        if not raw:
+            return None
+        try:
+            since = parse_datetime(raw)
+        except ValueError:
+            since = None
+        if since is None:
+            raise ValidationError({"updated_since": ["Expected an ISO 8601 datetime."]})
+        if timezone.is_naive(since):
+            since = timezone.make_aware(since)
+        return since
+
+    @staticmethod
+    def _use_fast_path(request):
+        # SongRowSerializer only reproduces plain JSON output; the browsable
+        # API and any other renderer keep using SongSerializer.
+        return isinstance(request.accepted_renderer, FastJSONRenderer)
+
+    def _fast_queryset(self):
+        return self.filter_queryset(self.get_queryset()).values(*self._columns())
+
+    def _fast_list(self, request, **kwargs):
+        queryset = self._fast_queryset()
+        serializer = SongRowSerializer(request, fields=self.get_sparse_fields())
+        page = self.paginate_queryset(queryset)
+        if page is not None:
+            return self.get_paginated_response(serializer.many(page))
+        return Response(serializer.many(queryset))
+
+    def _fast_retrieve(self, request, **kwargs):
+        lookup_url_kwarg = self.lookup_url_kwarg or self.lookup_field
+        row = get_object_or_404(
+            self._fast_queryset(), **{self.lookup_field: kwargs[lookup_url_kwarg]}
+        )
+        serializer = SongRowSerializer(request, fields=self.get_sparse_fields())
+        return Response(serializer.to_representation(row))
+
+    def _cached(self, request, version, validators, handler, **kwargs):
+        key = response_cache_key(request, version, self._scope(request))
+        entry = get_cached_response(key)
+        if entry is not None:
+            etag, last_modified = entry["etag"], entry["last_modified"]
+            not_modified = conditional_response(request, etag, last_modified)
+            if not_modified is not None:
+                return not_modified
+            return set_validators(build_response(entry), etag, last_modified)
+
+        state = validators()
+        if state is None:
+            return handler(request, **kwargs)
+        etag, last_modified = state
+        not_modified = conditional_response(request, etag, last_modified)
+        if not_modified is not None:
+            return not_modified
+        response = set_validators(handler(request, **kwargs), etag, last_modified)
+        return cache_response(response, key, etag, last_modified)
+
+    @staticmethod
+    def _scope(request):
+        return "staff" if request.user and request.user.is_staff else "public"
+
+    def _make_etag(self, request, *version):
+        # The body also depends on who is asking (drafts for staff), the exact
+        # URL (host for file links, query params) and the negotiated renderer.
+        return make_etag(
+            *version,
+            self._scope(request),
+            request.build_absolute_uri(),
+            request.accepted_renderer.media_type,
+        )
+
+
+class PayloadTooLarge(APIException):
+    status_code = 413
+    default_detail = "Chunk too large."
+    default_code = "payload_too_large"
+
+
+@extend_schema_view(
+    partial_update=extend_schema(
+        request={"application/offset+octet-stream": OpenApiTypes.BINARY},
+        parameters=[
+            OpenApiParameter(
+                name="Upload-Offset",
+                type=int,
+                location=OpenApiParameter.HEADER,
+                required=True,
+                description="Byte offset of this chunk; must equal `offset`.",
+            ),
+            OpenApiParameter(
+                name="Upload-Checksum",
+                type=str,
+                location=OpenApiParameter.HEADER,
+                description="`sha256 <hex digest>` of this chunk.",
+            ),
+        ],
+    ),
+)
+class UploadViewSet(
+    mixins.CreateModelMixin,
+    mixins.RetrieveModelMixin,
+    mixins.DestroyModelMixin,
+    viewsets.GenericViewSet,
+):
+    """Chunked, resumable audio uploads for staff.
+
+    POST creates a session, PATCH appends one raw chunk at ``Upload-Offset``,
+    GET tells where to resume after a dropped connection, and ``finalize``
+    attaches the finished file to a song. Each request handles at most one
+    chunk, so no worker is busy for the whole transfer.
+    """
+
+    queryset = UploadSession.objects.all()
+    serializer_class = UploadSessionSerializer
+    permission_classes = [permissions.IsAdminUser]
+
+    def perform_create(self, serializer):
+        uploads.purge_expired()
+        serializer.save(created_by=self.request.user)
+
+    def perform_destroy(self, instance):
+        uploads.abort(instance)
+
+    def partial_update(self, request, *args, **kwargs):
+        session = self.get_object()
+        offset = self._int_header(request, "Upload-Offset")
+        length = self._int_header(request, "Content-Length")
+        if length > uploads.chunk_size():
+            raise PayloadTooLarge(f"Chunks are at most {uploads.chunk_size()} bytes.")
+        checksum = ""
+        algorithm, _, value = request.headers.get("Upload-Checksum", "").partition(" ")
+        if algorithm:
+            if algorithm.lower() != "sha256":
+                raise ValidationError(
+                    {"Upload-Checksum": ["Only sha256 is supported."]}
+                )
+            checksum = value.strip()
+        try:
+            # request.stream, not request.data: the body is never buffered.
+            offset = uploads.write_chunk(
+                session, offset, request.stream, length, checksum
+            )
+        except uploads.OffsetMismatch as exc:
+            return Response(
+                {"detail": str(exc), "offset": exc.offset},
+                status=409,
+                headers={"Upload-Offset": str(exc.offset)},
+            )
+        except uploads.UploadError as exc:
+            raise ValidationError({"detail": str(exc)})
+        return Response({"offset": offset}, headers={"Upload-Offset": str(offset)})
+
+    @extend_schema(request=UploadFinalizeSerializer, responses=UploadSessionSerializer)
+    @action(detail=True, methods=["post"])
+    def finalize(self, request, pk=None):
+        session = self.get_object()
+        serializer = UploadFinalizeSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        try:
+            session = uploads.finalize(session, serializer.validated_data["song"])
+        except uploads.UploadError as exc:
+            raise ValidationError({"detail": str(exc)})
+        return Response(self.get_serializer(session).data)
+
+    @staticmethod
+    def _int_header(request, name):
+        try:
+            value = int(request.headers.get(name, ""))
+        except ValueError:
+            value = -1
+        if value < 0:
+            raise ValidationError({name: ["Expected a non-negative integer."]})
+        return value
+
 
 class HealthView(APIView):
     permission_classes = [permissions.AllowAny]
@@ -32,20 +374,31 @@ class HealthView(APIView):
         return Response({"status": "ok"})
 
 
+class MetricsPermission(permissions.BasePermission):
+    """Allow staff, or anyone presenting ``PUTEKLIS_METRICS_TOKEN`` if set."""
+
+    def has_permission(self, request, view):
+        token = getattr(settings, "PUTEKLIS_METRICS_TOKEN", "")
+        if not token:
+            return True
+        if request.user and request.user.is_staff:
+            return True
+        header = request.META.get("HTTP_AUTHORIZATION", "")
+        return constant_time_compare(header, f"Bearer {token}")
+
+
 class MetricsView(APIView):
-    permission_classes = [permissions.AllowAny]
+    permission_classes = [MetricsPermission]
+    renderer_classes = [*api_settings.DEFAULT_RENDERER_CLASSES, PrometheusRenderer]
 
     def get(self, request):
-        total = Song.objects.count()
-        published = Song.objects.filter(status=Song.STATUS_PUBLISHED).count()
-        draft = Song.objects.filter(status=Song.STATUS_DRAFT).count()
-        return Response(
-            {
-                "songs_total": total,
-                "songs_published": published,
-                "songs_draft": draft,
-            }
-        )
+        counts = song_counts()
+        if request.accepted_renderer.format == PrometheusRenderer.format:
+            return Response(
+                prometheus_exposition(counts, registry.collect()),
+                content_type=PrometheusRenderer.content_type,
+            )
+        return Response(counts)
 
 
 # Create your views here.
@@ -0,0 +1,234 @@
+"""Waveform peaks: per-bucket min/max of a track, for the player to draw."""
+
+import os
+import shutil
+import struct
+import subprocess
+import sys
+import threading
+import wave
+from array import array
+from pathlib import Path
+
+from django.conf import settings
+
+from .transfer import file_sha256
+
+# Peaks file (little-endian): magic, version, bits (8 or 16), reserved and
+# pair count, then ``count`` (min, max) pairs as int8 or int16.
+MAGIC = b"PEAK"
+VERSION = 1
+HEADER = struct.Struct("<4sBBHI")
+# ffmpeg output rate; plenty for a few thousand peaks.
+DECODE_RATE = 8000
+BLOCK_FRAMES = 64 * 1024
+# Granules per peak when the length is known up front (WAV), and samples per
+# granule when it is not (ffmpeg output).
+GRANULES_PER_PEAK = 16
+STREAM_GRANULE = 64
+
+
+def peak_count():
+    return getattr(settings, "PUTEKLIS_WAVEFORM_PEAKS", 1000)
+
+
+def peak_bits():
+    return getattr(settings, "PUTEKLIS_WAVEFORM_BITS", 8)
+
+
+def ffmpeg_path():
+    return shutil.which(getattr(settings, "PUTEKLIS_FFMPEG", "ffmpeg") or "")
+
+
+def ffmpeg_timeout():
+    return getattr(settings, "PUTEKLIS_FFMPEG_TIMEOUT", 300)
+
+
+def waveform_on_save():
+    return getattr(settings, "PUTEKLIS_WAVEFORM_ON_SAVE", True)
+
+
+def waveform_name(source_hash, count, bits):
+    return f"waveforms/{source_hash[:2]}/{source_hash}_{count}_{bits}.peaks"
+
+
+def _to_int16(data, width):
+    """Signed 16-bit samples from little-endian PCM of ``width`` bytes."""
+    if width == 2:
+        pcm = bytes(data)
+    else:
+        pcm = bytearray(len(data) // width * 2)
+        if width == 1:
+            # Unsigned 8-bit: flip the sign bit and use it as the high byte.
+            pcm[1::2] = bytes(data).translate(bytes((i ^ 0x80) for i in range(256)))
+        else:
+            # 24/32-bit: keep the two most significant bytes.
+            pcm[0::2] = data[width - 2 :: width]
+            pcm[1::2] = data[width - 1 :: width]
+    samples = array("h")
+    samples.frombytes(pcm[: len(pcm) // 2 * 2])
+    if sys.byteorder == "big":
+        samples.byteswap()
+    return samples
+
+
+def _wav_blocks(handle):
+    width = handle.getsampwidth()
+    while data := handle.readframes(BLOCK_FRAMES):
+        # Channels stay interleaved: a bucket's min/max spans all of them.
+        yield _to_int16(data, width)
+
+
+def _ffmpeg_blocks(path, binary, timeout):
+    command = [binary, "-v", "error", "-i", str(path), "-ac", "1"]
+    command += ["-ar", str(DECODE_RATE), "-f", "s16le", "-acodec", "pcm_s16le", "-"]
+    process = subprocess.Popen(
+        command, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL
+    )
+    timed_out = threading.Event()
+
+    def kill():
+        timed_out.set()
+        process.kill()
+
+    timer = threading.Timer(timeout, kill) if timeout else None
+    if timer is not None:
+        timer.start()
+    try:
+        while data := process.stdout.read(BLOCK_FRAMES * 2):
+            yield _to_int16(data, 2)
+    finally:
+        if timer is not None:
+            timer.cancel()
+        process.stdout.close()
+        process.wait()
+    if timed_out.is_set():
+        raise subprocess.TimeoutExpired(command, timeout)
+    if process.returncode:
+        raise subprocess.CalledProcessError(process.returncode, command)
+
+
+def _fold(blocks, step):
+    """``(lows, highs)``: min and max of every ``step`` samples of ``blocks``."""
+    lows, highs = array("h"), array("h")
+    carry = array("h")
+    for block in blocks:
+        if carry:
+            block = carry + block
+        whole = len(block) - len(block) % step
+        for start in range(0, whole, step):
+            granule = block[start : start + step]
+            lows.append(min(granule))
+            highs.append(max(granule))
+        carry = block[whole:]
+    if carry:
+        lows.append(min(carry))
+        highs.append(max(carry))
+    return lows, highs
+
+
+def decode(path, count, ffmpeg=None, timeout=None):
+    """Per-granule ``(lows, highs)`` of the audio at ``path``, or ``None``.
+
+    Granules are fine enough for ``count`` peaks. ``None`` means the format
+    is not supported here (or the WAV header is damaged), or ffmpeg failed or
+    ran past ``timeout`` seconds.
+    """
+    try:
+        with wave.open(str(path), "rb") as handle:
+            total = handle.getnframes() * handle.getnchannels()
+            step = max(total // (count * GRANULES_PER_PEAK), 1)
+            return _fold(_wav_blocks(handle), step)
+    except (wave.Error, EOFError, struct.error, ValueError):
+        # Not a WAV file, or a damaged one: ffmpeg may still read it.
+        pass
+    if not ffmpeg:
+        return None
+    try:
+        return _fold(_ffmpeg_blocks(path, ffmpeg, timeout), STREAM_GRANULE)
+    except (subprocess.CalledProcessError, subprocess.TimeoutExpired):
+        return None
+
+
+def compute_peaks(lows, highs, count, bits):
+    """``count`` (min, max) pairs over the granules, scaled to ``bits``."""
+    total = len(lows)
+    shift = 16 - bits
+    pairs = array("b" if bits == 8 else "h")
+    if not total:
+        return pairs
+    for index in range(count):
+        start = index * total // count
+        end = max((index + 1) * total // count, start + 1)
+        pairs.append(min(lows[start:end]) >> shift)
+        pairs.append(max(highs[start:end]) >> shift)
+    return pairs
+
+
+def encode(pairs, bits):
+    if sys.byteorder == "big" and bits == 16:
+        pairs = array("h", pairs)
+        pairs.byteswap()
+    return HEADER.pack(MAGIC, VERSION, bits, 0, len(pairs) // 2) + pairs.tobytes()
+
+
+def decode_peaks(content):
+    """``(bits, [min, max, ...])`` of a peaks file; used by tests and tools."""
+    magic, version, bits, _, count = HEADER.unpack_from(content)
+    if magic != MAGIC or version != VERSION:
+        raise ValueError("Not a peaks file")
+    values = array("b" if bits == 8 else "h")
+    values.frombytes(content[HEADER.size :])
+    if sys.byteorder == "big" and bits == 16:
+        values.byteswap()
+    return bits, list(values[: count * 2])
+
+
+def render_waveform(
+    source_path, media_root, count, bits, ffmpeg, timeout=None, digest=None
+):
+    """Write the peaks file of ``source_path`` under ``media_root``.
+
+    The name is derived from the source's SHA-256 (``digest``, if the caller
+    already has it) and the resolution, so an existing file is already right
+    and is kept.
+
+    Returns the relative name, or ``""`` if the audio could not be decoded.
+    """
+    name = waveform_name(digest or file_sha256(source_path), count, bits)
+    target = Path(media_root) / name
+    if target.exists():
+        return name
+    granules = decode(source_path, count, ffmpeg, timeout)
+    if not granules or not granules[0]:
+        return ""
+    target.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = target.with_name(f".{target.name}.{os.getpid()}.tmp")
+    tmp_path.write_bytes(encode(compute_peaks(*granules, count, bits), bits))
+    tmp_path.replace(target)
+    return name
+
+
+def waveform_job(song):
+    """Arguments for ``render_waveform`` for ``song``, or ``None``."""
+    if not song.audio_file:
+        return None
+    storage = song.audio_file.storage
+    return (
+        storage.path(song.audio_file.name),
+        storage.location,
+        peak_count(),
+        peak_bits(),
+        ffmpeg_path(),
+        ffmpeg_timeout(),
+    )
+
+
+def needs_waveform(song):
+    if not song.audio_file:
+        return bool(song.waveform)
+    if not song.waveform:
+        return True
+    suffix = f"_{peak_count()}_{peak_bits()}.peaks"
+    storage = song.audio_file.storage
+    return not song.waveform.endswith(suffix) or not storage.exists(song.waveform)